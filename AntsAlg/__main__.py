@@ -1,23 +1,83 @@
-from antsalg2 import AntsAlgorithm
+import sys
+import json
+import argparse
+from dataclasses import replace
+
+from antsalg2 import AntsAlgorithm, get_default_config, parse_config_assignment, parse_config_value
+from antthread import run_threaded
+from antprofile import StackSampler, PROFILE_WINDOW, PROFILE_WINDOWS, SAMPLE_INTERVAL
 PROFILE = False
+# simulate in a background thread and render the latest tick at the window's own frame rate
+THREADED = False
 
-if __name__ == "__main__":
-    demo = AntsAlgorithm()
-    print(f'begin')
-    if PROFILE:
-        print(f'profile')
-        import cProfile, pstats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='AntsAlg', description='Ants algorithm simulation')
+    parser.add_argument('--ticks', type=int, help='run this many ticks unthrottled and without rendering, then exit')
+    parser.add_argument('--headless', action='store_true', help='no window, needs --ticks')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override a RunConfig field, e.g. --set NUM_OF_ANTS=800, can be repeated')
+    parser.add_argument('--threaded', action='store_true', default=THREADED,
+                        help='simulate in a background thread (interactive runs only)')
+    parser.add_argument('--cprofile', action='store_true', default=PROFILE, help='run under cProfile')
+    parser.add_argument('--cprofile-sort', default='cumtime', help='pstats sort key of the cProfile table')
+    parser.add_argument('--profile', action='store_true', help='print the phase timers and counters at the end')
+    parser.add_argument('--profile-window', type=int, default=PROFILE_WINDOW, help='ticks per profiler window')
+    parser.add_argument('--profile-windows', type=int, default=PROFILE_WINDOWS,
+                        help='windows kept for the rolling report')
+    parser.add_argument('--profile-out', help='write the rolling and whole run reports to this JSON file')
+    parser.add_argument('--sample', help='write collapsed stack samples (flamegraph.pl input) to this file')
+    parser.add_argument('--sample-interval', type=float, default=SAMPLE_INTERVAL, help='seconds between samples')
+    args = parser.parse_args(argv)
+    if args.headless and args.ticks is None:
+        parser.error('--headless needs --ticks')
+    overrides = {}
+    for text in args.set:
+        try:
+            name, value = parse_config_assignment(text)
+            overrides[name.lower()] = parse_config_value(name, value)
+        except ValueError as error:
+            parser.error(f'--set {text}: {error}')
+
+    demo = AntsAlgorithm(seed=args.seed, headless=args.headless, config=replace(get_default_config(), **overrides))
+    demo.reset_profiler(args.profile_window, args.profile_windows)
+    sampler = None
+    if args.sample:
+        sampler = StackSampler(args.sample_interval)
+        sampler.start()
+    profiler = None
+    if args.cprofile:
+        import cProfile
         profiler = cProfile.Profile()
         profiler.enable()
-        print(f'profiling begin')
-        demo.run()
-        print(f'profiling end')
+    print(f'begin')
+    try:
+        if args.ticks is not None:
+            print(demo.run(ticks=args.ticks))
+        elif args.threaded:
+            run_threaded(demo)
+        else:
+            demo.run()
+    finally:
         print(f'end')
-        profiler.disable()
-        stats = pstats.Stats(profiler).sort_stats('ncalls')
-        stats.print_stats()
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            pstats.Stats(profiler).sort_stats(args.cprofile_sort).print_stats()
+        if sampler is not None:
+            sampler.stop()
+            sampler.write(args.sample)
+            print(f'{sampler.samples} stack samples written to {args.sample}')
+        if args.profile:
+            print(demo.profiler.format_report())
+            print(demo.profiler.format_report(rolling=False))
+        if args.profile_out:
+            with open(args.profile_out, 'w') as f:
+                json.dump({'rolling': demo.profiler.report(), 'total': demo.profiler.report(rolling=False)}, f,
+                          indent=2)
+    return 0
 
-        stats = pstats.Stats(profiler).sort_stats('cumtime')
-        stats.print_stats()
-    else:
-        demo.run()
+
+if __name__ == "__main__":
+    sys.exit(main())
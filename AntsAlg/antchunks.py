@@ -0,0 +1,329 @@
+import os
+import mmap
+import shutil
+import weakref
+import tempfile
+import numpy as np
+
+from antsalg2 import ArrayGrid, get_default_config, get_horizon_table
+from antsalg2 import CELL_TYPE_EMPTY, CELL_TYPE_FOOD, CELL_TYPE_PHEROMONES
+
+# python -c "from antcolony import ColonyAntsAlgorithm; from antchunks import ChunkedGrid; \
+#     print(ColonyAntsAlgorithm(16384, 16384, grid_class=ChunkedGrid, headless=True).run(ticks=1000))"
+
+# side of the square chunks a ChunkedGrid is split into, a power of two
+CHUNK_SIZE = 128
+# chunks held by one memory-mapped file, the files are sparse so unused slots take no space
+SEGMENT_SHIFT = 10
+SEGMENT_CHUNKS = 1 << SEGMENT_SHIFT
+# directory the chunk files are created in, None for the system temp directory
+CHUNK_DIR = None
+
+# the int16 layers of a chunk, new chunks are all zeros so only the pages written to take memory, which is why
+# the food plane holds food_id + 1
+NO_FOOD_PLANE = 0
+WITH_FOOD_PLANE = 1
+DEAD_PLANE = 2
+TYPE_PLANE = 3
+FOOD_ID_PLANE = 4
+PLANES = 5
+
+INTEGERS = (int, np.integer)
+
+
+class ChunkStore:
+    # the chunks of a ChunkedGrid as (planes, chunk_size, chunk_size) views into memory-mapped segment files, a chunk
+    # gets a slot the first time one of its cells is written and the files grow only by the pages written to
+    def __init__(self, size_x, size_y, chunk_size=CHUNK_SIZE, directory=CHUNK_DIR):
+        if chunk_size & (chunk_size - 1):
+            raise ValueError(f'chunk size {chunk_size} is not a power of two')
+        self.chunk_size = chunk_size
+        self.chunk_shift = chunk_size.bit_length() - 1
+        self.directory = tempfile.mkdtemp(prefix='antchunks-', dir=directory)
+        self.remove_directory = weakref.finalize(self, shutil.rmtree, self.directory, True)
+        self.slots = np.full(((size_y + chunk_size - 1) // chunk_size, (size_x + chunk_size - 1) // chunk_size), -1,
+                             dtype=np.int32)
+        # each segment file as one flat array, cells are addressed by their offset in it
+        self.segments = []
+        self.chunks = []
+        # (chunk x, chunk y) of each slot
+        self.keys = []
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f'segment{segment}.bin')
+
+    def allocate(self, chunk_x, chunk_y):
+        slot = len(self.chunks)
+        segment, index = divmod(slot, SEGMENT_CHUNKS)
+        chunk_cells = PLANES * self.chunk_size * self.chunk_size
+        if segment == len(self.segments):
+            size = SEGMENT_CHUNKS * chunk_cells * np.dtype(np.int16).itemsize
+            with open(self.segment_path(segment), 'w+b') as f:
+                f.truncate(size)
+                mapped = mmap.mmap(f.fileno(), size)
+            # ants touch a few rows of a chunk at a time, readahead would page in whole chunks around them
+            if hasattr(mmap, 'MADV_RANDOM'):
+                mapped.madvise(mmap.MADV_RANDOM)
+            self.segments.append(np.frombuffer(mapped, dtype=np.int16))
+        chunk = self.segments[segment][index * chunk_cells:(index + 1) * chunk_cells].reshape(
+            PLANES, self.chunk_size, self.chunk_size)
+        self.chunks.append(chunk)
+        self.keys.append((chunk_x, chunk_y))
+        self.slots[chunk_y, chunk_x] = slot
+        return chunk
+
+    def get_chunk(self, chunk_x, chunk_y):
+        slot = self.slots[chunk_y, chunk_x]
+        if slot < 0:
+            return None
+        return self.chunks[slot]
+
+    def clear(self):
+        # the files are removed rather than truncated, views still held elsewhere keep the unlinked pages
+        self.slots[:] = -1
+        self.chunks = []
+        self.keys = []
+        for segment in range(len(self.segments)):
+            os.remove(self.segment_path(segment))
+        self.segments = []
+
+    def close(self):
+        self.clear()
+        self.remove_directory()
+
+    def read(self, plane, x, y):
+        shift = self.chunk_shift
+        slot = self.slots[y >> shift, x >> shift]
+        if slot < 0:
+            return 0
+        return self.chunks[slot][plane, y & (self.chunk_size - 1), x & (self.chunk_size - 1)]
+
+    def write(self, plane, x, y, value):
+        shift = self.chunk_shift
+        chunk = self.get_chunk(x >> shift, y >> shift)
+        if chunk is None:
+            chunk = self.allocate(x >> shift, y >> shift)
+        chunk[plane, y & (self.chunk_size - 1), x & (self.chunk_size - 1)] = value
+
+    def locate(self, plane, xs, ys):
+        # segment of each cell, -1 where its chunk is missing, and the offset of the cell in that segment, the
+        # offsets go past int32 for chunks of 1024 cells and up
+        shift = self.chunk_shift
+        mask = self.chunk_size - 1
+        slots = self.slots[ys >> shift, xs >> shift].astype(np.int64)
+        rows = (((slots & (SEGMENT_CHUNKS - 1)) * PLANES + plane) << shift) + (ys & mask)
+        return slots >> SEGMENT_SHIFT, (rows << shift) + (xs & mask)
+
+    def gather(self, plane, xs, ys):
+        segments, offsets = self.locate(plane, xs, ys)
+        if segments.size > 0:
+            low = segments.min()
+            if low >= 0 and low == segments.max():
+                # all cells in one segment, as for a horizon or ants close together
+                return self.segments[low].take(offsets)
+        values = np.zeros(segments.shape, dtype=np.int16)
+        for segment in np.unique(segments).tolist():
+            if segment < 0:
+                continue
+            hit = segments == segment
+            values[hit] = self.segments[segment].take(offsets[hit])
+        return values
+
+    def scatter(self, plane, xs, ys, values):
+        shift = self.chunk_shift
+        chunks_x = xs >> shift
+        chunks_y = ys >> shift
+        missing = self.slots[chunks_y, chunks_x] < 0
+        if missing.any():
+            keys = np.unique(chunks_y[missing].astype(np.int64) * self.slots.shape[1] + chunks_x[missing])
+            for chunk_y, chunk_x in zip(*np.divmod(keys, self.slots.shape[1])):
+                self.allocate(int(chunk_x), int(chunk_y))
+        segments, offsets = self.locate(plane, xs, ys)
+        values = np.broadcast_to(values, offsets.shape)
+        for segment in np.unique(segments).tolist():
+            hit = segments == segment
+            self.segments[segment][offsets[hit]] = values[hit]
+
+    def materialize(self, plane, size_x, size_y):
+        # the whole layer as one array, for worlds small enough to be drawn
+        layer = np.zeros((size_y, size_x), dtype=np.int16)
+        size = self.chunk_size
+        for (chunk_x, chunk_y), chunk in zip(self.keys, self.chunks):
+            block = layer[chunk_y * size:(chunk_y + 1) * size, chunk_x * size:(chunk_x + 1) * size]
+            block[:] = chunk[plane, :block.shape[0], :block.shape[1]]
+        return layer
+
+
+class ChunkedLayer:
+    # one layer of a ChunkedGrid, indexed [y, x] with scalars or coordinate arrays of one shape like the ArrayGrid
+    # layers, np.take goes through take() with flat y * size_x + x indices, the plane holds the values plus offset
+    def __init__(self, grid, plane, offset=0):
+        self.grid = grid
+        self.plane = plane
+        self.offset = offset
+
+    def __getitem__(self, key):
+        y, x = key
+        if isinstance(x, INTEGERS) and isinstance(y, INTEGERS):
+            return self.grid.store.read(self.plane, x, y) - self.offset
+        return self.grid.store.gather(self.plane, np.asarray(x), np.asarray(y)) - self.offset
+
+    def __setitem__(self, key, value):
+        y, x = key
+        if isinstance(x, INTEGERS) and isinstance(y, INTEGERS):
+            self.grid.store.write(self.plane, x, y, value + self.offset)
+            return
+        self.grid.store.scatter(self.plane, np.asarray(x), np.asarray(y), np.asarray(value) + self.offset)
+
+    def take(self, indices, axis=None, out=None, mode='raise'):
+        ys, xs = np.divmod(np.asarray(indices, dtype=np.int64), self.grid.size_x)
+        return self.grid.store.gather(self.plane, xs, ys) - self.offset
+
+    def __array__(self, dtype=None, copy=None):
+        layer = self.grid.store.materialize(self.plane, self.grid.size_x, self.grid.size_y) - self.offset
+        return layer if dtype is None else layer.astype(dtype)
+
+
+class ChunkedGrid(ArrayGrid):
+    # ArrayGrid whose layers live in CHUNK_SIZE chunks of memory-mapped files, only the chunks ants or food have
+    # written to exist, so memory and disk follow the explored area and not the size of the world,
+    # cells of missing chunks read as empty ground
+    def __init__(self, size_x, size_y, lazy_evaporation=False, chunk_size=CHUNK_SIZE, directory=CHUNK_DIR,
+                 config=None):
+        if lazy_evaporation:
+            raise ValueError('ChunkedGrid only supports eager evaporation')
+        if config is None:
+            config = get_default_config()
+        self.config = config
+        self.size_x = size_x
+        self.size_y = size_y
+        self.cell_size = config.cell_size
+        self.horizon_table = get_horizon_table(config.horizon_size)
+        self.store = ChunkStore(size_x, size_y, chunk_size, directory)
+        self.visited_no_food_counter = ChunkedLayer(self, NO_FOOD_PLANE)
+        self.visited_with_food_counter = ChunkedLayer(self, WITH_FOOD_PLANE)
+        self.visited_dead_counter = ChunkedLayer(self, DEAD_PLANE)
+        self.cell_type = ChunkedLayer(self, TYPE_PLANE)
+        self.food_id = ChunkedLayer(self, FOOD_ID_PLANE, offset=1)
+        self.foods = []
+        self.depleted_foods = set()
+        self.nest = None
+        self.tick = 0
+        self.lazy_evaporation = False
+        self.last_tick = None
+        self.best_cell_calls = 0
+        self.cells_scanned = 0
+        # tiles as in ArrayGrid, decay visits the block of each chunk that spans its active tiles
+        self.tile_size = min(config.tile_size, chunk_size)
+        self.chunk_tiles = chunk_size // self.tile_size
+        chunks_y, chunks_x = self.store.slots.shape
+        self.active_tiles = np.zeros((chunks_y * self.chunk_tiles, chunks_x * self.chunk_tiles), dtype=bool)
+
+    def close(self):
+        self.store.close()
+
+    def chunk_tile_view(self):
+        # active_tiles as [chunk y, tile y in the chunk, chunk x, tile x in the chunk]
+        chunks_y, chunks_x = self.store.slots.shape
+        return self.active_tiles.reshape(chunks_y, self.chunk_tiles, chunks_x, self.chunk_tiles)
+
+    def activate_tiles(self):
+        self.chunk_tile_view()[:] = (self.store.slots >= 0)[:, None, :, None]
+
+    def decay(self):
+        tile = self.tile_size
+        tiles = self.chunk_tile_view()
+        for chunk_y, chunk_x in np.argwhere(tiles.any(axis=(1, 3))).tolist():
+            active = tiles[chunk_y, :, chunk_x]
+            rows = np.flatnonzero(active.any(axis=1))
+            columns = np.flatnonzero(active.any(axis=0))
+            first_row, last_row = int(rows[0]), int(rows[-1]) + 1
+            first_column, last_column = int(columns[0]), int(columns[-1]) + 1
+            block = self.store.get_chunk(chunk_x, chunk_y)[:, first_row * tile:last_row * tile,
+                                                           first_column * tile:last_column * tile]
+            pheromones = block[TYPE_PLANE] == CELL_TYPE_PHEROMONES
+            counters = block[NO_FOOD_PLANE:DEAD_PLANE + 1]
+            np.subtract(counters, 1, out=counters)
+            np.maximum(counters, 0, out=counters)
+            evaporated = pheromones & ~counters.any(axis=0)
+            block[TYPE_PLANE][evaporated] = CELL_TYPE_EMPTY
+            remaining = (pheromones & ~evaporated).reshape(last_row - first_row, tile, last_column - first_column, tile)
+            active[first_row:last_row, first_column:last_column] = remaining.any(axis=(1, 3))
+
+    def count_active_cells(self):
+        # pheromone cells of the allocated chunks, the missing ones are empty
+        return sum(int(np.count_nonzero(chunk[TYPE_PLANE] == CELL_TYPE_PHEROMONES)) for chunk in self.store.chunks)
+
+    def food_cells(self, food):
+        size = self.config.food_source_size
+        xs, ys = np.meshgrid(np.arange(max(food.x, 0), min(food.x + size, self.size_x)),
+                             np.arange(max(food.y, 0), min(food.y + size, self.size_y)))
+        return xs.ravel(), ys.ravel()
+
+    def clear_food(self, food_id):
+        xs, ys = self.food_cells(self.foods[food_id])
+        on_food = (self.food_id[ys, xs] == food_id) & (self.cell_type[ys, xs] == CELL_TYPE_FOOD)
+        self.cell_type[ys[on_food], xs[on_food]] = CELL_TYPE_EMPTY
+
+    def set_food(self, food):
+        food_id = len(self.foods)
+        self.foods.append(food)
+        xs, ys = self.food_cells(food)
+        self.food_id[ys, xs] = food_id
+        self.cell_type[ys, xs] = CELL_TYPE_FOOD
+
+    def get_layers(self):
+        # the food plane is food_id + 1, so cells without food pick the leading zero
+        amounts = np.array([0] + [food.amount for food in self.foods], dtype=np.int32)
+        size_x, size_y = self.size_x, self.size_y
+        return (self.store.materialize(TYPE_PLANE, size_x, size_y).astype(np.uint8),
+                self.store.materialize(NO_FOOD_PLANE, size_x, size_y),
+                self.store.materialize(WITH_FOOD_PLANE, size_x, size_y),
+                self.store.materialize(DEAD_PLANE, size_x, size_y),
+                amounts[self.store.materialize(FOOD_ID_PLANE, size_x, size_y)])
+
+    def export_state(self, foods):
+        # only the allocated chunks are saved, the other grids cannot load this state
+        size = self.store.chunk_size
+        planes = np.stack(self.store.chunks) if self.store.chunks \
+            else np.zeros((0, PLANES, size, size), dtype=np.int16)
+        return {'chunk_size': np.array(size), 'chunk_keys': np.array(self.store.keys, dtype=np.int32).reshape(-1, 2),
+                'chunk_planes': planes,
+                'depleted_foods': np.array(sorted(self.depleted_foods), dtype=np.int32)}
+
+    def import_state(self, state, foods, nest):
+        self.store.clear()
+        if 'chunk_planes' in state:
+            if int(state['chunk_size']) != self.store.chunk_size:
+                raise ValueError(f"checkpoint chunks are {int(state['chunk_size'])} cells, "
+                                 f"not {self.store.chunk_size}")
+            for (chunk_x, chunk_y), planes in zip(state['chunk_keys'].tolist(), state['chunk_planes']):
+                self.store.allocate(chunk_x, chunk_y)[:] = planes
+        else:
+            self.import_layers(state)
+        self.foods = foods
+        self.nest = nest
+        if 'depleted_foods' in state:
+            self.depleted_foods = set(state['depleted_foods'].tolist())
+        else:
+            self.depleted_foods = {food_id for food_id, food in enumerate(foods) if food.amount == 0}
+        self.tick = int(state['tick'])
+        self.activate_tiles()
+
+    def import_layers(self, state):
+        # full layers of the other grids, only the chunks with something on them are kept
+        layers = [state['no_food'], state['with_food'], state['dead'], state['cell_type'], state['food_id'] + 1]
+        size = self.store.chunk_size
+        chunks_y, chunks_x = self.store.slots.shape
+        for chunk_y in range(chunks_y):
+            for chunk_x in range(chunks_x):
+                block = (slice(chunk_y * size, (chunk_y + 1) * size), slice(chunk_x * size, (chunk_x + 1) * size))
+                if (layers[TYPE_PLANE][block] == CELL_TYPE_EMPTY).all() and not layers[FOOD_ID_PLANE][block].any():
+                    continue
+                chunk = self.store.allocate(chunk_x, chunk_y)
+                for plane, layer in enumerate(layers):
+                    values = layer[block]
+                    chunk[plane, :values.shape[0], :values.shape[1]] = values
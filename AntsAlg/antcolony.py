@@ -0,0 +1,244 @@
+import json
+import time
+import numpy as np
+
+from antsalg2 import AntsAlgorithm, ArrayGrid
+from antsalg2 import DIRECTIONS, DIRECTIONS_LEN, DIR_VECTORS, VECTORS_TO_DIRS, NW, N, NE, E, SE, S, SW, W
+from antsalg2 import MODE_TO_NEST, MODE_TO_FOOD, MODE_LEAVING_NEST
+from antsalg2 import CELL_TYPE_NEST, CELL_TYPE_FOOD
+from antsalg2 import SIZE_X, SIZE_Y
+
+DIR_DX = np.array([vec[0] for vec in DIR_VECTORS], dtype=np.int32)
+DIR_DY = np.array([vec[1] for vec in DIR_VECTORS], dtype=np.int32)
+OPPOSITE_DIRS = np.array([VECTORS_TO_DIRS[(-dir_x, -dir_y)] for dir_x, dir_y in DIR_VECTORS], dtype=np.int8)
+# same swaps as Ant.mirror_dir_x / Ant.mirror_dir_y
+MIRROR_X_DIRS = np.array([NE, N, NW, W, SW, S, SE, E], dtype=np.int8)
+MIRROR_Y_DIRS = np.array([SW, S, SE, E, NE, N, NW, W], dtype=np.int8)
+# direction towards a cell, indexed by (sign_x + 1) * 3 + (sign_y + 1)
+SIGNS_TO_DIRS = np.array([VECTORS_TO_DIRS.get((sign_x, sign_y), 0) for sign_x in (-1, 0, 1) for sign_y in (-1, 0, 1)],
+                         dtype=np.int8)
+TURNS = np.array([-1, 0, 1], dtype=np.int8)
+TURN_WEIGHTS = np.array([1, 10, 1]) / 12
+
+ANT_CAPACITY = 1024
+
+
+class AntColony:
+    # all ants of one nest held as arrays, advanced together by step(), with the RunConfig of the grid by default
+    def __init__(self, grid, nest, seed=None, capacity=ANT_CAPACITY, config=None):
+        self.config = grid.config if config is None else config
+        self.grid = grid
+        self.nest = nest
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.direction = np.zeros(capacity, dtype=np.int8)
+        self.mode = np.zeros(capacity, dtype=np.int8)
+        self.no_food_nest_visit = np.zeros(capacity, dtype=np.int32)
+        self.serial = np.zeros(capacity, dtype=np.int64)
+        self.next_serial = 1
+        # time spent in stamp_dead by step(), taken and reset by ColonyAntsAlgorithm.update_positions
+        self.stamp_seconds = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def arrays(self):
+        return self.x, self.y, self.direction, self.mode, self.no_food_nest_visit, self.serial
+
+    def reserve(self, capacity):
+        if capacity <= len(self.x):
+            return
+        capacity = max(capacity, 2 * len(self.x))
+        for name in ('x', 'y', 'direction', 'mode', 'no_food_nest_visit', 'serial'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, num=1):
+        self.reserve(self.count + num)
+        new = slice(self.count, self.count + num)
+        self.x[new] = self.nest.x
+        self.y[new] = self.nest.y
+        self.direction[new] = self.rng.choice(DIRECTIONS, size=num)
+        self.mode[new] = MODE_LEAVING_NEST
+        self.no_food_nest_visit[new] = 1
+        self.serial[new] = np.arange(self.next_serial, self.next_serial + num)
+        self.next_serial += num
+        self.count += num
+
+    def remove(self, dead):
+        keep = ~dead
+        alive = int(keep.sum())
+        for array in self.arrays():
+            array[:alive] = array[:self.count][keep]
+        self.count = alive
+
+    def stamp_dead(self, dying):
+        n = self.count
+        pheromone_amounts = self.no_food_nest_visit[:n][dying] / 10
+        pheromone_amounts = np.where(self.mode[:n][dying] == MODE_TO_NEST, pheromone_amounts / 4, pheromone_amounts)
+        self.grid.stamp_dead(self.x[:n][dying], self.y[:n][dying], pheromone_amounts)
+
+    def take_food(self, xs, ys):
+        food_ids = self.grid.food_id[ys, xs]
+        taken = np.bincount(food_ids[food_ids >= 0], minlength=len(self.grid.foods))
+        for food_id in np.flatnonzero(taken).tolist():
+            food = self.grid.foods[food_id]
+            food.amount = max(food.amount - int(taken[food_id]), 0)
+
+    def step(self):
+        n = self.count
+        grid = self.grid
+        x = self.x[:n]
+        y = self.y[:n]
+        direction = self.direction[:n]
+        mode = self.mode[:n]
+        no_food_nest_visit = self.no_food_nest_visit[:n]
+        thresh = self.config.no_food_nest_visit_thresh
+
+        no_food_nest_visit += 1
+        dying = no_food_nest_visit > thresh
+        if dying.any():
+            start = time.perf_counter()
+            self.stamp_dead(dying)
+            self.stamp_seconds += time.perf_counter() - start
+
+        cell_type = grid.cell_type[y, x]
+        in_nest = cell_type == CELL_TYPE_NEST
+        in_food = cell_type == CELL_TYPE_FOOD
+        leaving = mode == MODE_LEAVING_NEST
+        to_food = mode == MODE_TO_FOOD
+        to_nest = mode == MODE_TO_NEST
+
+        left_nest = leaving & ~in_nest
+        found_food = to_food & in_food
+        reached_nest = to_nest & in_nest
+        turn_back = found_food | reached_nest | (to_food & in_nest) | (to_nest & in_food)
+        moving = ~(left_nest | turn_back)
+
+        if found_food.any():
+            self.take_food(x[found_food], y[found_food])
+        mode[left_nest | reached_nest] = MODE_TO_FOOD
+        mode[found_food] = MODE_TO_NEST
+        no_food_nest_visit[found_food | reached_nest] = 1
+
+        back = direction[turn_back]
+        x[turn_back] = np.clip(x[turn_back] - DIR_DX[back], 0, grid.size_x - 1)
+        y[turn_back] = np.clip(y[turn_back] - DIR_DY[back], 0, grid.size_y - 1)
+        direction[turn_back] = OPPOSITE_DIRS[back]
+
+        # the deposits of every moving ant land before update_directions, so each scan sees all trails of this tick,
+        # where an Ant object sees its own deposit and those of the ants updated before it
+        to_nest_moving = moving & to_nest
+        to_food_moving = moving & to_food
+        grid.add_counters(grid.visited_with_food_counter, x[to_nest_moving], y[to_nest_moving],
+                          (thresh - no_food_nest_visit[to_nest_moving]) / 10)
+        grid.add_counters(grid.visited_no_food_counter, x[to_food_moving], y[to_food_moving],
+                          (thresh - no_food_nest_visit[to_food_moving]) / 20)
+
+        self.update_directions(moving)
+
+        step_dir = direction[moving]
+        new_x = x[moving] + DIR_DX[step_dir]
+        new_y = y[moving] + DIR_DY[step_dir]
+        wall_x = (new_x < 0) | (new_x == grid.size_x)
+        step_dir = np.where(wall_x, MIRROR_X_DIRS[step_dir], step_dir)
+        wall_y = (new_y < 0) | (new_y == grid.size_y)
+        step_dir = np.where(wall_y, MIRROR_Y_DIRS[step_dir], step_dir)
+        x[moving] = np.clip(new_x, 0, grid.size_x - 1)
+        y[moving] = np.clip(new_y, 0, grid.size_y - 1)
+        direction[moving] = step_dir
+
+        if dying.any():
+            self.remove(dying)
+        return int(dying.sum())
+
+    def update_directions(self, moving):
+        n = self.count
+        direction = self.direction[:n]
+        mode = self.mode[:n]
+
+        val = self.rng.integers(0, self.config.randomize_pos_range + 1, size=n)
+        randomize = moving & ((val > self.config.randomize_pos_threshold) | (mode == MODE_LEAVING_NEST))
+        turns = self.rng.choice(TURNS, size=int(randomize.sum()), p=TURN_WEIGHTS)
+        direction[randomize] = (direction[randomize] + turns) % DIRECTIONS_LEN
+
+        scan = np.flatnonzero(moving & ~randomize)
+        if len(scan) == 0:
+            return
+        found, best_x, best_y = self.grid.get_best_cells(direction[scan], self.x[scan], self.y[scan], mode[scan],
+                                                          self.rng)
+        scan = scan[found]
+        diff_x = best_x[found] - self.x[scan]
+        diff_y = best_y[found] - self.y[scan]
+        dist = np.maximum(np.abs(diff_x), np.abs(diff_y))
+        # int(diff / dist) in Ant.update_direction only keeps the components that reach the full distance
+        sign_x = np.where(np.abs(diff_x) == dist, np.sign(diff_x), 0)
+        sign_y = np.where(np.abs(diff_y) == dist, np.sign(diff_y), 0)
+        direction[scan] = SIGNS_TO_DIRS[(sign_x + 1) * 3 + sign_y + 1]
+
+
+class ColonyAntsAlgorithm(AntsAlgorithm):
+    # AntsAlgorithm with the ants simulated by an AntColony instead of Ant objects
+    def __init__(self, size_x=SIZE_X, size_y=SIZE_Y, lazy_evaporation=False, seed=None, headless=False,
+                 grid_class=ArrayGrid, config=None):
+        super().__init__(size_x, size_y, grid_class=grid_class, lazy_evaporation=lazy_evaporation, headless=headless,
+                         seed=seed, config=config)
+        self.colony = AntColony(self.grid, self.nest, seed=self.random.seed, config=self.config)
+
+    def count_ants(self):
+        return len(self.colony)
+
+    def get_ant_arrays(self):
+        n = self.colony.count
+        return self.colony.x[:n], self.colony.y[:n], self.colony.mode[:n], self.colony.direction[:n]
+
+    def export_ants(self):
+        colony = self.colony
+        n = colony.count
+        return {'ant_x': colony.x[:n], 'ant_y': colony.y[:n], 'ant_direction': colony.direction[:n],
+                'ant_mode': colony.mode[:n], 'ant_no_food_nest_visit': colony.no_food_nest_visit[:n],
+                'ant_serial': colony.serial[:n], 'next_serial': np.array(colony.next_serial),
+                'colony_rng': np.array(json.dumps(colony.rng.bit_generator.state))}
+
+    def import_ants(self, state):
+        colony = AntColony(self.grid, self.nest, seed=self.random.seed, config=self.config)
+        n = len(state['ant_x'])
+        colony.reserve(n)
+        colony.x[:n] = state['ant_x']
+        colony.y[:n] = state['ant_y']
+        colony.direction[:n] = state['ant_direction']
+        colony.mode[:n] = state['ant_mode']
+        colony.no_food_nest_visit[:n] = state['ant_no_food_nest_visit']
+        colony.count = n
+        # checkpoints saved before the Ant object engine kept serials have none
+        if 'ant_serial' in state:
+            colony.serial[:n] = state['ant_serial']
+            colony.next_serial = int(state['next_serial'])
+        else:
+            colony.serial[:n] = np.arange(1, n + 1)
+            colony.next_serial = n + 1
+        # the strip engine draws from (seed, tick, serial) and keeps no generator state
+        if 'colony_rng' in state:
+            colony.rng.bit_generator.state = json.loads(str(state['colony_rng']))
+        self.colony = colony
+
+    def update_ants(self):
+        self.random.begin_tick(self.tick, [], self.colony.next_serial)
+        if len(self.colony) < self.config.num_of_ants:
+            if self.random.spawn < 600:
+                return
+            self.colony.spawn()
+            self.profiler.count('ants_spawned')
+
+    def update_positions(self):
+        died = self.colony.step()
+        self.deaths += died
+        if died:
+            self.profiler.count('ants_removed', died)
+        if self.colony.stamp_seconds:
+            self.profiler.add('stamp_dead', self.colony.stamp_seconds)
+            self.colony.stamp_seconds = 0.0
@@ -0,0 +1,158 @@
+import io
+import time
+import contextlib
+import numpy as np
+
+from antsalg2 import jit, prange, NUMBA_AVAILABLE, get_default_config, SIZE_X, SIZE_Y
+from antkernel import KernelAntsAlgorithm, run_ticks
+
+# python -c "from antensemble import EnsembleAntsAlgorithm; ens = EnsembleAntsAlgorithm(256, 250, 250, seed=1); \
+#     print(ens.run(ticks=2000)['food_taken'])"
+
+ENSEMBLE_SIZE = 256
+GRID_LAYERS = ('visited_no_food_counter', 'visited_with_food_counter', 'visited_dead_counter', 'cell_type', 'food_id')
+COLONY_ARRAYS = ('x', 'y', 'direction', 'mode', 'no_food_nest_visit', 'serial')
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def run_ensemble(n_ticks, no_food, with_food, dead, cell_type, food_id, tick,
+                 food_amount, food_x, food_y, food_depleted, food_size,
+                 ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial, count, next_serial,
+                 nest_x, nest_y, num_of_ants, no_food_nest_visit_thresh, randomize_range, randomize_threshold,
+                 horizon_dx, horizon_dy, horizon_dist, horizon_size, seed, food_taken, deaths):
+    # run_ticks for every world of the stack, the worlds share nothing so they are spread over the cores whole
+    for w in prange(len(seed)):
+        count[w], next_serial[w], tick[w], taken, died = run_ticks(
+            n_ticks, no_food[w], with_food[w], dead[w], cell_type[w], food_id[w], None, tick[w],
+            food_amount[w], food_x[w], food_y[w], food_depleted[w], food_size,
+            ant_x[w], ant_y[w], ant_direction[w], ant_mode[w], ant_no_food_nest_visit[w], ant_serial[w],
+            count[w], next_serial[w], nest_x[w], nest_y[w], num_of_ants, no_food_nest_visit_thresh,
+            randomize_range, randomize_threshold, horizon_dx, horizon_dy, horizon_dist, horizon_size, seed[w])
+        food_taken[w] += taken
+        deaths[w] += died
+
+
+class EnsembleAntsAlgorithm:
+    # replicas of one scenario with their own seeds, each world is a headless KernelAntsAlgorithm whose grid layers
+    # and ant arrays are views into arrays with the worlds along the first axis, so one kernel call advances them
+    # all, and every world runs exactly as the KernelAntsAlgorithm of its seed would on its own, the worlds share
+    # one RunConfig
+    def __init__(self, worlds=ENSEMBLE_SIZE, size_x=SIZE_X, size_y=SIZE_Y, seed=None, seeds=None, config=None):
+        if seeds is None:
+            seeds = [None if seed is None else seed + index for index in range(worlds)]
+        if config is None:
+            config = get_default_config()
+        self.config = config
+        # every world prints about its nest
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.worlds = [KernelAntsAlgorithm(size_x, size_y, seed=world_seed, headless=True, config=config)
+                           for world_seed in seeds]
+        self.food_taken = np.zeros(len(self.worlds), dtype=np.int64)
+        self.stack()
+
+    def __len__(self):
+        return len(self.worlds)
+
+    def stack(self, capacity=0):
+        # copies the layers and ants of every world into the stacked arrays and points the worlds at their slices,
+        # run again after a world was changed on its own, e.g. by load_checkpoint
+        capacity = max([capacity, self.config.num_of_ants] + [len(world.colony.x) for world in self.worlds])
+        self.seeds = np.array([world.seed for world in self.worlds], dtype=np.int64)
+        self.nest_x = np.array([world.nest.x for world in self.worlds], dtype=np.int32)
+        self.nest_y = np.array([world.nest.y for world in self.worlds], dtype=np.int32)
+        self.food_x = np.array([[food.x for food in world.food_sources] for world in self.worlds], dtype=np.int32)
+        self.food_y = np.array([[food.y for food in world.food_sources] for world in self.worlds], dtype=np.int32)
+        self.layers = {}
+        for name in GRID_LAYERS:
+            self.layers[name] = np.stack([getattr(world.grid, name) for world in self.worlds])
+            for world, layer in zip(self.worlds, self.layers[name]):
+                setattr(world.grid, name, layer)
+        self.ants = {}
+        for name in COLONY_ARRAYS:
+            dtype = getattr(self.worlds[0].colony, name).dtype
+            self.ants[name] = np.zeros((len(self.worlds), capacity), dtype=dtype)
+            for world, values in zip(self.worlds, self.ants[name]):
+                colony = world.colony
+                values[:colony.count] = getattr(colony, name)[:colony.count]
+                setattr(colony, name, values)
+
+    def advance(self, n_ticks):
+        if not NUMBA_AVAILABLE:
+            food_left = self.count_food()
+            for world in self.worlds:
+                world.advance(n_ticks)
+            self.food_taken += food_left - self.count_food()
+            return
+        config = self.config
+        if self.ants['x'].shape[1] < config.num_of_ants:
+            self.stack()
+        worlds = self.worlds
+        table = worlds[0].grid.horizon_table
+        food_amount = np.array([[food.amount for food in world.food_sources] for world in worlds], dtype=np.int32)
+        food_depleted = np.array([[food_id in world.grid.depleted_foods for food_id in range(self.food_x.shape[1])]
+                                  for world in worlds], dtype=np.uint8)
+        tick = np.array([world.grid.tick for world in worlds], dtype=np.int64)
+        count = np.array([world.colony.count for world in worlds], dtype=np.int64)
+        next_serial = np.array([world.colony.next_serial for world in worlds], dtype=np.int64)
+        depleted_before = food_depleted.copy()
+        food_taken = np.zeros(len(worlds), dtype=np.int64)
+        deaths = np.zeros(len(worlds), dtype=np.int64)
+        ants = self.ants
+        layers = self.layers
+        run_ensemble(
+            n_ticks, layers['visited_no_food_counter'], layers['visited_with_food_counter'],
+            layers['visited_dead_counter'], layers['cell_type'], layers['food_id'], tick,
+            food_amount, self.food_x, self.food_y, food_depleted, config.food_source_size,
+            ants['x'], ants['y'], ants['direction'], ants['mode'], ants['no_food_nest_visit'], ants['serial'],
+            count, next_serial, self.nest_x, self.nest_y, config.num_of_ants, config.no_food_nest_visit_thresh,
+            config.randomize_pos_range, config.randomize_pos_threshold,
+            table.dx, table.dy, table.dist, table.horizon_size, self.seeds, food_taken, deaths)
+
+        self.food_taken += food_taken
+        for index, world in enumerate(worlds):
+            world.tick += n_ticks
+            world.grid.tick = int(tick[index])
+            world.deaths += int(deaths[index])
+            world.colony.count = int(count[index])
+            world.colony.next_serial = int(next_serial[index])
+            world.grid.activate_tiles()
+            for food, amount in zip(world.food_sources, food_amount[index].tolist()):
+                food.amount = amount
+        for index in np.flatnonzero((food_depleted != depleted_before).any(axis=1)).tolist():
+            worlds[index].grid.depleted_foods.update(np.flatnonzero(food_depleted[index]).tolist())
+
+    def count_ants(self):
+        return np.array([world.count_ants() for world in self.worlds])
+
+    def count_food(self):
+        return np.array([world.count_food() for world in self.worlds])
+
+    def metrics(self):
+        # one entry per world, food_taken counts what was taken while the ensemble ran it
+        return {
+            'seed': self.seeds.copy(),
+            'tick': np.array([world.tick for world in self.worlds]),
+            'ants': self.count_ants(),
+            'food_left': self.count_food(),
+            'food_taken': self.food_taken.copy(),
+            'deaths': np.array([world.deaths for world in self.worlds]),
+        }
+
+    def run(self, ticks):
+        # AntsAlgorithm.run for all worlds at once, the counts of the summary are arrays with one entry per world
+        start = self.metrics()
+        start_time = time.perf_counter()
+        self.advance(ticks)
+        elapsed = time.perf_counter() - start_time
+        end = self.metrics()
+        return {
+            'tick': end['tick'],
+            'ticks': ticks,
+            'seconds': elapsed,
+            'ticks_per_second': ticks / elapsed if elapsed > 0 else 0.0,
+            'world_ticks_per_second': len(self) * ticks / elapsed if elapsed > 0 else 0.0,
+            'ants': end['ants'],
+            'food_left': end['food_left'],
+            'food_taken': end['food_taken'] - start['food_taken'],
+            'deaths': end['deaths'] - start['deaths'],
+        }
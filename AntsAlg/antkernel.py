@@ -0,0 +1,520 @@
+import time
+import numpy as np
+
+from antsalg2 import jit, prange, NUMBA_AVAILABLE, SIZE_X, SIZE_Y
+from antsalg2 import MODE_TO_NEST, MODE_TO_FOOD, MODE_LEAVING_NEST
+from antsalg2 import CELL_TYPE_EMPTY, CELL_TYPE_NEST, CELL_TYPE_FOOD, CELL_TYPE_PHEROMONES
+from antsalg2 import STREAM_RANDOMIZE, STREAM_TURN, STREAM_TIE, STREAM_SPAWN, STREAM_HEADING, SPAWNER_SERIAL
+from antcolony import ColonyAntsAlgorithm, DIR_DX, DIR_DY, OPPOSITE_DIRS, MIRROR_X_DIRS, MIRROR_Y_DIRS, SIGNS_TO_DIRS
+
+if NUMBA_AVAILABLE:
+    from numba import get_num_threads, set_num_threads
+
+# what advance_ant leaves on the cell the ant started from
+DEPOSIT_NONE = -1
+DEPOSIT_NO_FOOD = 0
+DEPOSIT_WITH_FOOD = 1
+
+# ants per parallel work item and grid rows per parallel decay item, fixed so the work split does not depend on the
+# number of threads
+PARALLEL_CHUNK = 1024
+DECAY_ROWS = 64
+
+
+@jit(nopython=True, cache=True)
+def mix64(z):
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+@jit(nopython=True, cache=True)
+def random_uniform(seed, tick, serial, stream):
+    h = mix64(np.uint64(seed) + np.uint64(0x9E3779B97F4A7C15))
+    h = mix64(h ^ np.uint64(tick))
+    h = mix64(h ^ np.uint64(serial))
+    h = mix64(h ^ np.uint64(stream))
+    return (h >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+if not NUMBA_AVAILABLE:
+    # the hash then runs on numpy scalars, which warn whenever a sum or product wraps around as it is meant to
+    scalar_random_uniform = random_uniform
+
+    def random_uniform(seed, tick, serial, stream):
+        with np.errstate(over='ignore'):
+            return scalar_random_uniform(seed, tick, serial, stream)
+
+
+@jit(nopython=True, cache=True)
+def random_int(seed, tick, serial, stream, high):
+    # uniform integer in [0, high)
+    return int(random_uniform(seed, tick, serial, stream) * high)
+
+
+@jit(nopython=True, cache=True)
+def read_counter(layer, last_tick, tick, x, y):
+    level = np.int64(layer[y, x])
+    if last_tick is not None:
+        level -= tick - last_tick[y, x]
+        if level < 0:
+            level = 0
+    return level
+
+
+@jit(nopython=True, cache=True)
+def refresh_cell(no_food, with_food, dead, last_tick, tick, x, y):
+    elapsed = tick - last_tick[y, x]
+    if elapsed == 0:
+        return
+    no_food[y, x] = max(no_food[y, x] - elapsed, 0)
+    with_food[y, x] = max(with_food[y, x] - elapsed, 0)
+    dead[y, x] = max(dead[y, x] - elapsed, 0)
+    last_tick[y, x] = tick
+
+
+@jit(nopython=True, cache=True)
+def inc_counter(layer, no_food, with_food, dead, cell_type, last_tick, tick, x, y, amount):
+    if cell_type[y, x] == CELL_TYPE_NEST or cell_type[y, x] == CELL_TYPE_FOOD:
+        return
+    if last_tick is not None:
+        refresh_cell(no_food, with_food, dead, last_tick, tick, x, y)
+    level = layer[y, x] + amount
+    if level > 1000:
+        level = 1000
+    if level < 0:
+        level = 0
+    layer[y, x] = int(level)
+    cell_type[y, x] = CELL_TYPE_PHEROMONES
+
+
+@jit(nopython=True, cache=True)
+def stamp_dead(no_food, with_food, dead, cell_type, last_tick, tick, x, y, amount, horizon_size):
+    size_y, size_x = cell_type.shape
+    for y_ in range(max(y - horizon_size, 0), min(y + horizon_size + 1, size_y)):
+        for x_ in range(max(x - horizon_size, 0), min(x + horizon_size + 1, size_x)):
+            inc_counter(dead, no_food, with_food, dead, cell_type, last_tick, tick, x_, y_, amount)
+
+
+@jit(nopython=True, cache=True)
+def dead_pheromone_amount(no_food_nest_visit, mode):
+    amount = no_food_nest_visit / 10
+    if mode == MODE_TO_NEST:
+        amount /= 4
+    return amount
+
+
+@jit(nopython=True, cache=True)
+def stamp_expired(no_food, with_food, dead, cell_type, last_tick, tick, ant_x, ant_y, ant_mode,
+                  ant_no_food_nest_visit, count, no_food_nest_visit_thresh, horizon_size):
+    # the dead pheromones of all ants that expire this tick, before any ant moves
+    for i in range(count):
+        no_food_nest_visit = ant_no_food_nest_visit[i] + 1
+        if no_food_nest_visit > no_food_nest_visit_thresh:
+            stamp_dead(no_food, with_food, dead, cell_type, last_tick, tick, ant_x[i], ant_y[i],
+                       dead_pheromone_amount(no_food_nest_visit, ant_mode[i]), horizon_size)
+
+
+@jit(nopython=True, cache=True)
+def find_best_cell(no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, row0,
+                   horizon_dx, horizon_dy, horizon_dist, direction, x, y, mode, seed, serial):
+    # same scan as ArrayGrid.get_best_cell, returns the index into the horizon table or -1
+    # the layers may hold only the rows from row0 on, coordinates and bounds are in world cells
+    layer = no_food
+    aim_type = CELL_TYPE_NEST
+    if mode == MODE_TO_FOOD:
+        layer = with_food
+        aim_type = CELL_TYPE_FOOD
+
+    best = -1
+    max_level = -1
+    num_ties = 0
+    aim = -1
+    min_dist_aim = 10000000
+    for k in range(horizon_dx.shape[1]):
+        x_ = x + horizon_dx[direction, k]
+        y_ = y + horizon_dy[direction, k]
+        if x_ < 0 or x_ >= size_x or y_ < 0 or y_ >= size_y:
+            continue
+        row = y_ - row0
+        if cell_type[row, x_] == aim_type and horizon_dist[direction, k] < min_dist_aim:
+            min_dist_aim = horizon_dist[direction, k]
+            aim = k
+        if read_counter(dead, last_tick, tick, x_, row) > 0:
+            continue
+        level = read_counter(layer, last_tick, tick, x_, row)
+        if level == max_level:
+            num_ties += 1
+        elif level > max_level:
+            max_level = level
+            best = k
+            num_ties = 0
+
+    if aim >= 0:
+        return aim
+    if num_ties == 0:
+        return best
+
+    pick = random_int(seed, tick, serial, STREAM_TIE, num_ties)
+    for k in range(best + 1, horizon_dx.shape[1]):
+        x_ = x + horizon_dx[direction, k]
+        y_ = y + horizon_dy[direction, k]
+        if x_ < 0 or x_ >= size_x or y_ < 0 or y_ >= size_y:
+            continue
+        row = y_ - row0
+        if read_counter(dead, last_tick, tick, x_, row) > 0:
+            continue
+        if read_counter(layer, last_tick, tick, x_, row) == max_level:
+            if pick == 0:
+                return k
+            pick -= 1
+    return best
+
+
+@jit(nopython=True, cache=True)
+def update_direction(no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, row0,
+                     horizon_dx, horizon_dy, horizon_dist, direction, x, y, mode, seed, serial,
+                     randomize_range, randomize_threshold):
+    val = random_int(seed, tick, serial, STREAM_RANDOMIZE, randomize_range + 1)
+    if val > randomize_threshold or mode == MODE_LEAVING_NEST:
+        # random.choices([-1, 0, 1], weights=[1, 10, 1])
+        choice = random_int(seed, tick, serial, STREAM_TURN, 12)
+        if choice == 0:
+            return (direction + 7) % 8
+        if choice == 11:
+            return (direction + 1) % 8
+        return direction
+
+    k = find_best_cell(no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, row0,
+                       horizon_dx, horizon_dy, horizon_dist, direction, x, y, mode, seed, serial)
+    if k < 0:
+        return direction
+    diff_x = horizon_dx[direction, k]
+    diff_y = horizon_dy[direction, k]
+    dist = max(abs(diff_x), abs(diff_y))
+    # int(diff / dist) in Ant.update_direction only keeps the components that reach the full distance
+    sign_x = 0
+    if abs(diff_x) == dist:
+        sign_x = 1 if diff_x > 0 else -1
+    sign_y = 0
+    if abs(diff_y) == dist:
+        sign_y = 1 if diff_y > 0 else -1
+    return SIGNS_TO_DIRS[(sign_x + 1) * 3 + sign_y + 1]
+
+
+@jit(nopython=True, cache=True)
+def advance_ant(no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, row0,
+                horizon_dx, horizon_dy, horizon_dist, x, y, direction, mode, no_food_nest_visit, serial, seed,
+                no_food_nest_visit_thresh, randomize_range, randomize_threshold):
+    # Ant.update_position without writing to the grid, returns the new ant state together with the pheromone
+    # the ant leaves on the cell it started from and whether it picked up food there
+    deposit = DEPOSIT_NONE
+    amount = 0.0
+    took_food = False
+    here = cell_type[y - row0, x]
+    turn_back = False
+    if mode == MODE_LEAVING_NEST:
+        if here != CELL_TYPE_NEST:
+            return x, y, direction, MODE_TO_FOOD, no_food_nest_visit, deposit, amount, took_food
+    elif mode == MODE_TO_FOOD:
+        if here == CELL_TYPE_FOOD:
+            no_food_nest_visit = 1
+            mode = MODE_TO_NEST
+            took_food = True
+            turn_back = True
+        elif here == CELL_TYPE_NEST:
+            turn_back = True
+    elif mode == MODE_TO_NEST:
+        if here == CELL_TYPE_NEST:
+            no_food_nest_visit = 1
+            mode = MODE_TO_FOOD
+            turn_back = True
+        elif here == CELL_TYPE_FOOD:
+            turn_back = True
+
+    if turn_back:
+        x = min(max(x - DIR_DX[direction], 0), size_x - 1)
+        y = min(max(y - DIR_DY[direction], 0), size_y - 1)
+        return x, y, OPPOSITE_DIRS[direction], mode, no_food_nest_visit, deposit, amount, took_food
+
+    if mode == MODE_TO_NEST:
+        deposit = DEPOSIT_WITH_FOOD
+        amount = (no_food_nest_visit_thresh - no_food_nest_visit) / 10
+    elif mode == MODE_TO_FOOD:
+        deposit = DEPOSIT_NO_FOOD
+        amount = (no_food_nest_visit_thresh - no_food_nest_visit) / 20
+    direction = update_direction(no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, row0,
+                                 horizon_dx, horizon_dy, horizon_dist, direction, x, y, mode, seed, serial,
+                                 randomize_range, randomize_threshold)
+    x += DIR_DX[direction]
+    y += DIR_DY[direction]
+    if x < 0 or x == size_x:
+        x = min(max(x, 0), size_x - 1)
+        direction = MIRROR_X_DIRS[direction]
+    if y < 0 or y == size_y:
+        y = min(max(y, 0), size_y - 1)
+        direction = MIRROR_Y_DIRS[direction]
+    return x, y, direction, mode, no_food_nest_visit, deposit, amount, took_food
+
+
+@jit(nopython=True, cache=True)
+def apply_ant_events(no_food, with_food, dead, cell_type, food_id, last_tick, tick, food_amount, x, y,
+                     deposit, amount, took_food):
+    # writes what advance_ant decided for an ant that started on (x, y), returns the food actually taken
+    if deposit == DEPOSIT_WITH_FOOD:
+        inc_counter(with_food, no_food, with_food, dead, cell_type, last_tick, tick, x, y, amount)
+    elif deposit == DEPOSIT_NO_FOOD:
+        inc_counter(no_food, no_food, with_food, dead, cell_type, last_tick, tick, x, y, amount)
+    if took_food:
+        f = food_id[y, x]
+        if food_amount[f] > 0:
+            food_amount[f] -= 1
+            return 1
+    return 0
+
+
+@jit(nopython=True, cache=True)
+def spawn_ant(ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial, count, next_serial,
+              nest_x, nest_y, num_of_ants, tick, seed):
+    # AntsAlgorithm.update_ants, returns the new count and next serial
+    if count < num_of_ants and random_int(seed, tick, SPAWNER_SERIAL, STREAM_SPAWN, 1001) >= 600:
+        ant_x[count] = nest_x
+        ant_y[count] = nest_y
+        ant_direction[count] = random_int(seed, tick, next_serial, STREAM_HEADING, 8)
+        ant_mode[count] = MODE_LEAVING_NEST
+        ant_no_food_nest_visit[count] = 1
+        ant_serial[count] = next_serial
+        return count + 1, next_serial + 1
+    return count, next_serial
+
+
+@jit(nopython=True, cache=True)
+def decay_rows(no_food, with_food, dead, cell_type, first_row, last_row):
+    size_x = cell_type.shape[1]
+    for y in range(first_row, last_row):
+        for x in range(size_x):
+            if cell_type[y, x] != CELL_TYPE_PHEROMONES:
+                continue
+            if no_food[y, x] > 0:
+                no_food[y, x] -= 1
+            if with_food[y, x] > 0:
+                with_food[y, x] -= 1
+            if dead[y, x] > 0:
+                dead[y, x] -= 1
+            if no_food[y, x] == 0 and with_food[y, x] == 0 and dead[y, x] == 0:
+                cell_type[y, x] = CELL_TYPE_EMPTY
+
+
+@jit(nopython=True, cache=True)
+def clear_depleted_food(cell_type, food_id, food_amount, food_x, food_y, food_depleted, food_size):
+    size_y, size_x = cell_type.shape
+    for f in range(len(food_amount)):
+        if food_amount[f] != 0 or food_depleted[f]:
+            continue
+        for y in range(max(food_y[f], 0), min(food_y[f] + food_size, size_y)):
+            for x in range(max(food_x[f], 0), min(food_x[f] + food_size, size_x)):
+                if food_id[y, x] == f and cell_type[y, x] == CELL_TYPE_FOOD:
+                    cell_type[y, x] = CELL_TYPE_EMPTY
+        food_depleted[f] = 1
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def run_ticks(n_ticks, no_food, with_food, dead, cell_type, food_id, last_tick, tick,
+              food_amount, food_x, food_y, food_depleted, food_size,
+              ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial, count, next_serial,
+              nest_x, nest_y, num_of_ants, no_food_nest_visit_thresh, randomize_range, randomize_threshold,
+              horizon_dx, horizon_dy, horizon_dist, horizon_size, seed):
+    size_y, size_x = cell_type.shape
+    food_taken = 0
+    deaths = 0
+    for _ in range(n_ticks):
+        count, next_serial = spawn_ant(ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial,
+                                       count, next_serial, nest_x, nest_y, num_of_ants, tick, seed)
+
+        # AntsAlgorithm.update_positions, the expiring ants mark their windows first, then the ants run one after
+        # another and see each other's deposits
+        stamp_expired(no_food, with_food, dead, cell_type, last_tick, tick, ant_x, ant_y, ant_mode,
+                      ant_no_food_nest_visit, count, no_food_nest_visit_thresh, horizon_size)
+        alive = 0
+        for i in range(count):
+            x0 = ant_x[i]
+            y0 = ant_y[i]
+            no_food_nest_visit = ant_no_food_nest_visit[i] + 1
+            dying = no_food_nest_visit > no_food_nest_visit_thresh
+            x, y, direction, mode, no_food_nest_visit, deposit, amount, took_food = advance_ant(
+                no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, 0,
+                horizon_dx, horizon_dy, horizon_dist, x0, y0, ant_direction[i], ant_mode[i], no_food_nest_visit,
+                ant_serial[i], seed, no_food_nest_visit_thresh, randomize_range, randomize_threshold)
+            food_taken += apply_ant_events(no_food, with_food, dead, cell_type, food_id, last_tick, tick,
+                                           food_amount, x0, y0, deposit, amount, took_food)
+            if dying:
+                deaths += 1
+                continue
+            ant_x[alive] = x
+            ant_y[alive] = y
+            ant_direction[alive] = direction
+            ant_mode[alive] = mode
+            ant_no_food_nest_visit[alive] = no_food_nest_visit
+            ant_serial[alive] = ant_serial[i]
+            alive += 1
+        count = alive
+
+        # Grid.update
+        tick += 1
+        if last_tick is None:
+            decay_rows(no_food, with_food, dead, cell_type, 0, size_y)
+        clear_depleted_food(cell_type, food_id, food_amount, food_x, food_y, food_depleted, food_size)
+    return count, next_serial, tick, food_taken, deaths
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def run_ticks_parallel(n_ticks, no_food, with_food, dead, cell_type, food_id, last_tick, tick,
+                       food_amount, food_x, food_y, food_depleted, food_size,
+                       ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial, count, next_serial,
+                       nest_x, nest_y, num_of_ants, no_food_nest_visit_thresh, randomize_range, randomize_threshold,
+                       horizon_dx, horizon_dy, horizon_dist, horizon_size, seed, chunk):
+    # every ant decides from the grid as it was at the start of the tick, with the dead pheromones of the tick
+    # already stamped, and writes its move, deposit and pickup into its own slot of the event buffers, the events
+    # are then applied in ant order, so the outcome depends on the seed only and not on how many threads ran the
+    # chunks
+    size_y, size_x = cell_type.shape
+    food_taken = 0
+    deaths = 0
+    capacity = len(ant_x)
+    new_x = np.empty(capacity, dtype=np.int32)
+    new_y = np.empty(capacity, dtype=np.int32)
+    new_direction = np.empty(capacity, dtype=np.int8)
+    new_mode = np.empty(capacity, dtype=np.int8)
+    new_no_food_nest_visit = np.empty(capacity, dtype=np.int32)
+    deposit = np.empty(capacity, dtype=np.int8)
+    amount = np.empty(capacity, dtype=np.float64)
+    took_food = np.empty(capacity, dtype=np.bool_)
+    for _ in range(n_ticks):
+        count, next_serial = spawn_ant(ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial,
+                                       count, next_serial, nest_x, nest_y, num_of_ants, tick, seed)
+
+        stamp_expired(no_food, with_food, dead, cell_type, last_tick, tick, ant_x, ant_y, ant_mode,
+                      ant_no_food_nest_visit, count, no_food_nest_visit_thresh, horizon_size)
+        for c in prange((count + chunk - 1) // chunk):
+            for i in range(c * chunk, min((c + 1) * chunk, count)):
+                x, y, direction, mode, no_food_nest_visit, deposit_, amount_, took_food_ = advance_ant(
+                    no_food, with_food, dead, cell_type, last_tick, tick, size_x, size_y, 0,
+                    horizon_dx, horizon_dy, horizon_dist, ant_x[i], ant_y[i], ant_direction[i], ant_mode[i],
+                    ant_no_food_nest_visit[i] + 1, ant_serial[i], seed, no_food_nest_visit_thresh,
+                    randomize_range, randomize_threshold)
+                new_x[i] = x
+                new_y[i] = y
+                new_direction[i] = direction
+                new_mode[i] = mode
+                new_no_food_nest_visit[i] = no_food_nest_visit
+                deposit[i] = deposit_
+                amount[i] = amount_
+                took_food[i] = took_food_
+
+        alive = 0
+        for i in range(count):
+            dying = ant_no_food_nest_visit[i] + 1 > no_food_nest_visit_thresh
+            food_taken += apply_ant_events(no_food, with_food, dead, cell_type, food_id, last_tick, tick,
+                                           food_amount, ant_x[i], ant_y[i], deposit[i], amount[i], took_food[i])
+            if dying:
+                deaths += 1
+                continue
+            ant_x[alive] = new_x[i]
+            ant_y[alive] = new_y[i]
+            ant_direction[alive] = new_direction[i]
+            ant_mode[alive] = new_mode[i]
+            ant_no_food_nest_visit[alive] = new_no_food_nest_visit[i]
+            ant_serial[alive] = ant_serial[i]
+            alive += 1
+        count = alive
+
+        tick += 1
+        if last_tick is None:
+            for c in prange((size_y + DECAY_ROWS - 1) // DECAY_ROWS):
+                decay_rows(no_food, with_food, dead, cell_type, c * DECAY_ROWS, min((c + 1) * DECAY_ROWS, size_y))
+        clear_depleted_food(cell_type, food_id, food_amount, food_x, food_y, food_depleted, food_size)
+    return count, next_serial, tick, food_taken, deaths
+
+
+class KernelAntsAlgorithm(ColonyAntsAlgorithm):
+    # runs whole ticks in one compiled kernel, falls back to the numpy colony when numba is not installed
+    def __init__(self, size_x=SIZE_X, size_y=SIZE_Y, lazy_evaporation=False, seed=None, headless=False, config=None):
+        super().__init__(size_x, size_y, lazy_evaporation=lazy_evaporation, seed=seed, headless=headless,
+                         config=config)
+
+    @property
+    def seed(self):
+        return self.random.seed
+
+    def process_logic(self):
+        self.advance(1)
+
+    def advance(self, n_ticks):
+        if not NUMBA_AVAILABLE:
+            for _ in range(n_ticks):
+                ColonyAntsAlgorithm.process_logic(self)
+            return
+        self.run_kernel(run_ticks, n_ticks)
+
+    def run_kernel(self, kernel, n_ticks, *extra_args):
+        # the whole tick is one phase here, there are no get_best_cell calls to count outside the kernel
+        start = time.perf_counter()
+        next_serial = self.colony.next_serial
+        grid = self.grid
+        colony = self.colony
+        config = self.config
+        colony.reserve(config.num_of_ants)
+        table = grid.horizon_table
+        foods = grid.foods
+        food_amount = np.array([food.amount for food in foods], dtype=np.int32)
+        food_x = np.array([food.x for food in foods], dtype=np.int32)
+        food_y = np.array([food.y for food in foods], dtype=np.int32)
+        food_depleted = np.array([food_id in grid.depleted_foods for food_id in range(len(foods))], dtype=np.uint8)
+
+        colony.count, colony.next_serial, grid.tick, food_taken, deaths = kernel(
+            n_ticks, grid.visited_no_food_counter, grid.visited_with_food_counter, grid.visited_dead_counter,
+            grid.cell_type, grid.food_id, grid.last_tick, grid.tick,
+            food_amount, food_x, food_y, food_depleted, config.food_source_size,
+            colony.x, colony.y, colony.direction, colony.mode, colony.no_food_nest_visit, colony.serial,
+            colony.count, colony.next_serial,
+            self.nest.x, self.nest.y, config.num_of_ants, config.no_food_nest_visit_thresh,
+            config.randomize_pos_range, config.randomize_pos_threshold,
+            table.dx, table.dy, table.dist, table.horizon_size, self.seed, *extra_args)
+        self.tick += n_ticks
+        self.deaths += deaths
+        grid.activate_tiles()
+
+        for food, amount in zip(foods, food_amount.tolist()):
+            food.amount = amount
+        grid.depleted_foods.update(np.flatnonzero(food_depleted).tolist())
+        self.profiler.add('kernel', time.perf_counter() - start)
+        self.profiler.count('ants_spawned', colony.next_serial - next_serial)
+        self.profiler.count('ants_removed', int(deaths))
+        self.profiler.end_tick(n_ticks)
+
+
+class ParallelAntsAlgorithm(KernelAntsAlgorithm):
+    # the ants of a tick are split into chunks run on all cores, every ant sees the grid of the tick start and the
+    # deposits are applied afterwards in ant order, so a seed gives the same run for any thread count, but not the
+    # same run as KernelAntsAlgorithm where each ant already sees the deposits of the ants before it
+    def __init__(self, size_x=SIZE_X, size_y=SIZE_Y, lazy_evaporation=False, seed=None, headless=False,
+                 threads=None, chunk=PARALLEL_CHUNK, config=None):
+        super().__init__(size_x, size_y, lazy_evaporation=lazy_evaporation, seed=seed, headless=headless,
+                         config=config)
+        self.threads = threads
+        self.chunk = chunk
+
+    def advance(self, n_ticks):
+        if not NUMBA_AVAILABLE:
+            KernelAntsAlgorithm.advance(self, n_ticks)
+            return
+        if self.threads is None:
+            self.run_kernel(run_ticks_parallel, n_ticks, self.chunk)
+            return
+        # the thread count is process wide, other engines in the process keep theirs
+        threads = get_num_threads()
+        set_num_threads(self.threads)
+        try:
+            self.run_kernel(run_ticks_parallel, n_ticks, self.chunk)
+        finally:
+            set_num_threads(threads)
@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import signal
+import threading
+import collections
+
+# python AntsAlg --headless --ticks 2000 --profile --sample ants.folded
+# flamegraph.pl ants.folded > ants.svg
+
+# ticks summed into one window, and windows kept for the rolling report
+PROFILE_WINDOW = 100
+PROFILE_WINDOWS = 10
+SAMPLE_INTERVAL = 0.005
+
+
+class ProfileWindow:
+    def __init__(self):
+        self.ticks = 0
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.Counter()
+        self.counters = collections.Counter()
+        # values read when the window was closed, e.g. the active cells
+        self.gauges = {}
+
+    def merge(self, other):
+        self.ticks += other.ticks
+        for phase, seconds in other.seconds.items():
+            self.seconds[phase] += seconds
+        self.calls.update(other.calls)
+        self.counters.update(other.counters)
+        self.gauges.update(other.gauges)
+
+
+class PhaseProfiler:
+    # wall time per phase and event counters of a running simulation, summed per window of `window` ticks, the last
+    # `windows` windows make the rolling report and every closed window is also added to the totals
+    def __init__(self, window=PROFILE_WINDOW, windows=PROFILE_WINDOWS):
+        self.window = window
+        self.current = ProfileWindow()
+        self.windows = collections.deque(maxlen=windows)
+        self.total = ProfileWindow()
+        self.watched = {}
+
+    def add(self, phase, seconds):
+        self.current.seconds[phase] += seconds
+        self.current.calls[phase] += 1
+
+    def count(self, name, amount=1):
+        self.current.counters[name] += amount
+
+    def watch(self, name, read):
+        # read() is called when a window closes, for values too costly to follow every tick
+        self.watched[name] = read
+
+    def end_tick(self, n_ticks=1):
+        self.current.ticks += n_ticks
+        if self.current.ticks >= self.window:
+            self.roll()
+
+    def roll(self):
+        for name, read in self.watched.items():
+            self.current.gauges[name] = read()
+        self.windows.append(self.current)
+        self.total.merge(self.current)
+        self.current = ProfileWindow()
+
+    def merged(self, windows):
+        merged = ProfileWindow()
+        for window in windows:
+            merged.merge(window)
+        return merged
+
+    def report(self, rolling=True):
+        # the kept windows (or the whole run) and the window being filled, times in ms, counters per tick
+        window = self.merged(list(self.windows) + [self.current]) if rolling else \
+            self.merged([self.total, self.current])
+        ticks = window.ticks
+        return {
+            'ticks': ticks,
+            'phases': {phase: {'calls': window.calls[phase],
+                               'total_ms': seconds * 1e3,
+                               'ms_per_call': seconds * 1e3 / window.calls[phase],
+                               'ms_per_tick': seconds * 1e3 / ticks if ticks else None}
+                       for phase, seconds in window.seconds.items()},
+            'counters': {name: {'total': value, 'per_tick': value / ticks if ticks else None}
+                         for name, value in window.counters.items()},
+            'gauges': dict(window.gauges),
+        }
+
+    def format_report(self, rolling=True):
+        report = self.report(rolling)
+        lines = [f"{'last' if rolling else 'all'} {report['ticks']} ticks"]
+        for phase, stats in sorted(report['phases'].items(), key=lambda item: -item[1]['total_ms']):
+            per_tick = '' if stats['ms_per_tick'] is None else f", {stats['ms_per_tick']:.3f} ms/tick"
+            lines.append(f"  {phase:<18} {stats['total_ms']:10.1f} ms {stats['calls']:8d} calls "
+                         f"{stats['ms_per_call']:.3f} ms/call{per_tick}")
+        for name, stats in sorted(report['counters'].items()):
+            per_tick = '' if stats['per_tick'] is None else f", {stats['per_tick']:.1f}/tick"
+            lines.append(f"  {name:<18} {stats['total']:10d}{per_tick}")
+        for name, value in sorted(report['gauges'].items()):
+            lines.append(f'  {name:<18} {value:10d}')
+        return '\n'.join(lines)
+
+
+def collapse_stack(frame):
+    # module:function from the outermost frame in, as in the folded stacks of flamegraph.pl
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    # counts the stacks of all threads every `interval` seconds, the thread name is the root frame and compiled
+    # kernels show as the python function that called them, where there is setitimer the samples are taken in
+    # a SIGALRM handler, which runs at the next bytecode of the main thread, a sampling thread would only get the
+    # GIL when the simulation releases it and so mostly see the numpy calls that do
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.running = False
+        self.thread = None
+        self.use_timer = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+    def start(self):
+        self.running = True
+        if self.use_timer:
+            signal.signal(signal.SIGALRM, self.on_timer)
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+            return
+        self.thread = threading.Thread(target=self.run, name='StackSampler', daemon=True)
+        self.thread.start()
+
+    def on_timer(self, signum, frame):
+        self.sample({threading.main_thread().ident: frame})
+
+    def run(self):
+        while self.running:
+            self.sample({})
+            time.sleep(self.interval)
+
+    def sample(self, frames):
+        # `frames` replaces the frames of sys._current_frames, for the main thread that would be the timer handler
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            frame = frames.get(ident, frame)
+            if ident == own and ident not in frames:
+                continue
+            self.stacks[f"{names.get(ident, ident)};{collapse_stack(frame)}"] += 1
+        self.samples += 1
+
+    def stop(self):
+        self.running = False
+        if self.use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
@@ -0,0 +1,480 @@
+import os
+import sys
+import json
+import zlib
+import time
+import struct
+import argparse
+import contextlib
+import numpy as np
+
+import antsalg2
+from antsalg2 import AntsAlgorithm, ArrayGrid, FrameRenderer, ViewSettings, get_default_config, SIZE_X
+from antsalg2 import CELL_TYPE_EMPTY, CELL_TYPE_FOOD, CELL_TYPE_PHEROMONES
+from antcolony import ColonyAntsAlgorithm
+from antkernel import KernelAntsAlgorithm
+
+# python AntsAlg/antreplay.py record run.antrec --engine kernel --ticks 100000
+# python AntsAlg/antreplay.py play run.antrec --speed 500
+#
+# space pause, left/right one tick, page up/down one keyframe, home/end, up/down speed x2 / /2, b backwards,
+# click or drag anywhere to scrub, f/n/d/h pheromones and horizons as in the live window
+
+KEYFRAME_TICKS = 250
+# keyframes of big worlds take long to compress, deltas are small
+KEYFRAME_COMPRESSION_LEVEL = 1
+DELTA_COMPRESSION_LEVEL = 6
+PLAYBACK_SPEED = 60
+SCRUB_BAR_HEIGHT = 6
+SEED = 1
+
+MAGIC = b'ANTREC1\n'
+INDEX_MAGIC = b'ANTINDEX'
+KEYFRAME = 0
+DELTA = 1
+INDEX = 2
+# kind, tick, compressed payload bytes
+FRAME_HEADER = struct.Struct('<BQI')
+TRAILER = struct.Struct('<Q8s')
+
+KEYFRAME_DTYPES = [np.uint8, np.int16, np.int16, np.int16, np.int16, np.int32, np.int32, np.int32, np.uint8,
+                   np.uint8]
+DELTA_DTYPES = [np.uint32, np.uint8, np.int16, np.int16, np.int16, np.int32, np.int32, np.int32, np.uint8, np.uint8]
+
+ENGINES = {
+    'grid': lambda size, seed: AntsAlgorithm(size, size, seed=seed, headless=True),
+    'array': lambda size, seed: AntsAlgorithm(size, size, grid_class=ArrayGrid, seed=seed, headless=True),
+    'colony': lambda size, seed: ColonyAntsAlgorithm(size, size, seed=seed, headless=True),
+    'kernel': lambda size, seed: KernelAntsAlgorithm(size, size, seed=seed, headless=True),
+}
+
+
+def pack(arrays, level):
+    # the bytes of each array are stored plane by plane, the high bytes of small values are zero runs then
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    lengths = np.array([array.nbytes for array in arrays], dtype=np.uint64)
+    planes = [array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes() for array in arrays]
+    return zlib.compress(lengths.tobytes() + b''.join(planes), level)
+
+
+def unpack(payload, dtypes):
+    data = zlib.decompress(payload)
+    lengths = np.frombuffer(data, dtype=np.uint64, count=len(dtypes)).tolist()
+    arrays = []
+    offset = 8 * len(dtypes)
+    for dtype, length in zip(dtypes, lengths):
+        itemsize = np.dtype(dtype).itemsize
+        planes = np.frombuffer(data, dtype=np.uint8, count=length, offset=offset).reshape(itemsize, -1)
+        arrays.append(np.ascontiguousarray(planes.T).view(dtype).ravel())
+        offset += length
+    return arrays
+
+
+class ReplayState:
+    # grid layers, food amounts and ants of one recorded tick, the recorder and the replay keep the same state and
+    # change it with the same apply_changes, so what is written is exactly what is decoded. The counters evaporate
+    # lazily from the tick they were written at, as in a lazy ArrayGrid, so a delta only touches its own cells and
+    # the whole grid is only evaluated by get_layers
+    def __init__(self, size_x, size_y):
+        self.tick = None
+        self.cell_type = np.zeros((size_y, size_x), dtype=np.uint8)
+        self.no_food = np.zeros((size_y, size_x), dtype=np.int16)
+        self.with_food = np.zeros((size_y, size_x), dtype=np.int16)
+        self.dead = np.zeros((size_y, size_x), dtype=np.int16)
+        self.written = np.zeros((size_y, size_x), dtype=np.int32)
+        self.food_id = np.full((size_y, size_x), -1, dtype=np.int16)
+        self.amounts = np.zeros(0, dtype=np.int32)
+        self.ant_x = np.zeros(0, dtype=np.int32)
+        self.ant_y = np.zeros(0, dtype=np.int32)
+        self.ant_mode = np.zeros(0, dtype=np.uint8)
+        self.ant_direction = np.zeros(0, dtype=np.uint8)
+
+    def load_keyframe(self, tick, arrays):
+        for dst, src in zip((self.cell_type, self.no_food, self.with_food, self.dead, self.food_id), arrays[:5]):
+            np.copyto(dst, src.reshape(dst.shape))
+        self.amounts, self.ant_x, self.ant_y, self.ant_mode, self.ant_direction = (array.copy() for array in
+                                                                                   arrays[5:])
+        self.written[:] = tick
+        self.tick = tick
+
+    def set_amounts(self, amounts):
+        # the food cells of a source are emptied on the tick it runs out
+        depleted = np.flatnonzero((amounts == 0) & (self.amounts != 0))
+        if len(depleted):
+            self.cell_type[np.isin(self.food_id, depleted) & (self.cell_type == CELL_TYPE_FOOD)] = CELL_TYPE_EMPTY
+        self.amounts = amounts
+
+    def apply_delta(self, tick, arrays):
+        self.set_amounts(self.amounts + arrays[5])
+        self.apply_changes(tick, arrays)
+
+    def apply_changes(self, tick, arrays):
+        # the counter deltas are relative to what evaporation alone would have left at `tick`
+        gaps, cell_type, no_food, with_food, dead, _, ant_x, ant_y, ant_mode, ant_direction = arrays
+        cells = np.cumsum(gaps, dtype=np.int64)
+        elapsed = tick - self.written.ravel()[cells]
+        for layer, change in ((self.no_food, no_food), (self.with_food, with_food), (self.dead, dead)):
+            flat = layer.ravel()
+            flat[cells] = np.maximum(flat[cells] - elapsed, 0) + change
+        self.written.ravel()[cells] = tick
+        self.cell_type.ravel()[cells] = cell_type
+        # ant positions are relative to the ant at the same index a frame before, the ants past the end of the
+        # previous frame are absolute
+        kept = min(len(ant_x), len(self.ant_x))
+        ant_x = ant_x.copy()
+        ant_x[:kept] += self.ant_x[:kept]
+        ant_y = ant_y.copy()
+        ant_y[:kept] += self.ant_y[:kept]
+        self.ant_x = ant_x
+        self.ant_y = ant_y
+        self.ant_mode = ant_mode.copy()
+        self.ant_direction = ant_direction.copy()
+        self.tick = tick
+
+    def get_counters(self, tick):
+        # cell type and the three counters at `tick`
+        elapsed = np.minimum(tick - self.written, 1000).astype(np.int16)
+        counters = []
+        for layer in (self.no_food, self.with_food, self.dead):
+            counter = layer - elapsed
+            np.maximum(counter, 0, out=counter)
+            counters.append(counter)
+        no_food, with_food, dead = counters
+        cell_type = self.cell_type.copy()
+        cell_type[(cell_type == CELL_TYPE_PHEROMONES) & (no_food == 0) & (with_food == 0) & (dead == 0)] = \
+            CELL_TYPE_EMPTY
+        return cell_type, no_food, with_food, dead
+
+    def get_layers(self):
+        # same layers as Grid.get_layers, for FrameRenderer
+        food_amount = np.append(self.amounts, 0)[self.food_id]
+        return self.get_counters(self.tick) + (food_amount,)
+
+    def get_ant_arrays(self):
+        return self.ant_x, self.ant_y, self.ant_mode, self.ant_direction
+
+
+class Recorder:
+    # streams recorded ticks to a file, a keyframe with the whole state every keyframe_interval ticks and in between
+    # the cells that differ from the evaporated previous frame, the ant moves and the food taken
+    def __init__(self, path, sim, keyframe_interval=KEYFRAME_TICKS):
+        self.file = open(path, 'wb')
+        self.size_x = sim.world.size_x
+        self.size_y = sim.world.size_y
+        self.keyframe_interval = keyframe_interval
+        self.state = ReplayState(self.size_x, self.size_y)
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        self.last_tick = None
+        self.frames = 0
+        header = json.dumps({'size': [self.size_x, self.size_y], 'keyframe_interval': keyframe_interval,
+                             'seed': sim.random.seed, 'engine': type(sim).__name__}).encode()
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, sim):
+        if self.last_tick is not None and sim.tick <= self.last_tick:
+            raise ValueError(f'tick {sim.tick} was recorded after tick {self.last_tick}')
+        cell_type, no_food, with_food, dead, _ = sim.grid.get_layers()
+        amounts = np.array([food.amount for food in sim.food_sources], dtype=np.int32)
+        ant_x, ant_y, ant_mode, ant_direction = (np.asarray(values) for values in sim.get_ant_arrays())
+        ant_x = ant_x.astype(np.int32)
+        ant_y = ant_y.astype(np.int32)
+        ant_mode = ant_mode.astype(np.uint8)
+        ant_direction = ant_direction.astype(np.uint8)
+
+        if not self.keyframe_ticks or sim.tick - self.keyframe_ticks[-1] >= self.keyframe_interval:
+            food_id = sim.grid.export_state(sim.food_sources)['food_id']
+            arrays = [cell_type.astype(np.uint8), no_food.astype(np.int16), with_food.astype(np.int16),
+                      dead.astype(np.int16), food_id.astype(np.int16), amounts, ant_x, ant_y, ant_mode,
+                      ant_direction]
+            self.keyframe_ticks.append(sim.tick)
+            self.keyframe_offsets.append(self.file.tell())
+            self.write_frame(KEYFRAME, sim.tick, arrays, KEYFRAME_COMPRESSION_LEVEL)
+            self.state.load_keyframe(sim.tick, arrays)
+        else:
+            state = self.state
+            amounts_taken = amounts - state.amounts
+            state.set_amounts(amounts)
+            predicted = state.get_counters(sim.tick)
+            changed = np.zeros(cell_type.shape, dtype=bool)
+            for layer, prediction in zip((cell_type, no_food, with_food, dead), predicted):
+                changed |= layer != prediction
+            cells = np.flatnonzero(changed)
+            kept = min(len(ant_x), len(state.ant_x))
+            arrays = [np.diff(cells, prepend=0).astype(np.uint32), cell_type.ravel()[cells].astype(np.uint8),
+                      (no_food.ravel()[cells] - predicted[1].ravel()[cells]).astype(np.int16),
+                      (with_food.ravel()[cells] - predicted[2].ravel()[cells]).astype(np.int16),
+                      (dead.ravel()[cells] - predicted[3].ravel()[cells]).astype(np.int16),
+                      amounts_taken,
+                      np.concatenate([ant_x[:kept] - state.ant_x[:kept], ant_x[kept:]]),
+                      np.concatenate([ant_y[:kept] - state.ant_y[:kept], ant_y[kept:]]), ant_mode, ant_direction]
+            self.write_frame(DELTA, sim.tick, arrays)
+            state.apply_changes(sim.tick, arrays)
+        self.last_tick = sim.tick
+        self.frames += 1
+
+    def write_frame(self, kind, tick, arrays, level=DELTA_COMPRESSION_LEVEL):
+        payload = pack(arrays, level)
+        self.file.write(FRAME_HEADER.pack(kind, tick, len(payload)))
+        self.file.write(payload)
+
+    def close(self):
+        if self.file.closed:
+            return
+        offset = self.file.tell()
+        last_tick = 0 if self.last_tick is None else self.last_tick
+        self.write_frame(INDEX, last_tick, [np.array(self.keyframe_ticks, dtype=np.int64),
+                                            np.array(self.keyframe_offsets, dtype=np.int64)])
+        self.file.write(TRAILER.pack(offset, INDEX_MAGIC))
+        self.file.close()
+
+
+def record_run(sim, path, ticks, every=1, keyframe_interval=KEYFRAME_TICKS):
+    # advances sim by `ticks` ticks and records every `every`-th tick, the first recorded tick is the current one
+    end = sim.tick + ticks
+    with Recorder(path, sim, keyframe_interval) as recorder:
+        recorder.record(sim)
+        while sim.tick < end:
+            sim.advance(min(every, end - sim.tick))
+            recorder.record(sim)
+    return recorder
+
+
+class Replay:
+    # decodes a recording tick by tick, seek() starts from the closest keyframe unless the requested tick is a few
+    # deltas ahead of the current one, so going backwards costs at most one keyframe interval of deltas
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an ants recording')
+        length, = struct.unpack('<I', self.file.read(4))
+        self.header = json.loads(self.file.read(length))
+        self.size_x, self.size_y = self.header['size']
+        self.keyframe_interval = self.header['keyframe_interval']
+        self.frames_offset = self.file.tell()
+        self.read_index()
+        if not self.keyframe_ticks:
+            raise ValueError(f'{path} has no recorded ticks')
+        self.first_tick = self.keyframe_ticks[0]
+        self.state = ReplayState(self.size_x, self.size_y)
+        self.next_offset = None
+
+    def read_index(self):
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        if size >= self.frames_offset + TRAILER.size:
+            self.file.seek(size - TRAILER.size)
+            offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+            if magic == INDEX_MAGIC:
+                kind, last_tick, payload = self.read_frame(offset)
+                ticks, offsets = unpack(payload, [np.int64, np.int64])
+                self.keyframe_ticks = ticks.tolist()
+                self.keyframe_offsets = offsets.tolist()
+                self.last_tick = last_tick
+                return
+        # the recorder did not close the file, the frame headers are walked to rebuild the index
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        self.last_tick = None
+        offset = self.frames_offset
+        while True:
+            self.file.seek(offset)
+            header = self.file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            kind, tick, length = FRAME_HEADER.unpack(header)
+            if offset + FRAME_HEADER.size + length > size or kind == INDEX:
+                break
+            if kind == KEYFRAME:
+                self.keyframe_ticks.append(tick)
+                self.keyframe_offsets.append(offset)
+            self.last_tick = tick
+            offset += FRAME_HEADER.size + length
+
+    def read_frame(self, offset):
+        # (kind, tick, payload), None past the last frame
+        self.file.seek(offset)
+        header = self.file.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return None
+        kind, tick, length = FRAME_HEADER.unpack(header)
+        payload = self.file.read(length)
+        if len(payload) < length:
+            return None
+        self.next_offset = offset + FRAME_HEADER.size + length
+        return kind, tick, payload
+
+    def peek_frame(self, offset):
+        # (kind, tick) of the frame at offset without reading its payload
+        self.file.seek(offset)
+        header = self.file.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return None, None
+        kind, tick, _ = FRAME_HEADER.unpack(header)
+        return kind, tick
+
+    def seek(self, tick):
+        # the state of the last recorded tick at or before `tick`
+        tick = min(max(tick, self.first_tick), self.last_tick)
+        keyframe = np.searchsorted(self.keyframe_ticks, tick, side='right') - 1
+        state = self.state
+        if state.tick is None or tick < state.tick or self.keyframe_ticks[keyframe] > state.tick:
+            _, keyframe_tick, payload = self.read_frame(self.keyframe_offsets[keyframe])
+            state.load_keyframe(keyframe_tick, unpack(payload, KEYFRAME_DTYPES))
+        while state.tick < tick:
+            kind, next_tick = self.peek_frame(self.next_offset)
+            if kind != DELTA or next_tick > tick:
+                break
+            _, next_tick, payload = self.read_frame(self.next_offset)
+            state.apply_delta(next_tick, unpack(payload, DELTA_DTYPES))
+        return state
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayViewer:
+    # plays a Replay in a pygame window with the FrameRenderer of the live simulation
+    def __init__(self, replay, speed=PLAYBACK_SPEED, config=None):
+        import pygame
+        self.pygame = pygame
+        self.replay = replay
+        self.speed = speed
+        self.paused = False
+        self.running = True
+        self.scrubbing = False
+        self.position = float(replay.first_tick)
+        if config is None:
+            config = get_default_config()
+        self.config = config
+        # toggled by the keys as the view of the live window
+        self.view = ViewSettings(config)
+        pygame.init()
+        self.width = replay.size_x * config.cell_size
+        self.height = replay.size_y * config.cell_size
+        self.screen = pygame.display.set_mode((self.width, self.height + SCRUB_BAR_HEIGHT))
+        self.clock = pygame.time.Clock()
+        self.renderer = FrameRenderer(replay.size_x, replay.size_y, config, self.view)
+
+    def seek(self, tick):
+        self.position = float(min(max(tick, self.replay.first_tick), self.replay.last_tick))
+
+    def scrub_to(self, x):
+        share = min(max(x / self.width, 0.0), 1.0)
+        self.seek(self.replay.first_tick + share * (self.replay.last_tick - self.replay.first_tick))
+
+    def process_input(self):
+        pygame = self.pygame
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    self.paused = not self.paused
+                elif event.key == pygame.K_RIGHT:
+                    self.paused = True
+                    self.seek(int(self.position) + 1)
+                elif event.key == pygame.K_LEFT:
+                    self.paused = True
+                    self.seek(int(self.position) - 1)
+                elif event.key == pygame.K_PAGEUP:
+                    self.seek(self.position + self.replay.keyframe_interval)
+                elif event.key == pygame.K_PAGEDOWN:
+                    self.seek(self.position - self.replay.keyframe_interval)
+                elif event.key == pygame.K_HOME:
+                    self.seek(self.replay.first_tick)
+                elif event.key == pygame.K_END:
+                    self.seek(self.replay.last_tick)
+                elif event.key == pygame.K_UP:
+                    self.speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    self.speed /= 2
+                elif event.key == pygame.K_b:
+                    self.speed = -self.speed
+                elif event.key == pygame.K_f:
+                    self.view.draw_food_pheromones = not self.view.draw_food_pheromones
+                elif event.key == pygame.K_n:
+                    self.view.draw_nest_pheromones = not self.view.draw_nest_pheromones
+                elif event.key == pygame.K_d:
+                    self.view.draw_dead_pheromones = not self.view.draw_dead_pheromones
+                elif event.key == pygame.K_h:
+                    self.view.draw_horizons = not self.view.draw_horizons
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                self.scrubbing = True
+                self.scrub_to(event.pos[0])
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self.scrubbing = False
+            elif event.type == pygame.MOUSEMOTION and self.scrubbing:
+                self.scrub_to(event.pos[0])
+
+    def draw(self, state):
+        pygame = self.pygame
+        self.renderer.draw_layers(state.get_layers())
+        self.renderer.draw_ants(*state.get_ant_arrays())
+        self.renderer.blit(self.screen)
+        replay = self.replay
+        share = (state.tick - replay.first_tick) / max(replay.last_tick - replay.first_tick, 1)
+        pygame.draw.rect(self.screen, antsalg2.DARKGREY, (0, self.height, self.width, SCRUB_BAR_HEIGHT))
+        pygame.draw.rect(self.screen, antsalg2.GREY, (0, self.height, int(share * self.width), SCRUB_BAR_HEIGHT))
+        pygame.display.flip()
+        pygame.display.set_caption(f'Ants Replay tick {state.tick}/{replay.last_tick} '
+                                   f'{"paused" if self.paused else f"{self.speed:g} ticks/s"} '
+                                   f'ants {len(state.ant_x)} food {int(state.amounts.sum())}')
+
+    def run(self):
+        last_frame = time.perf_counter()
+        while self.running:
+            self.clock.tick(self.config.target_fps)
+            now = time.perf_counter()
+            self.process_input()
+            if not self.paused and not self.scrubbing:
+                self.seek(self.position + self.speed * (now - last_frame))
+            last_frame = now
+            self.draw(self.replay.seek(int(self.position)))
+        self.pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record headless runs and replay them')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='run a headless simulation into a recording')
+    record.add_argument('path')
+    record.add_argument('--engine', choices=sorted(ENGINES), default='kernel')
+    record.add_argument('--size', type=int, default=SIZE_X)
+    record.add_argument('--ticks', type=int, default=10000)
+    record.add_argument('--seed', type=int, default=SEED)
+    record.add_argument('--every', type=int, default=1, help='ticks between recorded frames')
+    record.add_argument('--keyframe', type=int, default=KEYFRAME_TICKS, help='ticks between keyframes')
+    play = commands.add_parser('play', help='show a recording')
+    play.add_argument('path')
+    play.add_argument('--speed', type=float, default=PLAYBACK_SPEED, help='ticks per second')
+    play.add_argument('--start', type=int, help='tick to start at')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        # the engines print about nests and removed ants
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            sim = ENGINES[args.engine](args.size, args.seed)
+            recorder = record_run(sim, args.path, args.ticks, args.every, args.keyframe)
+        print(f'{recorder.frames} frames, {len(recorder.keyframe_ticks)} keyframes, '
+              f'{os.path.getsize(args.path) / 2 ** 20:.1f} MB in {time.perf_counter() - start:.1f}s')
+        return 0
+
+    replay = Replay(args.path)
+    viewer = ReplayViewer(replay, args.speed)
+    if args.start is not None:
+        viewer.seek(args.start)
+    viewer.run()
+    replay.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
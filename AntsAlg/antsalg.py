@@ -2,6 +2,7 @@ import pygame
 import math
 import random
 from itertools import chain
+import numpy as np
 
 NUM_OF_ANTS = 100
 NUM_OF_FOOD_SOURCES = 1
@@ -9,6 +10,15 @@ MAX_FOOD_AMOUNT = 1000
 WORLD_SIZE = 200
 
 RADIUS = 10
+# ants head for a food source closer than this
+FOOD_SEARCH_RADIUS = 10
+# buckets of the food index, twice the search radius so a search looks into 2x2 buckets at most
+FOOD_BUCKET_SIZE = 20
+# headings an ant can see any cell at, |atan2 - direction| < pi/2 needs a direction within 3pi/2 of zero, are split
+# into this many bins for the neighbour masks
+HEADING_BINS = 512
+# slack for the rounding of atan2 when a cell is put inside or outside a mask without checking it
+ANGLE_EPSILON = 1e-9
 
 
 class Cell:
@@ -29,13 +39,85 @@ class Grid:
     def __init__(self, size_x, size_y):
         self.size_x = size_x
         self.size_y = size_y
-        self.cells = [[Cell(j, i) for j in range(size_x)] for i in range(size_y)]
+        self.visited_no_food_counter = np.zeros((size_y, size_x), dtype=np.int64)
+        self.visited_with_food_counter = np.zeros((size_y, size_x), dtype=np.int64)
+
+    def get_cell(self, x, y):
+        cell = Cell(x, y)
+        cell.visited_no_food_counter = int(self.visited_no_food_counter[y, x])
+        cell.visited_with_food_counter = int(self.visited_with_food_counter[y, x])
+        return cell
 
     def inc_no_food_counter(self, x, y):
-        self.cells[y][x].visited_no_food_counter += 50
+        self.visited_no_food_counter[y, x] += 50
 
     def inc_with_food_counter(self, x, y):
-        self.cells[y][x].visited_with_food_counter += 50
+        self.visited_with_food_counter[y, x] += 50
+
+
+class NeighbourMasks:
+    # the cells update_positions hands to an ant are the window offsets whose cell lies within pi/2 of its heading,
+    # seen from the ant's exact position, an offset is seen at an angle between those of the corners of the ant's
+    # cell, so for a bin of headings most offsets are forward or not for any heading and position in it, and only
+    # the offsets on the edge of the half-plane need the atan2 of the ant
+    def __init__(self, radius=RADIUS, bins=HEADING_BINS):
+        offsets = [(dist_x, dist_y) for dist_x in chain(range(-radius, -1), range(1, radius))
+                   for dist_y in chain(range(-radius, -1), range(1, radius))]
+        dx = np.array([dist_x for dist_x, _ in offsets])
+        dy = np.array([dist_y for _, dist_y in offsets])
+        # the window leaves out offsets -1 and 0, so the ant's cell never straddles an axis seen from a cell and
+        # the angles over it are spanned by its corners
+        angles = np.array([[math.atan2(dist_y - corner_y, dist_x - corner_x) for corner_x in (0, 1)
+                            for corner_y in (0, 1)] for dist_x, dist_y in offsets])
+        min_angle = angles.min(axis=1) - ANGLE_EPSILON
+        max_angle = angles.max(axis=1) + ANGLE_EPSILON
+        self.radius = radius
+        self.min_direction = -1.5 * math.pi
+        self.bin_size = 3 * math.pi / bins
+        self.dx = []
+        self.dy = []
+        self.check = []
+        for heading_bin in range(bins):
+            low = self.min_direction + heading_bin * self.bin_size - ANGLE_EPSILON
+            high = low + self.bin_size + 2 * ANGLE_EPSILON
+            inside = (min_angle > high - math.pi / 2) & (max_angle < low + math.pi / 2)
+            outside = (max_angle <= low - math.pi / 2) | (min_angle >= high + math.pi / 2)
+            # in scan order, the first of equal counters wins in update_direction
+            keep = ~outside
+            self.dx.append(dx[keep])
+            self.dy.append(dy[keep])
+            self.check.append(~inside[keep])
+
+    def get_bin(self, direction):
+        heading_bin = math.floor((direction - self.min_direction) / self.bin_size)
+        if heading_bin < 0 or heading_bin >= len(self.dx):
+            return None
+        return heading_bin
+
+    def get_best_cell(self, grid, ant, layer):
+        # the neighbour cell with the highest positive counter of layer, the first one in scan order on a tie, as
+        # update_direction picks it from the full list, or None
+        heading_bin = self.get_bin(ant.direction)
+        if heading_bin is None:
+            return None
+        curr_x, curr_y = ant.get_int_pos()
+        xs = curr_x + self.dx[heading_bin]
+        ys = curr_y + self.dy[heading_bin]
+        forward = np.ones(len(xs), dtype=bool)
+        check = self.check[heading_bin]
+        forward[check] = np.fabs(np.arctan2(ys[check] - ant.y, xs[check] - ant.x) - ant.direction) < math.pi / 2
+        if not (self.radius <= curr_x < grid.size_x - self.radius and
+                self.radius <= curr_y < grid.size_y - self.radius):
+            forward &= (xs >= 0) & (xs < grid.size_x) & (ys >= 0) & (ys < grid.size_y)
+        xs = xs[forward]
+        ys = ys[forward]
+        if len(xs) == 0:
+            return None
+        values = layer[ys, xs]
+        best = int(np.argmax(values))
+        if values[best] <= 0:
+            return None
+        return grid.get_cell(int(xs[best]), int(ys[best]))
 
 
 class World:
@@ -49,10 +131,14 @@ class Food:
         self.x = x
         self.y = y
         self.amount = amount
+        self.food_id = None
+        self.index = None
 
     def decrease_amount(self):
         if self.amount > 0:
             self.amount -= 1
+            if self.amount == 0 and self.index is not None:
+                self.index.remove(self)
 
     def is_empty(self):
         if self.amount > 0:
@@ -61,8 +147,51 @@ class Food:
             return True
 
 
+class FoodIndex:
+    # uniform bucket grid over the non-empty food sources, a source leaves its bucket when decrease_amount empties it
+    def __init__(self, food_sources, bucket_size=FOOD_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets = {}
+        for food_id, food in enumerate(food_sources):
+            food.food_id = food_id
+            food.index = self
+            if not food.is_empty():
+                self.add(food)
+
+    def get_bucket(self, x, y):
+        return math.floor(x / self.bucket_size), math.floor(y / self.bucket_size)
+
+    def add(self, food):
+        self.buckets.setdefault(self.get_bucket(food.x, food.y), []).append(food)
+
+    def remove(self, food):
+        key = self.get_bucket(food.x, food.y)
+        bucket = self.buckets[key]
+        bucket.remove(food)
+        if not bucket:
+            del self.buckets[key]
+
+    def nearest(self, x, y, radius):
+        # (distance, food, radians) of the closest food closer than radius, the earlier food wins a tie as in the
+        # scan over all food sources, None when there is none
+        nearest = None
+        min_bucket_x, min_bucket_y = self.get_bucket(x - radius, y - radius)
+        max_bucket_x, max_bucket_y = self.get_bucket(x + radius, y + radius)
+        for bucket_x in range(min_bucket_x, max_bucket_x + 1):
+            for bucket_y in range(min_bucket_y, max_bucket_y + 1):
+                for food in self.buckets.get((bucket_x, bucket_y), ()):
+                    delta_x = - x + food.x
+                    delta_y = - y + food.y
+                    dist = math.sqrt(delta_x*delta_x + delta_y*delta_y)
+                    if dist >= radius:
+                        continue
+                    if nearest is None or (dist, food.food_id) < (nearest[0], nearest[1].food_id):
+                        nearest = (dist, food, math.atan2(delta_y, delta_x))
+        return nearest
+
+
 class Ant:
-    def __init__(self, x, y, direction, size_x, size_y, food_sources=None, speed=1.0, grid=None):
+    def __init__(self, x, y, direction, size_x, size_y, food_sources=None, speed=1.0, grid=None, food_index=None):
         self.start_x = x
         self.start_y = y
         self.x = x
@@ -72,6 +201,7 @@ class Ant:
         self.size_x = size_x
         self.size_y = size_y
         self.food_sources = food_sources
+        self.food_index = food_index
         self.has_food = False
         self.grid = grid
 
@@ -131,7 +261,10 @@ class Ant:
             self.randomize_direction()
             return
 
-        if self.food_sources is not None:
+        nearest = None
+        if self.food_index is not None:
+            nearest = self.food_index.nearest(self.x, self.y, FOOD_SEARCH_RADIUS)
+        elif self.food_sources is not None:
             min_distance = 1000000
             min_index = 0
             min_radians = 0
@@ -144,11 +277,14 @@ class Ant:
                     min_distance = dist
                     min_index = idx
                     min_radians = math.atan2(delta_y, delta_x)
+            if min_distance < FOOD_SEARCH_RADIUS:
+                nearest = (min_distance, self.food_sources[min_index], min_radians)
 
-        if min_distance < 10:
+        if nearest is not None:
+            min_distance, food, min_radians = nearest
             if min_distance < 3:
                 self.has_food = True
-                self.food_sources[min_index].decrease_amount()
+                food.decrease_amount()
             self.direction = min_radians
             return
 
@@ -181,9 +317,14 @@ class AntsAlgorithm:
         self.screen = pygame.display.set_mode((self.world.size_x, self.world.size_y))
         self.clock = pygame.time.Clock()
         self.food_sources = self.create_food_sources()
+        self.food_index = FoodIndex(self.food_sources)
         self.nest = None
         self.ants = self.create_ants()
         self.grid = Grid(size_x=self.size, size_y=self.size)
+        self.neighbour_masks = NeighbourMasks()
+        # one pixel per cell, the surfarray frame is [x, y]
+        self.frame = np.zeros((self.world.size_x, self.world.size_y, 3), dtype=np.uint8)
+        self.pheromones = pygame.Surface((self.world.size_x, self.world.size_y))
 
 
     def create_ants(self):
@@ -196,7 +337,7 @@ class AntsAlgorithm:
             #                 random.randint(0, 1500), self.world.size_x, self.world.size_y))
 
             ants.append(Ant(start_x, start_y, random.randint(0, 1500), self.world.size_x, self.world.size_y,
-                            self.food_sources))
+                            self.food_sources, food_index=self.food_index))
             # ants.append(Ant(i, i, i, self.world.size_x, self.world.size_y, speed=random.randint(1, 2)))
         return ants
 
@@ -214,23 +355,11 @@ class AntsAlgorithm:
 
     def update_positions(self):
         for ant in self.ants:
-            neighbour_cells = []
-            for dist_x in chain(range(-RADIUS, -1), range(1, RADIUS)):
-                for dist_y in chain(range(-RADIUS, -1), range(1, RADIUS)):
-                    curr_x, curr_y = ant.get_int_pos()
-                    neighbour_x = curr_x + dist_x
-                    neighbour_y = curr_y + dist_y
-                    if neighbour_x < 0 or neighbour_x > self.size - 1:
-                        continue
-                    if neighbour_y < 0 or neighbour_y > self.size - 1:
-                        continue
-                    cell = self.grid.cells[neighbour_y][neighbour_x]
-                    delta_x = - ant.x + cell.x
-                    delta_y = - ant.y + cell.y
-                    direction = math.atan2(delta_y, delta_x)
-                    dir_diff = math.fabs(direction - ant.direction)
-                    if dir_diff < math.pi/2:
-                        neighbour_cells.append(self.grid.cells[neighbour_y][neighbour_x])
+            # update_direction follows the no food trail with food and the with food trail without, the strongest
+            # forward cell of that trail is the only one it can pick
+            layer = self.grid.visited_no_food_counter if ant.has_food else self.grid.visited_with_food_counter
+            best_cell = self.neighbour_masks.get_best_cell(self.grid, ant, layer)
+            neighbour_cells = [best_cell] if best_cell is not None else []
 
             ant.update_position(neighbour_cells)
             int_x, int_y = ant.get_int_pos()
@@ -241,31 +370,26 @@ class AntsAlgorithm:
                 self.grid.inc_no_food_counter(int_x, int_y)
 
     def decrease_pheromones(self):
-        for col in range(self.grid.size_x):
-            for row in range(self.grid.size_y):
-                cell = self.grid.cells[row][col]
-                if cell.visited_no_food_counter > 0:
-                    cell.visited_no_food_counter -= 1
-                if cell.visited_with_food_counter > 0:
-                    cell.visited_with_food_counter -= 1
+        for layer in (self.grid.visited_no_food_counter, self.grid.visited_with_food_counter):
+            np.maximum(layer - 1, 0, out=layer)
 
     def process_logic(self):
         self.update_positions()
         self.decrease_pheromones()
 
     def render_scene(self):
-        self.screen.fill((10, 10, 10))
-        for col in range(self.grid.size_x):
-            for row in range(self.grid.size_y):
-                cell = self.grid.cells[row][col]
-                if cell.visited_no_food_counter > 0:
-                    pygame.draw.rect(self.screen, pygame.Color(0, 0, min(100 + 6*cell.visited_no_food_counter, 255)),
-                                     (cell.x, cell.y, 1, 1))
-                    continue
-                if cell.visited_with_food_counter > 0:
-                    pygame.draw.rect(self.screen, pygame.Color(0, min(100 + 6*cell.visited_no_food_counter, 255), 0),
-                                     (cell.x, cell.y, 1, 1))
-                    continue
+        # a cell with both trails shows the no food one, its green comes from the no food counter as it always did
+        no_food = self.grid.visited_no_food_counter.T
+        with_food = self.grid.visited_with_food_counter.T
+        self.frame[:] = 10
+        with_food_cells = (with_food > 0) & (no_food == 0)
+        self.frame[with_food_cells] = 0
+        self.frame[with_food_cells, 1] = np.minimum(100 + 6 * no_food[with_food_cells], 255)
+        no_food_cells = no_food > 0
+        self.frame[no_food_cells] = 0
+        self.frame[no_food_cells, 2] = np.minimum(100 + 6 * no_food[no_food_cells], 255)
+        pygame.surfarray.blit_array(self.pheromones, self.frame)
+        self.screen.blit(self.pheromones, (0, 0))
         if self.nest is not None:
             pygame.draw.circle(self.screen, pygame.Color(255, 255, 100), pygame.math.Vector2(self.nest.x, self.nest.y),
                                4)
@@ -2,12 +2,24 @@ import pygame
 import math
 import random
 import traceback
-from numba import jit
+import time
+import numpy as np
+from dataclasses import dataclass, fields
+
+try:
+    from numba import jit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def jit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
 
 from itertools import chain
 
-RUNNING = True
-
 DARKGREY = (30, 30, 30)
 GREY = (100, 100, 100)
 BLACK = (0, 0, 0)
@@ -17,6 +29,8 @@ BLUE = (0, 0, 255)
 GREEN = (0, 255, 0)
 DARKER_GREEN = (0, 180, 0)
 RED = (255, 0, 0)
+BACKGROUND = (10, 10, 10)
+HORIZON_COLOR = (120, 120, 120)
 TILEWIDTH = 50
 
 NUM_OF_ANTS = 400
@@ -44,8 +58,14 @@ DRAW_DEAD_PHEROMONES = False
 
 DRAW_HORIZONS = False
 RENDER = True
+# target ticks per second, ticks run unthrottled up to the frame budget when MAX_SPEED is on
 CLOCK_TICK = 20
 CLOCK_STEP = 5
+MAX_SPEED = False
+TARGET_FPS = 60
+# ticks owed after slow frames are dropped beyond this many seconds worth
+MAX_CATCH_UP_SECONDS = 0.25
+GOVERNOR_SMOOTHING = 0.2
 
 # NW = 0
 # N = 1
@@ -97,8 +117,103 @@ DEAD_PHEROMONE_INCREASE = 200
 
 RANDOMIZE_POS_RANGE = 1000
 RANDOMIZE_POS_THRESHOLD = 900
+TURN_CHOICES = [-1, 0, 1]
+TURN_WEIGHTS = [1, 10, 1]
+# TURN_CHOICES repeated by weight, a uniform index into it is a weighted turn
+TURN_TABLE = np.repeat(TURN_CHOICES, TURN_WEIGHTS)
+# every random draw of an ant is a hash of (seed, tick, ant serial, stream), so it does not depend on the order ants
+# are visited in or on the ants that died before it, serial 0 is the nest spawning new ants
+STREAM_RANDOMIZE = 0
+STREAM_TURN = 1
+STREAM_TIE = 2
+STREAM_SPAWN = 3
+STREAM_HEADING = 4
+SPAWNER_SERIAL = 0
 
 HORIZON_SIZE = 10
+SCAN_CHUNK = 8192
+# side of the square tiles the grids track pheromone cells by
+TILE_SIZE = 32
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    # the settings of one simulation, fixed for its lifetime, each field is a module constant above in lowercase and
+    # defaults to it, dataclasses.replace(config, num_of_ants=800) gives a variant, the draw flags, render, max_speed
+    # and clock_tick only set where the ViewSettings of a window start
+    num_of_ants: int = NUM_OF_ANTS
+    num_of_food_sources: int = NUM_OF_FOOD_SOURCES
+    food_source_size: int = FOOD_SOURCE_SIZE
+    min_food_amount: int = MIN_FOOD_AMOUNT
+    max_food_amount: int = MAX_FOOD_AMOUNT
+    nest_size: int = NEST_SIZE
+    no_food_nest_visit_thresh: int = NO_FOOD_NEST_VISIT_THRESH
+    no_food_pheromones_increase: int = NO_FOOD_PHEROMONES_INCREASE
+    with_food_pheromones_increase: int = WITH_FOOD_PHEROMONES_INCREASE
+    dead_pheromone_increase: int = DEAD_PHEROMONE_INCREASE
+    randomize_pos_range: int = RANDOMIZE_POS_RANGE
+    randomize_pos_threshold: int = RANDOMIZE_POS_THRESHOLD
+    horizon_size: int = HORIZON_SIZE
+    scan_chunk: int = SCAN_CHUNK
+    tile_size: int = TILE_SIZE
+    cell_size: int = CELL_SIZE
+    target_fps: int = TARGET_FPS
+    clock_tick: int = CLOCK_TICK
+    clock_step: int = CLOCK_STEP
+    draw_pheromones: bool = DRAW_PHEROMONES
+    draw_food_pheromones: bool = DRAW_FOOD_PHEROMONES
+    draw_nest_pheromones: bool = DRAW_NEST_PHEROMONES
+    draw_dead_pheromones: bool = DRAW_DEAD_PHEROMONES
+    draw_horizons: bool = DRAW_HORIZONS
+    render: bool = RENDER
+    max_speed: bool = MAX_SPEED
+
+
+CONFIG_FIELDS = [field.name for field in fields(RunConfig)]
+
+
+def get_default_config():
+    # the module constants as they are now, so scripts that still assign them before making a simulation keep working
+    module = globals()
+    return RunConfig(**{name: module[name.upper()] for name in CONFIG_FIELDS})
+
+
+CONFIG_TYPES = {field.name: field.type for field in fields(RunConfig)}
+BOOL_VALUES = {'true': True, 'yes': True, 'on': True, '1': True, 'false': False, 'no': False, 'off': False, '0': False}
+
+
+def parse_config_assignment(text):
+    # NAME=VALUE with NAME a RunConfig field in either case, the name is returned as given
+    name, _, value = text.partition('=')
+    if name.lower() not in CONFIG_TYPES:
+        raise ValueError(f'unknown parameter {name}')
+    return name, value
+
+
+def parse_config_value(name, text):
+    # text as the type of the RunConfig field, the bool fields take true/false, yes/no, on/off or 1/0
+    kind = CONFIG_TYPES[name.lower()]
+    if kind is bool:
+        if text.strip().lower() not in BOOL_VALUES:
+            raise ValueError(f'not a bool for {name}: {text}')
+        return BOOL_VALUES[text.strip().lower()]
+    try:
+        return kind(text)
+    except ValueError:
+        raise ValueError(f'not an {kind.__name__} for {name}: {text}') from None
+
+
+class ViewSettings:
+    # what one window shows and how fast it runs, process_input toggles these
+    def __init__(self, config):
+        self.draw_pheromones = config.draw_pheromones
+        self.draw_food_pheromones = config.draw_food_pheromones
+        self.draw_nest_pheromones = config.draw_nest_pheromones
+        self.draw_dead_pheromones = config.draw_dead_pheromones
+        self.draw_horizons = config.draw_horizons
+        self.render = config.render
+        self.max_speed = config.max_speed
+        self.clock_tick = config.clock_tick
 
 
 def is_main_direction(direction):
@@ -150,11 +265,12 @@ class Cell:
                f'with food: {self.visited_with_food_counter}) ' \
                f'dead: {self.visited_dead_counter}'
 
-    def draw(self, surface, size):
+    def draw(self, surface, size, view):
 
         if self.type == CELL_TYPE_EMPTY:
             return
-        if (DRAW_NEST_PHEROMONES or DRAW_FOOD_PHEROMONES or DRAW_DEAD_PHEROMONES) and self.type == CELL_TYPE_PHEROMONES:
+        if (view.draw_nest_pheromones or view.draw_food_pheromones or view.draw_dead_pheromones) \
+                and self.type == CELL_TYPE_PHEROMONES:
             green_part = min(255, self.visited_with_food_counter)
             blue_part = min(255, self.visited_no_food_counter)
             red_part = min(255, self.visited_dead_counter)
@@ -162,28 +278,28 @@ class Cell:
             if green_part == 0 and blue_part == 0 and red_part == 0:
                 return
 
-            if DRAW_FOOD_PHEROMONES and green_part > 0:
+            if view.draw_food_pheromones and green_part > 0:
                 pygame.draw.rect(surface, (0, green_part, 0),
-                                 (self.x * CELL_SIZE, self.y * CELL_SIZE, CELL_SIZE/2, CELL_SIZE/2))
+                                 (self.x * size, self.y * size, size/2, size/2))
 
-            if DRAW_NEST_PHEROMONES and blue_part > 0:
+            if view.draw_nest_pheromones and blue_part > 0:
                 pygame.draw.rect(surface, (0, 0, blue_part),
-                                 (self.x * CELL_SIZE+CELL_SIZE/2, self.y * CELL_SIZE+CELL_SIZE/2,
-                                  CELL_SIZE/2, CELL_SIZE/2))
-            if DRAW_DEAD_PHEROMONES and red_part > 0:
+                                 (self.x * size+size/2, self.y * size+size/2,
+                                  size/2, size/2))
+            if view.draw_dead_pheromones and red_part > 0:
                 pygame.draw.rect(surface, (red_part, 0, 0),
-                                 (self.x * CELL_SIZE + CELL_SIZE / 2, self.y * CELL_SIZE + CELL_SIZE / 2,
-                                  CELL_SIZE / 2, CELL_SIZE / 2))
+                                 (self.x * size + size / 2, self.y * size + size / 2,
+                                  size / 2, size / 2))
 
             #
             # color = (0, green_part, blue_part)
             # pygame.draw.rect(surface, color, (self.x * CELL_SIZE, self.y * CELL_SIZE, CELL_SIZE, CELL_SIZE))
 
         if self.type == CELL_TYPE_FOOD:
-            self.food.draw(surface, self.x, self.y)
+            self.food.draw(surface, self.x, self.y, size)
 
         if self.type == CELL_TYPE_NEST:
-            self.nest.draw(surface, self.x, self.y)
+            self.nest.draw(surface, self.x, self.y, size)
 
     def has_pheromones(self):
         if self.visited_no_food_counter > 0 or self.visited_with_food_counter > 0 or self.visited_dead_counter > 0:
@@ -198,11 +314,10 @@ class Nest:
         self.radius = radius
         print(f'create nest x: {self.x} y: {self.y} radius: {self.radius}')
 
-    def draw(self, surface, x, y):
-        pygame.draw.rect(surface, RED, (x*CELL_SIZE, y*CELL_SIZE, CELL_SIZE, CELL_SIZE))
+    def draw(self, surface, x, y, size=CELL_SIZE):
+        pygame.draw.rect(surface, RED, (x*size, y*size, size, size))
 
 
-@jit(nopython=True)
 def is_valid_coord(x, y, gridx, gridy):
     if x < 0 or x > gridx - 1:
         return False
@@ -232,17 +347,28 @@ def is_cell_food_type(cell):
 
 
 class Grid:
-    def __init__(self, size_x, size_y):
+    def __init__(self, size_x, size_y, lazy_evaporation=False, config=None):
+        if lazy_evaporation:
+            raise ValueError('lazy evaporation is only supported by ArrayGrid')
+        if config is None:
+            config = get_default_config()
+        self.config = config
         self.size_x = size_x
         self.size_y = size_y
         self.cells = [[Cell(j, i) for j in range(size_x)] for i in range(size_y)]
-        self.cell_size = CELL_SIZE
-        self.non_empty_cells = set()
+        self.cell_size = config.cell_size
+        self.horizon_table = get_horizon_table(config.horizon_size)
+        # the non empty cells of each tile_size tile, indexed [tile y][tile x]
+        self.tile_size = tile_size = config.tile_size
+        self.tile_cells = [[set() for _ in range(0, size_x, tile_size)] for _ in range(0, size_y, tile_size)]
+        # get_best_cell calls and the horizon cells they read, taken and reset by AntsAlgorithm.count_grid_events
+        self.best_cell_calls = 0
+        self.cells_scanned = 0
 
     # def is_valid_coord(self, x, y):
     #     return is_valid_coord_numba(x, y, self.size_x, self.size_y)
 
-    def draw(self, surface):
+    def draw(self, surface, view):
         # for col in range(self.size_x):
         #     pygame.draw.line(surface, GREY, (col*CELL_SIZE, 0), (col*CELL_SIZE, RENDER_SIZE_Y))
         # for row in range(self.size_y):
@@ -251,77 +377,156 @@ class Grid:
         #     for row in range(self.size_y):
         #         cell = self.cells[row][col]
         #         cell.draw(surface, self.cell_size)
-        for x, y in self.non_empty_cells:
-            cell = self.cells[y][x]
-            cell.draw(surface, self.cell_size)
+        for cell in self.iter_non_empty_cells():
+            cell.draw(surface, self.cell_size, view)
+
+    def iter_non_empty_cells(self):
+        for row in self.tile_cells:
+            for tile in row:
+                yield from tile
+
+    def count_active_cells(self):
+        return sum(1 for cell in self.iter_non_empty_cells() if cell.type == CELL_TYPE_PHEROMONES)
 
-    def inc_no_food_counter(self, x, y, amount=NO_FOOD_PHEROMONES_INCREASE):
+    def inc_no_food_counter(self, x, y, amount=None):
         if self.cells[y][x].type == CELL_TYPE_NEST or self.cells[y][x].type == CELL_TYPE_FOOD:
             return
+        if amount is None:
+            amount = self.config.no_food_pheromones_increase
 
         self.cells[y][x].visited_no_food_counter += amount
         self.cells[y][x].visited_no_food_counter = int(max(min(self.cells[y][x].visited_no_food_counter, 1000), 0))
         # print(f'self.cells[y][x].visited_no_food_counter {self.cells[y][x].visited_no_food_counter}')
         self.cells[y][x].type = CELL_TYPE_PHEROMONES
-        self.non_empty_cells.add((x, y))
+        self.tile_cells[y // self.tile_size][x // self.tile_size].add(self.cells[y][x])
 
-    def inc_with_food_counter(self, x, y, amount=WITH_FOOD_PHEROMONES_INCREASE):
+    def inc_with_food_counter(self, x, y, amount=None):
         if self.cells[y][x].type == CELL_TYPE_NEST or self.cells[y][x].type == CELL_TYPE_FOOD:
             return
+        if amount is None:
+            amount = self.config.with_food_pheromones_increase
 
         self.cells[y][x].visited_with_food_counter += amount
         self.cells[y][x].visited_with_food_counter = int(max(min(self.cells[y][x].visited_with_food_counter, 1000), 0))
         # print(f'self.cells[y][x].visited_with_food_counter {self.cells[y][x].visited_with_food_counter}')
         self.cells[y][x].type = CELL_TYPE_PHEROMONES
-        self.non_empty_cells.add((x, y))
+        self.tile_cells[y // self.tile_size][x // self.tile_size].add(self.cells[y][x])
 
-    def inc_dead_counter(self, x, y, amount=DEAD_PHEROMONE_INCREASE):
+    def inc_dead_counter(self, x, y, amount=None):
         if self.cells[y][x].type == CELL_TYPE_NEST or self.cells[y][x].type == CELL_TYPE_FOOD:
             return
+        if amount is None:
+            amount = self.config.dead_pheromone_increase
 
         self.cells[y][x].visited_dead_counter += amount
         self.cells[y][x].visited_dead_counter = int(max(min(self.cells[y][x].visited_dead_counter, 1000), 0))
         # print(f'self.cells[y][x].visited_with_food_counter {self.cells[y][x].visited_with_food_counter}')
         self.cells[y][x].type = CELL_TYPE_PHEROMONES
-        self.non_empty_cells.add((x, y))
-
+        self.tile_cells[y // self.tile_size][x // self.tile_size].add(self.cells[y][x])
+
+    def stamp_dead(self, xs, ys, amounts):
+        # the stamps of one tick summed per cell first, each cell is then written once, the counters are whole
+        # numbers so adding the truncated amounts gives the same as adding them one at a time
+        cells_x, cells_y, amounts = get_dead_stamp_cells(xs, ys, amounts, self.size_x, self.size_y, self.horizon_table)
+        cells, inverse = np.unique(cells_y.astype(np.int64) * self.size_x + cells_x, return_inverse=True)
+        sums = np.bincount(inverse, weights=np.floor(amounts))
+        for cell, amount in zip(cells.tolist(), sums.tolist()):
+            y, x = divmod(cell, self.size_x)
+            self.inc_dead_counter(x, y, amount)
 
     def update(self):
-        points_to_remove = []
-        # print(f'non empty cells len: {len(self.non_empty_cells)}')
-        for x, y in self.non_empty_cells:
+        # only tiles holding non empty cells are visited, a tile drops its cells that became empty
+        for row in self.tile_cells:
+            for tile in row:
+                if not tile:
+                    continue
+                emptied = []
+                for cell in tile:
+                    if cell.type == CELL_TYPE_PHEROMONES:
+                        if cell.visited_no_food_counter > 0:
+                            cell.visited_no_food_counter -= 1
+                        if cell.visited_with_food_counter > 0:
+                            cell.visited_with_food_counter -= 1
+                        if cell.visited_dead_counter > 0:
+                            cell.visited_dead_counter -= 1
+                        if not cell.has_pheromones():
+                            emptied.append(cell)
+                            cell.type = CELL_TYPE_EMPTY
+                    elif cell.type == CELL_TYPE_FOOD:
+                        if cell.food.amount == 0:
+                            emptied.append(cell)
+                            cell.type = CELL_TYPE_EMPTY
+                if emptied:
+                    tile.difference_update(emptied)
+
+    def get_cell_type(self, x, y):
+        return self.cells[y][x].type
+
+    def get_food(self, x, y):
+        return self.cells[y][x].food
+
+    def get_layers(self):
+        # (cell type, no food, with food, dead, food amount) arrays indexed [y, x], for FrameRenderer
+        layers = [np.zeros((self.size_y, self.size_x), dtype=np.int32) for _ in range(5)]
+        cell_type, no_food, with_food, dead, food_amount = layers
+        for cell in self.iter_non_empty_cells():
+            x, y = cell.x, cell.y
+            cell_type[y, x] = cell.type
+            no_food[y, x] = cell.visited_no_food_counter
+            with_food[y, x] = cell.visited_with_food_counter
+            dead[y, x] = cell.visited_dead_counter
+            if cell.type == CELL_TYPE_FOOD:
+                food_amount[y, x] = cell.food.amount
+        return layers
+
+    def export_state(self, foods):
+        cell_type, no_food, with_food, dead, _ = self.get_layers()
+        food_ids = {id(food): food_id for food_id, food in enumerate(foods)}
+        food_id = np.full((self.size_y, self.size_x), -1, dtype=np.int16)
+        for cell in self.iter_non_empty_cells():
+            if cell.food is not None:
+                food_id[cell.y, cell.x] = food_ids[id(cell.food)]
+        return {'cell_type': cell_type.astype(np.uint8), 'no_food': no_food.astype(np.int16),
+                'with_food': with_food.astype(np.int16), 'dead': dead.astype(np.int16), 'food_id': food_id}
+
+    def import_state(self, state, foods, nest):
+        for cell in self.iter_non_empty_cells():
+            self.cells[cell.y][cell.x] = Cell(cell.x, cell.y)
+        for row in self.tile_cells:
+            for tile in row:
+                tile.clear()
+        cell_type, no_food, with_food, dead, food_id = (state[name] for name in
+                                                        ('cell_type', 'no_food', 'with_food', 'dead', 'food_id'))
+        # food cells of a depleted source keep their food, only the type was cleared
+        ys, xs = np.nonzero((cell_type != CELL_TYPE_EMPTY) | (food_id >= 0) | (no_food > 0) | (with_food > 0)
+                            | (dead > 0))
+        for x, y in zip(xs.tolist(), ys.tolist()):
             cell = self.cells[y][x]
-            if cell.type == CELL_TYPE_PHEROMONES:
-                if cell.visited_no_food_counter > 0:
-                    cell.visited_no_food_counter -= 1
-                if cell.visited_with_food_counter > 0:
-                    cell.visited_with_food_counter -= 1
-                if cell.visited_dead_counter > 0:
-                    cell.visited_dead_counter -= 1
-                if not cell.has_pheromones():
-                    points_to_remove.append((x, y))
-                    cell.type = CELL_TYPE_EMPTY
-            elif cell.type == CELL_TYPE_FOOD:
-                if cell.food.amount == 0:
-                    points_to_remove.append((x, y))
-                    cell.type = CELL_TYPE_EMPTY
-        for p in points_to_remove:
-            self.non_empty_cells.remove(p)
+            cell.type = int(cell_type[y, x])
+            cell.visited_no_food_counter = int(no_food[y, x])
+            cell.visited_with_food_counter = int(with_food[y, x])
+            cell.visited_dead_counter = int(dead[y, x])
+            if food_id[y, x] >= 0:
+                cell.food = foods[food_id[y, x]]
+            if cell.type == CELL_TYPE_NEST:
+                cell.nest = nest
+            if cell.type != CELL_TYPE_EMPTY:
+                self.tile_cells[y // self.tile_size][x // self.tile_size].add(cell)
 
     def set_food(self, food):
 
         begin_x = food.x
         begin_y = food.y
 
-        for x_ in range(0, FOOD_SOURCE_SIZE):
-            for y_ in range(0, FOOD_SOURCE_SIZE):
+        for x_ in range(0, self.config.food_source_size):
+            for y_ in range(0, self.config.food_source_size):
                 x = begin_x + x_
                 y = begin_y + y_
                 if not is_valid_coord(x, y, self.size_x, self.size_y):
                     continue
                 self.cells[y][x].food = food
                 self.cells[y][x].type = CELL_TYPE_FOOD
-                self.non_empty_cells.add((x, y))
+                self.tile_cells[y // self.tile_size][x // self.tile_size].add(self.cells[y][x])
 
     def set_nest(self, nest):
 
@@ -340,80 +545,19 @@ class Grid:
                     continue
                 self.cells[y][x].nest = nest
                 self.cells[y][x].type = CELL_TYPE_NEST
-                self.non_empty_cells.add((x, y))
+                self.tile_cells[y // self.tile_size][x // self.tile_size].add(self.cells[y][x])
 
     def get_horizon_cells(self, direction, x_pos, y_pos):
         ret_cells = []
-        dir_x, dir_y = DIR_VECTORS[direction]
-        if not is_main_direction(direction):
-            range_x = range(0, dir_x*HORIZON_SIZE)
-            if dir_x < 0:
-                range_x = range(dir_x * HORIZON_SIZE + 1, 1)
-            range_y = range(0, dir_y * HORIZON_SIZE)
-            if dir_y < 0:
-                range_y = range(dir_y * HORIZON_SIZE + 1, 1)
-
-            for x_ in range_x:
-                for y_ in range_y:
-                    if x_ == 0 and y_ == 0:
-                        continue
-                    x_n_pos = x_pos + x_
-                    y_n_pos = y_pos + y_
-                    if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                        continue
-                    ret_cells.append(self.cells[y_n_pos][x_n_pos])
-        else:
-            if dir_x == 0:
-                if dir_y > 0:
-                    range_y = range(1, HORIZON_SIZE)
-                    for y_ in range_y:
-                        for x_ in range(-y_, y_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            ret_cells.append(self.cells[y_n_pos][x_n_pos])
-                else:  # dir_y < 0
-                    range_y = range(-HORIZON_SIZE+1, 0)
-                    for y_ in range_y:
-                        for x_ in range(y_, -y_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            ret_cells.append(self.cells[y_n_pos][x_n_pos])
-            else:  # dir_y == 0
-                if dir_x > 0:
-                    range_x = range(1, HORIZON_SIZE)
-                    for x_ in range_x:
-                        for y_ in range(-x_, x_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            ret_cells.append(self.cells[y_n_pos][x_n_pos])
-                else:  # dir_x < 0
-                    range_x = range(-HORIZON_SIZE+1, 0)
-                    for x_ in range_x:
-                        for y_ in range(x_, -x_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            ret_cells.append(self.cells[y_n_pos][x_n_pos])
-        # print(f"s ret cells: {len(ret_cells)}")
+        for x_, y_, dist in self.horizon_table.offsets[direction]:
+            x_n_pos = x_pos + x_
+            y_n_pos = y_pos + y_
+            if x_n_pos < 0 or x_n_pos >= self.size_x or y_n_pos < 0 or y_n_pos >= self.size_y:
+                continue
+            ret_cells.append(self.cells[y_n_pos][x_n_pos])
         return ret_cells
 
-    def get_best_cell(self, direction, x_pos, y_pos, mode):
-        ret_cells = []
-        # get_pheromone_level = lambda cell: cell.visited_no_food_counter
-        # if mode == MODE_TO_FOOD:
-        #     get_pheromone_level = lambda cell: cell.visited_with_food_counter
-
-        # aim_predicate = lambda cell: cell.type == CELL_TYPE_NEST
-        # if mode == MODE_TO_FOOD:
-        #     aim_predicate = lambda cell: cell.type == CELL_TYPE_FOOD
-
+    def get_best_cell(self, direction, x_pos, y_pos, mode, choose=random.choice):
         get_pheromone_level = cell_visited_no_food_counter
         if mode == MODE_TO_FOOD:
             get_pheromone_level = cell_visited_with_food_counter
@@ -428,154 +572,630 @@ class Grid:
         candidate_cells = []
         min_dist_aim_cell = 10000000
 
-        dir_x, dir_y = DIR_VECTORS[direction]
-        if not is_main_direction(direction):
-            range_x = range(0, dir_x*HORIZON_SIZE)
-            if dir_x < 0:
-                range_x = range(dir_x * HORIZON_SIZE + 1, 1)
-            range_y = range(0, dir_y * HORIZON_SIZE)
-            if dir_y < 0:
-                range_y = range(dir_y * HORIZON_SIZE + 1, 1)
-
-            for x_ in range_x:
-                for y_ in range_y:
-                    if x_ == 0 and y_ == 0:
-                        continue
-                    x_n_pos = x_pos + x_
-                    y_n_pos = y_pos + y_
-                    if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                        continue
-                    cell = self.cells[y_n_pos][x_n_pos]
-                    if aim_predicate(cell):
-                        dist = max(abs(x_), abs(y_))
-                        if dist < min_dist_aim_cell:
-                            min_dist_aim_cell = dist
-                            closest_aim_cell = cell
-                        # return cell
-                    if cell.visited_dead_counter > 0:
-                        continue
-                    pheromone_level = get_pheromone_level(cell)
-                    if pheromone_level == max_pheromone_level:
-                        candidate_cells.append(cell)
-                    if pheromone_level > max_pheromone_level:
-                        candidate_cells = []
-                        max_pheromone_level = pheromone_level
-                        best_cell = cell
-        else:
-            if dir_x == 0:
-                if dir_y > 0:
-                    range_y = range(1, HORIZON_SIZE)
-                    for y_ in range_y:
-                        for x_ in range(-y_, y_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            cell = self.cells[y_n_pos][x_n_pos]
-                            if aim_predicate(cell):
-                                dist = max(abs(x_), abs(y_))
-                                if dist < min_dist_aim_cell:
-                                    min_dist_aim_cell = dist
-                                    closest_aim_cell = cell
-                                # return cell
-                            if cell.visited_dead_counter > 0:
-                                continue
-                            pheromone_level = get_pheromone_level(cell)
-                            if pheromone_level == max_pheromone_level:
-                                candidate_cells.append(cell)
-                            if pheromone_level > max_pheromone_level:
-                                candidate_cells = []
-                                max_pheromone_level = pheromone_level
-                                best_cell = cell
-                else:  # dir_y < 0
-                    range_y = range(-HORIZON_SIZE+1, 0)
-                    for y_ in range_y:
-                        for x_ in range(y_, -y_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            cell = self.cells[y_n_pos][x_n_pos]
-                            if aim_predicate(cell):
-                                dist = max(abs(x_), abs(y_))
-                                if dist < min_dist_aim_cell:
-                                    min_dist_aim_cell = dist
-                                    closest_aim_cell = cell
-                                # return cell
-                            if cell.visited_dead_counter > 0:
-                                continue
-                            pheromone_level = get_pheromone_level(cell)
-                            if pheromone_level == max_pheromone_level:
-                                candidate_cells.append(cell)
-                            if pheromone_level > max_pheromone_level:
-                                candidate_cells = []
-                                max_pheromone_level = pheromone_level
-                                best_cell = cell
-            else:  # dir_y == 0
-                if dir_x > 0:
-                    range_x = range(1, HORIZON_SIZE)
-                    for x_ in range_x:
-                        for y_ in range(-x_, x_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            cell = self.cells[y_n_pos][x_n_pos]
-                            if aim_predicate(cell):
-                                dist = max(abs(x_), abs(y_))
-                                if dist < min_dist_aim_cell:
-                                    min_dist_aim_cell = dist
-                                    closest_aim_cell = cell
-                                # return cell
-                            if cell.visited_dead_counter > 0:
-                                continue
-                            pheromone_level = get_pheromone_level(cell)
-                            if pheromone_level == max_pheromone_level:
-                                candidate_cells.append(cell)
-                            if pheromone_level > max_pheromone_level:
-                                candidate_cells = []
-                                max_pheromone_level = pheromone_level
-                                best_cell = cell
-                else:  # dir_x < 0
-                    range_x = range(-HORIZON_SIZE+1, 0)
-                    for x_ in range_x:
-                        for y_ in range(x_, -x_+1):
-                            x_n_pos = x_pos + x_
-                            y_n_pos = y_pos + y_
-                            if not is_valid_coord(x_n_pos, y_n_pos, self.size_x, self.size_y):
-                                continue
-                            cell = self.cells[y_n_pos][x_n_pos]
-                            if aim_predicate(cell):
-                                dist = max(abs(x_), abs(y_))
-                                if dist < min_dist_aim_cell:
-                                    min_dist_aim_cell = dist
-                                    closest_aim_cell = cell
-                                # return cell
-                            if cell.visited_dead_counter > 0:
-                                continue
-                            pheromone_level = get_pheromone_level(cell)
-                            if pheromone_level == max_pheromone_level:
-                                candidate_cells.append(cell)
-                            if pheromone_level > max_pheromone_level:
-                                candidate_cells = []
-                                max_pheromone_level = pheromone_level
-                                best_cell = cell
-        # print(f"s ret cells: {len(ret_cells)}")
-        # print(best_cell)
-        # print(f'pher max: {max_pheromone_level}')
+        cells = self.cells
+        offsets = self.horizon_table.offsets[direction]
+        self.best_cell_calls += 1
+        self.cells_scanned += len(offsets)
+        for x_, y_, dist in offsets:
+            x_n_pos = x_pos + x_
+            y_n_pos = y_pos + y_
+            if x_n_pos < 0 or x_n_pos >= self.size_x or y_n_pos < 0 or y_n_pos >= self.size_y:
+                self.cells_scanned -= 1
+                continue
+            cell = cells[y_n_pos][x_n_pos]
+            if aim_predicate(cell):
+                if dist < min_dist_aim_cell:
+                    min_dist_aim_cell = dist
+                    closest_aim_cell = cell
+            if cell.visited_dead_counter > 0:
+                continue
+            pheromone_level = get_pheromone_level(cell)
+            if pheromone_level == max_pheromone_level:
+                candidate_cells.append(cell)
+            if pheromone_level > max_pheromone_level:
+                candidate_cells = []
+                max_pheromone_level = pheromone_level
+                best_cell = cell
         if closest_aim_cell is not None:
             return closest_aim_cell
         if len(candidate_cells) > 0:
-            return random.choice(candidate_cells)
+            return choose(candidate_cells)
         return best_cell
 
 
+def iter_horizon_offsets(direction, horizon_size):
+    dir_x, dir_y = DIR_VECTORS[direction]
+    if not is_main_direction(direction):
+        range_x = range(0, dir_x * horizon_size)
+        if dir_x < 0:
+            range_x = range(dir_x * horizon_size + 1, 1)
+        range_y = range(0, dir_y * horizon_size)
+        if dir_y < 0:
+            range_y = range(dir_y * horizon_size + 1, 1)
+        for x_ in range_x:
+            for y_ in range_y:
+                if x_ == 0 and y_ == 0:
+                    continue
+                yield x_, y_
+    elif dir_x == 0:
+        range_y = range(1, horizon_size)
+        if dir_y < 0:
+            range_y = range(-horizon_size + 1, 0)
+        for y_ in range_y:
+            for x_ in range(-abs(y_), abs(y_) + 1):
+                yield x_, y_
+    else:  # dir_y == 0
+        range_x = range(1, horizon_size)
+        if dir_x < 0:
+            range_x = range(-horizon_size + 1, 0)
+        for x_ in range_x:
+            for y_ in range(-abs(x_), abs(x_) + 1):
+                yield x_, y_
+
+
+class HorizonTable:
+    # the cone of cells an ant looks at, per direction, in scan order
+    # every cone holds horizon_size**2 - 1 cells, so the arrays are (DIRECTIONS_LEN, horizon_size**2 - 1)
+    def __init__(self, horizon_size):
+        self.horizon_size = horizon_size
+        self.offsets = []
+        for direction in DIRECTIONS:
+            self.offsets.append([(x_, y_, max(abs(x_), abs(y_)))
+                                 for x_, y_ in iter_horizon_offsets(direction, horizon_size)])
+        table = np.array(self.offsets, dtype=np.int32)
+        self.dx = table[:, :, 0]
+        self.dy = table[:, :, 1]
+        self.dist = table[:, :, 2]
+        # the square around a dying ant that gets dead pheromones
+        window = np.arange(-horizon_size, horizon_size + 1, dtype=np.int32)
+        self.window_dx = np.repeat(window, len(window))
+        self.window_dy = np.tile(window, len(window))
+        self.flat_offsets_cache = {}
+
+    def flat_offsets(self, size_x):
+        # offsets into a row-major grid of width size_x
+        offsets = self.flat_offsets_cache.get(size_x)
+        if offsets is None:
+            offsets = self.dy.astype(np.int64) * size_x + self.dx
+            self.flat_offsets_cache[size_x] = offsets
+        return offsets
+
+
+HORIZON_TABLES = {}
+
+
+def get_horizon_table(horizon_size=None):
+    if horizon_size is None:
+        horizon_size = HORIZON_SIZE
+    table = HORIZON_TABLES.get(horizon_size)
+    if table is None:
+        table = HorizonTable(horizon_size)
+        HORIZON_TABLES[horizon_size] = table
+    return table
+
+
+def get_dead_stamp_cells(xs, ys, amounts, size_x, size_y, table):
+    # the cells of the windows around all ants dying in a tick, clipped to the world, with the amount of their ant
+    cells_x = (np.asarray(xs, dtype=np.int32)[:, None] + table.window_dx).ravel()
+    cells_y = (np.asarray(ys, dtype=np.int32)[:, None] + table.window_dy).ravel()
+    amounts = np.repeat(amounts, len(table.window_dx))
+    inside = (cells_x >= 0) & (cells_x < size_x) & (cells_y >= 0) & (cells_y < size_y)
+    return cells_x[inside], cells_y[inside], amounts[inside]
+
+
+class ArrayCell:
+    # lightweight view of one ArrayGrid cell, handed out where Grid hands out Cell objects
+    def __init__(self, grid, x, y):
+        self.grid = grid
+        self.x = x
+        self.y = y
+
+    @property
+    def visited_no_food_counter(self):
+        return self.grid.read_counter(self.grid.visited_no_food_counter, self.x, self.y)
+
+    @property
+    def visited_with_food_counter(self):
+        return self.grid.read_counter(self.grid.visited_with_food_counter, self.x, self.y)
+
+    @property
+    def visited_dead_counter(self):
+        return self.grid.read_counter(self.grid.visited_dead_counter, self.x, self.y)
+
+    @property
+    def type(self):
+        return int(self.grid.get_cell_type(self.x, self.y))
+
+    @property
+    def food(self):
+        return self.grid.get_food(self.x, self.y)
+
+    @property
+    def nest(self):
+        return self.grid.nest
+
+    __str__ = Cell.__str__
+    draw = Cell.draw
+    has_pheromones = Cell.has_pheromones
+
+
+class ArrayGrid:
+    def __init__(self, size_x, size_y, lazy_evaporation=False, config=None):
+        if config is None:
+            config = get_default_config()
+        self.config = config
+        self.size_x = size_x
+        self.size_y = size_y
+        self.cell_size = config.cell_size
+        self.horizon_table = get_horizon_table(config.horizon_size)
+        self.visited_no_food_counter = np.zeros((size_y, size_x), dtype=np.int16)
+        self.visited_with_food_counter = np.zeros((size_y, size_x), dtype=np.int16)
+        self.visited_dead_counter = np.zeros((size_y, size_x), dtype=np.int16)
+        self.cell_type = np.full((size_y, size_x), CELL_TYPE_EMPTY, dtype=np.uint8)
+        self.food_id = np.full((size_y, size_x), -1, dtype=np.int16)
+        self.foods = []
+        self.depleted_foods = set()
+        self.nest = None
+        self.tick = 0
+        self.lazy_evaporation = lazy_evaporation
+        self.last_tick = None
+        if lazy_evaporation:
+            # tick of the last write per cell, counters decay by the ticks elapsed since then on read
+            self.last_tick = np.zeros((size_y, size_x), dtype=np.int32)
+        # tile_size tiles that may hold pheromone cells, decay and reclaim only visit these
+        self.tile_size = tile_size = config.tile_size
+        self.active_tiles = np.zeros(((size_y + tile_size - 1) // tile_size, (size_x + tile_size - 1) // tile_size),
+                                     dtype=bool)
+        self.best_cell_calls = 0
+        self.cells_scanned = 0
+
+    def read_counter(self, layer, x, y):
+        if not self.lazy_evaporation:
+            return int(layer[y, x])
+        return max(int(layer[y, x]) - (self.tick - int(self.last_tick[y, x])), 0)
+
+    def refresh_cell(self, x, y):
+        elapsed = self.tick - int(self.last_tick[y, x])
+        if elapsed == 0:
+            return
+        for layer in (self.visited_no_food_counter, self.visited_with_food_counter, self.visited_dead_counter):
+            layer[y, x] = max(int(layer[y, x]) - elapsed, 0)
+        self.last_tick[y, x] = self.tick
+
+    def refresh_cells(self, xs, ys):
+        elapsed = self.tick - self.last_tick[ys, xs]
+        for layer in (self.visited_no_food_counter, self.visited_with_food_counter, self.visited_dead_counter):
+            layer[ys, xs] = np.maximum(layer[ys, xs] - elapsed, 0)
+        self.last_tick[ys, xs] = self.tick
+
+    def reclaim(self):
+        if not self.lazy_evaporation:
+            return
+        for tile_y, first, last, band in self.active_bands():
+            pheromones = self.cell_type[band] == CELL_TYPE_PHEROMONES
+            elapsed = np.minimum(self.tick - self.last_tick[band], 1000).astype(np.int16)
+            for layer in (self.visited_no_food_counter, self.visited_with_food_counter, self.visited_dead_counter):
+                counters = layer[band]
+                np.subtract(counters, np.minimum(counters, elapsed), out=counters, where=pheromones)
+            self.last_tick[band][pheromones] = self.tick
+            self.settle_tiles(tile_y, first, last, self.clear_evaporated(band, pheromones))
+
+    def clear_evaporated(self, band, pheromones):
+        # returns the cells of the band that still hold pheromones
+        evaporated = pheromones & (self.visited_no_food_counter[band] == 0) \
+            & (self.visited_with_food_counter[band] == 0) & (self.visited_dead_counter[band] == 0)
+        self.cell_type[band][evaporated] = CELL_TYPE_EMPTY
+        return pheromones & ~evaporated
+
+    def active_bands(self):
+        # (tile row, first tile, last tile + 1, slices) of every row of tiles with an active tile, the slices span
+        # the cells from its first to its last active tile
+        for tile_y in np.flatnonzero(self.active_tiles.any(axis=1)).tolist():
+            tiles = np.flatnonzero(self.active_tiles[tile_y])
+            first = int(tiles[0])
+            last = int(tiles[-1]) + 1
+            yield tile_y, first, last, (slice(tile_y * self.tile_size, (tile_y + 1) * self.tile_size),
+                                        slice(first * self.tile_size, last * self.tile_size))
+
+    def settle_tiles(self, tile_y, first, last, pheromones):
+        # a tile stays active while one of its cells holds pheromones
+        columns = pheromones.any(axis=0)
+        starts = np.arange(0, len(columns), self.tile_size)
+        self.active_tiles[tile_y, first:last] = np.logical_or.reduceat(columns, starts)
+
+    def activate_tiles(self):
+        # after the arrays were written directly, the next decay visits every tile and settles them
+        self.active_tiles[:] = True
+
+    def count_active_cells(self):
+        # pheromone cells of the active tiles, with lazy evaporation this includes cells not reclaimed yet
+        return sum(int(np.count_nonzero(self.cell_type[band] == CELL_TYPE_PHEROMONES))
+                   for _, _, _, band in self.active_bands())
+
+    def draw(self, surface, view):
+        self.reclaim()
+        ys, xs = np.nonzero(self.cell_type)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            ArrayCell(self, x, y).draw(surface, self.cell_size, view)
+
+    def inc_counter(self, layer, x, y, amount):
+        if self.cell_type[y, x] == CELL_TYPE_NEST or self.cell_type[y, x] == CELL_TYPE_FOOD:
+            return
+        if self.lazy_evaporation:
+            self.refresh_cell(x, y)
+        layer[y, x] = int(max(min(int(layer[y, x]) + amount, 1000), 0))
+        self.cell_type[y, x] = CELL_TYPE_PHEROMONES
+        self.active_tiles[y // self.tile_size, x // self.tile_size] = True
+
+    def inc_no_food_counter(self, x, y, amount=None):
+        self.inc_counter(self.visited_no_food_counter, x, y,
+                         self.config.no_food_pheromones_increase if amount is None else amount)
+
+    def inc_with_food_counter(self, x, y, amount=None):
+        self.inc_counter(self.visited_with_food_counter, x, y,
+                         self.config.with_food_pheromones_increase if amount is None else amount)
+
+    def inc_dead_counter(self, x, y, amount=None):
+        self.inc_counter(self.visited_dead_counter, x, y,
+                         self.config.dead_pheromone_increase if amount is None else amount)
+
+    def stamp_dead(self, xs, ys, amounts):
+        cells_x, cells_y, amounts = get_dead_stamp_cells(xs, ys, amounts, self.size_x, self.size_y, self.horizon_table)
+        self.add_counters(self.visited_dead_counter, cells_x, cells_y, amounts)
+
+    def add_counters(self, layer, xs, ys, amounts):
+        # batched inc_counter, deposits that land on the same cell are summed before clamping
+        cell_type = self.cell_type[ys, xs]
+        keep = (cell_type != CELL_TYPE_NEST) & (cell_type != CELL_TYPE_FOOD)
+        if not keep.any():
+            return
+        cells, inverse = np.unique(ys[keep].astype(np.int64) * self.size_x + xs[keep], return_inverse=True)
+        sums = np.bincount(inverse, weights=np.floor(amounts[keep]))
+        ys, xs = np.divmod(cells, self.size_x)
+        if self.lazy_evaporation:
+            self.refresh_cells(xs, ys)
+        layer[ys, xs] = np.clip(layer[ys, xs] + sums, 0, 1000)
+        self.cell_type[ys, xs] = CELL_TYPE_PHEROMONES
+        self.active_tiles[ys // self.tile_size, xs // self.tile_size] = True
+
+    def update(self):
+        self.tick += 1
+        if not self.lazy_evaporation:
+            self.decay()
+        for food_id, food in enumerate(self.foods):
+            if food.amount == 0 and food_id not in self.depleted_foods:
+                self.clear_food(food_id)
+                self.depleted_foods.add(food_id)
+
+    def decay(self):
+        # only pheromone cells hold counters, so the bands are decremented as a whole and clamped at zero
+        for tile_y, first, last, band in self.active_bands():
+            pheromones = self.cell_type[band] == CELL_TYPE_PHEROMONES
+            for layer in (self.visited_no_food_counter, self.visited_with_food_counter, self.visited_dead_counter):
+                counters = layer[band]
+                np.subtract(counters, 1, out=counters)
+                np.maximum(counters, 0, out=counters)
+            self.settle_tiles(tile_y, first, last, self.clear_evaporated(band, pheromones))
+
+    def clear_food(self, food_id):
+        self.cell_type[(self.food_id == food_id) & (self.cell_type == CELL_TYPE_FOOD)] = CELL_TYPE_EMPTY
+
+    def set_food(self, food):
+        food_id = len(self.foods)
+        self.foods.append(food)
+        x0 = max(food.x, 0)
+        y0 = max(food.y, 0)
+        x1 = min(food.x + self.config.food_source_size, self.size_x)
+        y1 = min(food.y + self.config.food_source_size, self.size_y)
+        self.food_id[y0:y1, x0:x1] = food_id
+        self.cell_type[y0:y1, x0:x1] = CELL_TYPE_FOOD
+
+    def set_nest(self, nest):
+        radius = nest.radius
+        for x_ in range(-radius, radius):
+            for y_ in range(-radius, radius):
+                x = nest.x + x_
+                y = nest.y + y_
+                dist = math.sqrt(x_*x_ + y_*y_)
+                if dist > radius:
+                    continue
+                if not is_valid_coord(x, y, self.size_x, self.size_y):
+                    continue
+                self.cell_type[y, x] = CELL_TYPE_NEST
+        self.nest = nest
+
+    def get_cell_type(self, x, y):
+        cell_type = self.cell_type[y, x]
+        if self.lazy_evaporation and cell_type == CELL_TYPE_PHEROMONES:
+            self.refresh_cell(x, y)
+            if self.visited_no_food_counter[y, x] == 0 and self.visited_with_food_counter[y, x] == 0 \
+                    and self.visited_dead_counter[y, x] == 0:
+                self.cell_type[y, x] = CELL_TYPE_EMPTY
+                return CELL_TYPE_EMPTY
+        return cell_type
+
+    def get_food(self, x, y):
+        food_id = self.food_id[y, x]
+        if food_id < 0:
+            return None
+        return self.foods[food_id]
+
+    def get_layers(self):
+        self.reclaim()
+        # the extra zero is the amount of the cells without food (food_id -1)
+        amounts = np.array([food.amount for food in self.foods] + [0], dtype=np.int32)
+        return (self.cell_type, self.visited_no_food_counter, self.visited_with_food_counter,
+                self.visited_dead_counter, amounts[self.food_id])
+
+    def export_state(self, foods):
+        # lazily evaporated counters are stored materialized, so eager and lazy grids load each other's state
+        self.reclaim()
+        return {'cell_type': self.cell_type, 'no_food': self.visited_no_food_counter,
+                'with_food': self.visited_with_food_counter, 'dead': self.visited_dead_counter,
+                'food_id': self.food_id, 'depleted_foods': np.array(sorted(self.depleted_foods), dtype=np.int32)}
+
+    def import_state(self, state, foods, nest):
+        np.copyto(self.cell_type, state['cell_type'])
+        np.copyto(self.visited_no_food_counter, state['no_food'])
+        np.copyto(self.visited_with_food_counter, state['with_food'])
+        np.copyto(self.visited_dead_counter, state['dead'])
+        np.copyto(self.food_id, state['food_id'])
+        self.foods = foods
+        self.nest = nest
+        if 'depleted_foods' in state:
+            self.depleted_foods = set(state['depleted_foods'].tolist())
+        else:
+            self.depleted_foods = {food_id for food_id, food in enumerate(foods) if food.amount == 0}
+        self.tick = int(state['tick'])
+        if self.lazy_evaporation:
+            self.last_tick[:] = self.tick
+        self.activate_tiles()
+
+    def read_counters(self, layer, xs, ys):
+        if not self.lazy_evaporation:
+            return layer[ys, xs]
+        return np.maximum(layer[ys, xs] - (self.tick - self.last_tick[ys, xs]), 0)
+
+    def scan_horizon(self, direction, x_pos, y_pos):
+        table = self.horizon_table
+        xs = table.dx[direction] + x_pos
+        ys = table.dy[direction] + y_pos
+        dist = table.dist[direction]
+        if x_pos < table.horizon_size or y_pos < table.horizon_size \
+                or x_pos >= self.size_x - table.horizon_size or y_pos >= self.size_y - table.horizon_size:
+            valid = (xs >= 0) & (xs < self.size_x) & (ys >= 0) & (ys < self.size_y)
+            xs = xs[valid]
+            ys = ys[valid]
+            dist = dist[valid]
+        return xs, ys, dist
+
+    def get_horizon_cells(self, direction, x_pos, y_pos):
+        xs, ys, dist = self.scan_horizon(direction, x_pos, y_pos)
+        return [ArrayCell(self, x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+
+    def get_best_cell(self, direction, x_pos, y_pos, mode, choose=random.choice):
+        layer = self.visited_no_food_counter
+        aim_type = CELL_TYPE_NEST
+        if mode == MODE_TO_FOOD:
+            layer = self.visited_with_food_counter
+            aim_type = CELL_TYPE_FOOD
+
+        xs, ys, dist = self.scan_horizon(direction, x_pos, y_pos)
+        self.best_cell_calls += 1
+        self.cells_scanned += len(xs)
+        if len(xs) == 0:
+            return None
+
+        aim = self.cell_type[ys, xs] == aim_type
+        if aim.any():
+            idx = np.argmin(np.where(aim, dist, np.iinfo(dist.dtype).max))
+            return ArrayCell(self, int(xs[idx]), int(ys[idx]))
+
+        # cells marked by dead ants never win, same as skipping them in Grid.get_best_cell
+        levels = np.where(self.read_counters(self.visited_dead_counter, xs, ys) > 0, -1,
+                          self.read_counters(layer, xs, ys))
+        idx = np.argmax(levels)
+        if levels[idx] < 0:
+            return None
+        # the first cell at the maximum is the best cell, the ones after it are the tie candidates
+        candidates = np.flatnonzero(levels[idx + 1:] == levels[idx])
+        if len(candidates) > 0:
+            idx += 1 + choose(candidates.tolist())
+        return ArrayCell(self, int(xs[idx]), int(ys[idx]))
+
+    def take_counters(self, layer, cells):
+        levels = np.take(layer, cells)
+        if not self.lazy_evaporation:
+            return levels
+        return np.maximum(levels - (self.tick - np.take(self.last_tick, cells)), 0)
+
+    def get_best_cells(self, directions, xs, ys, modes, rng):
+        # get_best_cell for a whole batch of ants, returns (found, best_x, best_y) arrays
+        found = np.zeros(len(xs), dtype=bool)
+        best_x = np.zeros(len(xs), dtype=np.int32)
+        best_y = np.zeros(len(xs), dtype=np.int32)
+        to_food = modes == MODE_TO_FOOD
+        for group, layer, aim_type in ((np.flatnonzero(to_food), self.visited_with_food_counter, CELL_TYPE_FOOD),
+                                       (np.flatnonzero(~to_food), self.visited_no_food_counter, CELL_TYPE_NEST)):
+            for begin in range(0, len(group), self.config.scan_chunk):
+                ants = group[begin:begin + self.config.scan_chunk]
+                found[ants], best_x[ants], best_y[ants] = self.scan_best_cells(
+                    directions[ants], xs[ants], ys[ants], layer, aim_type, rng)
+        return found, best_x, best_y
+
+    def scan_best_cells(self, directions, xs, ys, layer, aim_type, rng):
+        table = self.horizon_table
+        horizon_size = table.horizon_size
+        rows = np.arange(len(xs))
+        cells = (ys.astype(np.int64) * self.size_x + xs)[:, None] + table.flat_offsets(self.size_x)[directions]
+        valid = None
+        border = np.flatnonzero((xs < horizon_size) | (ys < horizon_size) | (xs >= self.size_x - horizon_size)
+                                | (ys >= self.size_y - horizon_size))
+        if len(border) > 0:
+            cx = xs[border, None] + table.dx[directions[border]]
+            cy = ys[border, None] + table.dy[directions[border]]
+            valid = np.ones(cells.shape, dtype=bool)
+            valid[border] = (cx >= 0) & (cx < self.size_x) & (cy >= 0) & (cy < self.size_y)
+            cells[border] = np.clip(cy, 0, self.size_y - 1).astype(np.int64) * self.size_x \
+                + np.clip(cx, 0, self.size_x - 1)
+
+        self.best_cell_calls += len(xs)
+        self.cells_scanned += cells.size if valid is None else int(np.count_nonzero(valid))
+        aim = np.take(self.cell_type, cells) == aim_type
+        levels = self.take_counters(layer, cells)
+        excluded = self.take_counters(self.visited_dead_counter, cells) > 0
+        if valid is not None:
+            aim &= valid
+            excluded |= ~valid
+        levels[excluded] = -1
+
+        idx = np.argmax(levels, axis=1)
+        max_level = levels[rows, idx]
+        has_aim = aim.any(axis=1)
+        aimed = np.flatnonzero(has_aim)
+        if len(aimed) > 0:
+            dist = np.where(aim[aimed], table.dist[directions[aimed]], np.iinfo(np.int32).max)
+            idx[aimed] = np.argmin(dist, axis=1)
+
+        ties = levels == max_level[:, None]
+        ties[rows, idx] = False
+        ties[aimed] = False
+        num_ties = ties.sum(axis=1)
+        pick = (rng.random(len(xs)) * num_ties).astype(np.int64)
+        # on fresh ground the whole cone ties, the first cell is the best one and any later one is picked
+        whole = num_ties == cells.shape[1] - 1
+        idx[whole] = 1 + pick[whole]
+        partly = np.flatnonzero((num_ties > 0) & ~whole)
+        if len(partly) > 0:
+            tie_rows, tie_cols = np.nonzero(ties[partly])
+            first_tie = np.cumsum(num_ties[partly]) - num_ties[partly]
+            idx[partly] = tie_cols[first_tie + pick[partly]]
+
+        best_y, best_x = np.divmod(cells[rows, idx], self.size_x)
+        return has_aim | (max_level >= 0), best_x, best_y
+
+
 class World:
     def __init__(self, size_x, size_y):
         self.size_x = size_x
         self.size_y = size_y
 
 
+class FrameRenderer:
+    # builds the frame as one RGB array with two pixels per cell side, the pheromone marks of Cell.draw take a
+    # quarter of a cell, then scales it up to the cell size and blits it in one call
+    def __init__(self, size_x, size_y, config=None, view=None):
+        if config is None:
+            config = get_default_config()
+        cell_size = config.cell_size
+        self.size_x = size_x
+        self.size_y = size_y
+        self.horizon_table = get_horizon_table(config.horizon_size)
+        self.view = ViewSettings(config) if view is None else view
+        self.frame = np.zeros((2 * size_x, 2 * size_y, 3), dtype=np.uint8)
+        # frame[2 * x + i, 2 * y + j] as cells[x, y, i, j]
+        self.cells = self.frame.reshape(size_x, 2, size_y, 2, 3).transpose(0, 2, 1, 3, 4)
+        self.small = pygame.Surface((2 * size_x, 2 * size_y))
+        self.scaled = pygame.Surface((size_x * cell_size, size_y * cell_size))
+
+    def draw_grid(self, grid):
+        self.draw_layers(grid.get_layers())
+
+    def draw_layers(self, layers):
+        # the layers are [y, x], the surfarray frame is [x, y]
+        cell_type, no_food, with_food, dead, food_amount = (layer.T for layer in layers)
+        view = self.view
+        self.frame[:] = BACKGROUND
+        if view.draw_nest_pheromones or view.draw_food_pheromones or view.draw_dead_pheromones:
+            pheromones = cell_type == CELL_TYPE_PHEROMONES
+            if view.draw_food_pheromones:
+                self.paint(self.cells[:, :, 0, 0], pheromones, with_food, 1)
+            if view.draw_nest_pheromones:
+                self.paint(self.cells[:, :, 1, 1], pheromones, no_food, 2)
+            if view.draw_dead_pheromones:
+                self.paint(self.cells[:, :, 1, 1], pheromones, dead, 0)
+        food = cell_type == CELL_TYPE_FOOD
+        colors = np.zeros((int(food.sum()), 1, 1, 3), dtype=np.uint8)
+        colors[:, 0, 0, 1] = np.minimum(food_amount[food] / 5, 255)
+        self.cells[food] = colors
+        self.cells[cell_type == CELL_TYPE_NEST] = RED
+
+    def paint(self, quarter, pheromones, layer, channel):
+        mask = pheromones & (layer > 0)
+        colors = np.zeros((int(mask.sum()), 3), dtype=np.uint8)
+        colors[:, channel] = np.minimum(layer[mask], 255)
+        quarter[mask] = colors
+
+    def draw_ants(self, xs, ys, modes, directions=None):
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        if self.view.draw_horizons and directions is not None and len(xs) > 0:
+            table = self.horizon_table
+            directions = np.asarray(directions, dtype=np.int64)
+            cells_x = xs[:, None] + table.dx[directions]
+            cells_y = ys[:, None] + table.dy[directions]
+            inside = (cells_x >= 0) & (cells_x < self.size_x) & (cells_y >= 0) & (cells_y < self.size_y)
+            self.cells[cells_x[inside], cells_y[inside]] = HORIZON_COLOR
+        colors = np.where((np.asarray(modes) == MODE_TO_NEST)[:, None], DARKER_GREEN, YELLOW).astype(np.uint8)
+        self.cells[xs, ys] = colors[:, None, None, :]
+
+    def blit(self, surface):
+        pygame.surfarray.blit_array(self.small, self.frame)
+        pygame.transform.scale(self.small, self.scaled.get_size(), self.scaled)
+        surface.blit(self.scaled, (0, 0))
+
+
+class FrameGovernor:
+    # decides how many ticks run before each rendered frame, enough to keep up with the target ticks/s and to catch
+    # up after slow frames, but no more than fit in the frame budget next to the measured render time
+    def __init__(self, target_fps=TARGET_FPS):
+        self.target_fps = target_fps
+        self.tick_seconds = 0.0
+        self.render_seconds = 0.0
+        self.owed_ticks = 0.0
+        self.last_frame = None
+        self.window_start = time.perf_counter()
+        self.window_ticks = 0
+        self.window_frames = 0
+        self.ticks_per_second = 0.0
+        self.frames_per_second = 0.0
+        self.skip_ratio = 0.0
+
+    def plan(self, target_tps):
+        now = time.perf_counter()
+        elapsed = 0.0 if self.last_frame is None else now - self.last_frame
+        self.last_frame = now
+        fit = 1
+        if self.tick_seconds > 0:
+            fit = max(int((1.0 / self.target_fps - self.render_seconds) / self.tick_seconds), 1)
+        if target_tps is None:
+            return fit
+        self.owed_ticks = min(self.owed_ticks + target_tps * elapsed, target_tps * MAX_CATCH_UP_SECONDS + 1)
+        ticks = min(int(self.owed_ticks), fit)
+        self.owed_ticks -= ticks
+        return ticks
+
+    def record(self, ticks, logic_seconds, render_seconds, rendered):
+        # returns True when the measured rates were refreshed
+        if ticks > 0:
+            self.tick_seconds += GOVERNOR_SMOOTHING * (logic_seconds / ticks - self.tick_seconds)
+        if rendered:
+            self.render_seconds += GOVERNOR_SMOOTHING * (render_seconds - self.render_seconds)
+            self.window_frames += 1
+        self.window_ticks += ticks
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed < 1.0:
+            return False
+        self.ticks_per_second = self.window_ticks / elapsed
+        self.frames_per_second = self.window_frames / elapsed
+        # share of the ticks that were never on screen
+        self.skip_ratio = max(1.0 - self.window_frames / self.window_ticks, 0.0) if self.window_ticks else 0.0
+        self.window_start += elapsed
+        self.window_ticks = 0
+        self.window_frames = 0
+        return True
+
+
 class Food:
     def __init__(self, x, y, amount):
         self.x = x
@@ -592,9 +1212,9 @@ class Food:
         else:
             return True
 
-    def draw(self, surface, x, y):
+    def draw(self, surface, x, y, size=CELL_SIZE):
         color = (0, min(255, self.amount/5), 0)
-        pygame.draw.rect(surface, color, (x*CELL_SIZE, y*CELL_SIZE, CELL_SIZE, CELL_SIZE))
+        pygame.draw.rect(surface, color, (x*size, y*size, size, size))
 
 
 MODE_TO_NEST = 0
@@ -618,8 +1238,95 @@ def print_ant_mode(ant):
     print(mode_str)
 
 
+class ModuleRandom:
+    # the RandomStreams interface on top of the global random module
+    def __init__(self, config=None):
+        self.randomize_pos_range = RANDOMIZE_POS_RANGE if config is None else config.randomize_pos_range
+
+    def begin_tick(self, tick, serials, next_serial):
+        pass
+
+    def randomize_value(self, slot):
+        return random.randint(0, self.randomize_pos_range)
+
+    def turn(self, slot):
+        return random.choices(population=TURN_CHOICES, weights=TURN_WEIGHTS, k=1)[0]
+
+    def choice(self, slot, seq):
+        return random.choice(seq)
+
+
+MODULE_RANDOM = ModuleRandom()
+
+
+def mix64_array(z):
+    # antkernel.mix64 over uint64 arrays
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_serials(seed, tick, serials):
+    # the part of antkernel.random_uniform that all streams of a tick share, for every serial of an array
+    h = mix64_array(np.array([seed], dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15))
+    h = mix64_array(h ^ np.uint64(tick))
+    return mix64_array(h ^ np.asarray(serials, dtype=np.uint64))
+
+
+def random_uniforms(hashed, stream):
+    # antkernel.random_uniform of one stream from the hash_serials values
+    h = mix64_array(hashed ^ np.uint64(stream))
+    return (h >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+class RandomStreams:
+    # the random draws of a tick come in blocks hashed from (seed, tick, ant serial, stream), ant number `slot` of
+    # the tick reads entry `slot` of every block, so a seed replays a run exactly, any tick can be redrawn on its own
+    # and an ant draws the same numbers whichever ants died or were spawned before it
+    def __init__(self, seed=None, config=None):
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.randomize_pos_range = RANDOMIZE_POS_RANGE if config is None else config.randomize_pos_range
+        # world setup (nest and food placement) draws from its own stream
+        self.setup = random.Random(seed)
+        self.tick = None
+        self.randomize = []
+        self.turns = []
+        self.ties = []
+        self.spawn = 0
+        self.heading = 0
+
+    def begin_tick(self, tick, serials, next_serial):
+        # the blocks have one entry more, for the ant with next_serial the nest may spawn now
+        hashed = hash_serials(self.seed, tick, serials + [next_serial, SPAWNER_SERIAL])
+        ants = hashed[:-1]
+        self.tick = tick
+        self.spawn = int(random_uniforms(hashed[-1:], STREAM_SPAWN)[0] * 1001)
+        self.heading = DIRECTIONS[int(random_uniforms(hashed[-2:-1], STREAM_HEADING)[0] * DIRECTIONS_LEN)]
+        self.randomize = (random_uniforms(ants, STREAM_RANDOMIZE) *
+                          (self.randomize_pos_range + 1)).astype(np.int64).tolist()
+        self.turns = TURN_TABLE[(random_uniforms(ants, STREAM_TURN) * len(TURN_TABLE)).astype(np.int64)].tolist()
+        self.ties = random_uniforms(ants, STREAM_TIE).tolist()
+
+    def randomize_value(self, slot):
+        return self.randomize[slot]
+
+    def turn(self, slot):
+        return self.turns[slot]
+
+    def choice(self, slot, seq):
+        return seq[int(self.ties[slot] * len(seq))]
+
+
 class Ant:
-    def __init__(self, x, y, direction, size_x, size_y, food_sources=None, speed=1.0, grid=None):
+    def __init__(self, x, y, direction, size_x, size_y, food_sources=None, speed=1.0, grid=None,
+                 streams=MODULE_RANDOM, config=None, view=None, serial=0):
+        if config is None:
+            config = get_default_config() if grid is None else grid.config
+        self.config = config
+        # only a window that draws the horizons needs them kept per ant
+        self.view = view
         self.start_x = x
         self.start_y = y
         self.x = x
@@ -633,6 +1340,11 @@ class Ant:
         self.mode = MODE_LEAVING_NEST
         self.horizon_cells = []
         self.no_food_nest_visit = 1
+        self.streams = streams
+        # the key of the ant's random draws, for its whole life
+        self.serial = serial
+        # index of the ant in this tick's random blocks
+        self.slot = 0
         # print(self)
 
     def __str__(self):
@@ -680,7 +1392,7 @@ class Ant:
         # print(f' update {self}')
         if self.mode == MODE_LEAVING_NEST:
             # print(f'1 in nest {self}')
-            if self.grid.cells[self.y][self.x].type != CELL_TYPE_NEST:
+            if self.grid.get_cell_type(self.x, self.y) != CELL_TYPE_NEST:
                 # print(f'2 in nest {self}')
                 self.mode = MODE_TO_FOOD
                 # print(f'2.1 in nest {self}')
@@ -689,29 +1401,29 @@ class Ant:
                 # print(f'2.3 in nest {self}')
         elif self.mode == MODE_TO_FOOD:
             # print(f'3 in nest {self}')
-            if self.grid.cells[self.y][self.x].type == CELL_TYPE_FOOD:
+            if self.grid.get_cell_type(self.x, self.y) == CELL_TYPE_FOOD:
                 self.no_food_nest_visit = 1
                 # print(f'4 in nest {self}')
                 self.mode = MODE_TO_NEST
-                self.grid.cells[self.y][self.x].food.decrease_amount()
+                self.grid.get_food(self.x, self.y).decrease_amount()
                 self.move_to_opposite_direction()
                 # print(f'4.1 in nest {self}')
                 return
-            elif self.grid.cells[self.y][self.x].type == CELL_TYPE_NEST:
+            elif self.grid.get_cell_type(self.x, self.y) == CELL_TYPE_NEST:
                 # print(f'5 in nest {self}')
                 self.move_to_opposite_direction()
                 # print(f'5.1 in nest {self}')
                 return
         elif self.mode == MODE_TO_NEST:
             # print(f'6 in nest {self}')
-            if self.grid.cells[self.y][self.x].type == CELL_TYPE_NEST:
+            if self.grid.get_cell_type(self.x, self.y) == CELL_TYPE_NEST:
                 # print(f'7 in nest {self}')
                 self.no_food_nest_visit = 1
                 self.mode = MODE_TO_FOOD
                 self.move_to_opposite_direction()
                 # print(f'7.1 in nest {self}')
                 return
-            elif self.grid.cells[self.y][self.x].type == CELL_TYPE_FOOD:
+            elif self.grid.get_cell_type(self.x, self.y) == CELL_TYPE_FOOD:
                 # print(f'7 in nest {self}')
                 self.move_to_opposite_direction()
                 # print(f'7.1 in nest {self}')
@@ -720,10 +1432,10 @@ class Ant:
         # if random.randint(0, 100) > 30:
 
         if self.mode == MODE_TO_NEST:
-            pheromone_amout = (NO_FOOD_NEST_VISIT_THRESH - self.no_food_nest_visit) / 10
+            pheromone_amout = (self.config.no_food_nest_visit_thresh - self.no_food_nest_visit) / 10
             self.grid.inc_with_food_counter(self.x, self.y, pheromone_amout)
         elif self.mode == MODE_TO_FOOD:
-            pheromone_amout = (NO_FOOD_NEST_VISIT_THRESH - self.no_food_nest_visit) / 20
+            pheromone_amout = (self.config.no_food_nest_visit_thresh - self.no_food_nest_visit) / 20
             self.grid.inc_no_food_counter(self.x, self.y, pheromone_amout)
         #
         # if self.in_nest and self.has_food:
@@ -751,10 +1463,13 @@ class Ant:
 
         # self.update_direction()
 
+    def choose(self, seq):
+        return self.streams.choice(self.slot, seq)
+
     def randomize_direction(self):
         # choice = random.choice([-1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,  1],)
         # choice = random.choice([-1, 0, 0, 0, 0, 1])
-        choice = random.choices(population=[-1, 0, 1], weights=[1, 10, 1], k=1)[0]
+        choice = self.streams.turn(self.slot)
         # print(f' randomize choice: {choice}')
         # print(f' randomize old: {self.direction}')
         new_direction = self.direction + choice
@@ -773,16 +1488,16 @@ class Ant:
         # print(f'1 update dir {self}')
         # self.randomize_direction()
         self.horizon_cells = []
-        if DRAW_HORIZONS:
+        if self.view is not None and self.view.draw_horizons:
             self.horizon_cells = self.grid.get_horizon_cells(self.direction, self.x, self.y)
         # print_ant_mode(self)
-        val = random.randint(0, RANDOMIZE_POS_RANGE)
-        if val > RANDOMIZE_POS_THRESHOLD or self.mode == MODE_LEAVING_NEST:
+        val = self.streams.randomize_value(self.slot)
+        if val > self.config.randomize_pos_threshold or self.mode == MODE_LEAVING_NEST:
             # print(f'2 update dir {self}')
             self.randomize_direction()
             # print(f'3 update dir {self}')
             return
-        best_cell = self.grid.get_best_cell(self.direction, self.x, self.y, self.mode)
+        best_cell = self.grid.get_best_cell(self.direction, self.x, self.y, self.mode, self.choose)
         # print(best_cell)
         # print(f'4 update dir {self}')
         if best_cell is not None:
@@ -802,153 +1517,333 @@ class Ant:
         color = YELLOW
         if self.mode == MODE_TO_NEST:
             color = DARKER_GREEN
-        pygame.draw.rect(surface, color, (self.x*CELL_SIZE, self.y*CELL_SIZE, CELL_SIZE, CELL_SIZE))
+        size = self.config.cell_size
+        pygame.draw.rect(surface, color, (self.x*size, self.y*size, size, size))
 
         for cell in self.horizon_cells:
-            pygame.draw.rect(surface, (120, 120, 120), (cell.x * CELL_SIZE, cell.y * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+            pygame.draw.rect(surface, (120, 120, 120), (cell.x * size, cell.y * size, size, size))
 
 
 class AntsAlgorithm:
-    def __init__(self, size_x=SIZE_X, size_y=SIZE_Y):
+    def __init__(self, size_x=SIZE_X, size_y=SIZE_Y, grid_class=Grid, lazy_evaporation=False, headless=False,
+                 seed=None, config=None):
+        # a RunConfig, without one the module constants as they are now
+        if config is None:
+            config = get_default_config()
+        self.config = config
+        self.view = ViewSettings(config)
+        self.running = True
         self.world = World(size_x, size_y)
-        pygame.init()
-        pygame.display.set_caption("Ants Algorithm")
-        self.screen = pygame.display.set_mode((RENDER_SIZE_X, RENDER_SIZE_Y))
-        self.clock = pygame.time.Clock()
-        self.grid = Grid(size_x=size_x, size_y=size_y)
+        self.random = RandomStreams(seed, config)
+        # headless runs never touch pygame, they are driven by step() / run(ticks=..., until=...)
+        self.headless = headless
+        self.screen = None
+        self.clock = None
+        if not headless:
+            pygame.init()
+            pygame.display.set_caption("Ants Algorithm")
+            self.screen = pygame.display.set_mode((size_x * config.cell_size, size_y * config.cell_size))
+            self.clock = pygame.time.Clock()
+        self.grid = grid_class(size_x=size_x, size_y=size_y, lazy_evaporation=lazy_evaporation, config=config)
+        self.renderer = None
+        self.governor = FrameGovernor(config.target_fps)
+        # always on, it costs a few timer reads per tick and per frame
+        self.profiler = None
+        self.reset_profiler()
+        self.tick = 0
+        self.deaths = 0
+        self.next_serial = 1
+        self.food_sources = []
         self.create_food_sources()
         self.nest = None
         self.create_nest()
         self.ants = []  # self.create_ants()
 
+    def reset_profiler(self, window=None, windows=None):
+        # antprofile is loaded by the first simulation, the model itself does not need it
+        from antprofile import PhaseProfiler, PROFILE_WINDOW, PROFILE_WINDOWS
+        self.profiler = PhaseProfiler(PROFILE_WINDOW if window is None else window,
+                                      PROFILE_WINDOWS if windows is None else windows)
+        self.profiler.watch('active_cells', lambda: self.grid.count_active_cells())
+        self.profiler.watch('ants', self.count_ants)
+
     def create_nest(self):
         # nest = Nest(random.randint(10, int((self.world.size_x - 1) / 3)),
         #             random.randint(10, int((self.world.size_y - 1) / 3)))
-        nest = Nest(random.randint(int((self.world.size_x - 1) / 3), int((self.world.size_x - 1) / 2)),
-                    random.randint(int((self.world.size_y - 1) / 3), int((self.world.size_y - 1) / 2)))
+        setup = self.random.setup
+        nest = Nest(setup.randint(int((self.world.size_x - 1) / 3), int((self.world.size_x - 1) / 2)),
+                    setup.randint(int((self.world.size_y - 1) / 3), int((self.world.size_y - 1) / 2)),
+                    self.config.nest_size)
         self.grid.set_nest(nest)
         self.nest = nest
 
     def create_ants(self):
         ants = []
-        for i in range(NUM_OF_ANTS):
+        for i in range(self.config.num_of_ants):
             # ants.append(Ant(random.randint(0, self.world.size_x), random.randint(0, self.world.size_y),
             #                 random.randint(0, 1500), self.world.size_x, self.world.size_y))
 
-            ants.append(Ant(self.nest.x, self.nest.y,
-                            random.choice(DIRECTIONS), self.world.size_x, self.world.size_y, grid=self.grid))
+            ants.append(self.new_ant(self.nest.x, self.nest.y, self.random.setup.choice(DIRECTIONS)))
             # ants.append(Ant(i, i, i, self.world.size_x, self.world.size_y, speed=random.randint(1, 2)))
         return ants
 
     def create_food_sources(self):
-        for i in range(NUM_OF_FOOD_SOURCES):
-            food = Food(random.randint(int(0.1*(self.world.size_x-1)), self.world.size_x-1),
-                        random.randint(int(0.1*(self.world.size_y-1)), self.world.size_y-1),
-                        random.randint(MIN_FOOD_AMOUNT, MAX_FOOD_AMOUNT))
+        setup = self.random.setup
+        config = self.config
+        for i in range(config.num_of_food_sources):
+            food = Food(setup.randint(int(0.1*(self.world.size_x-1)), self.world.size_x-1),
+                        setup.randint(int(0.1*(self.world.size_y-1)), self.world.size_y-1),
+                        setup.randint(config.min_food_amount, config.max_food_amount))
             self.grid.set_food(food)
+            self.food_sources.append(food)
 
     def process_input(self):
-        global DRAW_PHEROMONES
-        global DRAW_HORIZONS
-        global CLOCK_TICK
-        global RENDER
-        global RUNNING
-        global DRAW_FOOD_PHEROMONES
-        global DRAW_NEST_PHEROMONES
-        global DRAW_DEAD_PHEROMONES
+        view = self.view
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-                RUNNING = False
+                self.running = False
                 # quit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
-                    DRAW_PHEROMONES = not DRAW_PHEROMONES
+                    view.draw_pheromones = not view.draw_pheromones
                 if event.key == pygame.K_f:
-                    DRAW_FOOD_PHEROMONES = not DRAW_FOOD_PHEROMONES
+                    view.draw_food_pheromones = not view.draw_food_pheromones
                 if event.key == pygame.K_n:
-                    DRAW_NEST_PHEROMONES = not DRAW_NEST_PHEROMONES
+                    view.draw_nest_pheromones = not view.draw_nest_pheromones
                 if event.key == pygame.K_d:
-                    DRAW_DEAD_PHEROMONES = not DRAW_DEAD_PHEROMONES
+                    view.draw_dead_pheromones = not view.draw_dead_pheromones
                 if event.key == pygame.K_h:
-                    DRAW_HORIZONS = not DRAW_HORIZONS
+                    view.draw_horizons = not view.draw_horizons
                 if event.key == pygame.K_r:
-                    RENDER = not RENDER
+                    view.render = not view.render
+                if event.key == pygame.K_m:
+                    view.max_speed = not view.max_speed
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 4:  # scroll up
-                    CLOCK_TICK += CLOCK_STEP
-                    print(CLOCK_TICK)
+                    view.clock_tick += self.config.clock_step
+                    print(view.clock_tick)
                 elif event.button == 5:  # scroll down
-                    CLOCK_TICK -= CLOCK_STEP
-                    if CLOCK_TICK < 1:
-                        CLOCK_TICK = 1
-                    print(CLOCK_TICK)
+                    view.clock_tick -= self.config.clock_step
+                    if view.clock_tick < 1:
+                        view.clock_tick = 1
+                    print(view.clock_tick)
 
     def update_positions(self):
-        to_remove_ids = []
+        expired = []
+        thresh = self.config.no_food_nest_visit_thresh
         for idx, ant in enumerate(self.ants):
+            ant.slot = idx
             ant.no_food_nest_visit += 1
-            if ant.no_food_nest_visit > NO_FOOD_NEST_VISIT_THRESH:
-                pheromone_amout = ant.no_food_nest_visit/10
-                if ant.mode == MODE_TO_NEST:
-                    pheromone_amout /= 4
-                self.grid.inc_dead_counter(ant.x, ant.y, pheromone_amout)
-                for dir_x in range(-HORIZON_SIZE, HORIZON_SIZE+1):
-                    for dir_y in range(-HORIZON_SIZE, HORIZON_SIZE+1):
-                        if dir_x == 0 and dir_y == 0:
-                            continue
-                        x = dir_x + ant.x
-                        y = dir_y + ant.y
-                        if not is_valid_coord(x, y, self.grid.size_x, self.grid.size_y):
-                            continue
-                        self.grid.inc_dead_counter(x, y, pheromone_amout)
-
-                to_remove_ids.append(idx)
+            if ant.no_food_nest_visit > thresh:
+                expired.append(idx)
+        # the ants expiring this tick mark their windows before any ant moves, and still make their last move
+        if expired:
+            self.stamp_dead_pheromones([self.ants[idx] for idx in expired])
+        for ant in self.ants:
             try:
                 ant.update_position()
             except:
                 print(traceback.format_exc())
-        for idx in reversed(to_remove_ids):
-            print(f'removing ant id {idx} {self.ants[idx]}')
-            del self.ants[idx]
-
+        if expired:
+            for idx in expired:
+                print(f'removing ant id {idx} {self.ants[idx]}')
+            expired = set(expired)
+            self.ants = [ant for idx, ant in enumerate(self.ants) if idx not in expired]
+            self.profiler.count('ants_removed', len(expired))
+        self.deaths += len(expired)
+
+    def stamp_dead_pheromones(self, ants):
+        start = time.perf_counter()
+        pheromone_amounts = np.array([ant.no_food_nest_visit for ant in ants]) / 10
+        pheromone_amounts = np.where([ant.mode == MODE_TO_NEST for ant in ants], pheromone_amounts / 4,
+                                     pheromone_amounts)
+        self.grid.stamp_dead([ant.x for ant in ants], [ant.y for ant in ants], pheromone_amounts)
+        self.profiler.add('stamp_dead', time.perf_counter() - start)
 
     def update_grid(self):
         self.grid.update()
 
+    def new_ant(self, x, y, direction):
+        # every ant gets the next serial, which keys its random draws
+        ant = Ant(x, y, direction, self.world.size_x, self.world.size_y, grid=self.grid, streams=self.random,
+                  config=self.config, view=self.view, serial=self.next_serial)
+        self.next_serial += 1
+        return ant
+
     def update_ants(self):
-        if len(self.ants) < NUM_OF_ANTS:
-            if random.randint(0, 1000) < 600:
+        self.random.begin_tick(self.tick, [ant.serial for ant in self.ants], self.next_serial)
+        if len(self.ants) < self.config.num_of_ants:
+            if self.random.spawn < 600:
                 return
-            self.ants.append(Ant(self.nest.x, self.nest.y, random.choice(DIRECTIONS), self.world.size_x, self.world.size_y, grid=self.grid))
+            self.ants.append(self.new_ant(self.nest.x, self.nest.y, self.random.heading))
+            self.profiler.count('ants_spawned')
             # self.ants.append(
             #     Ant(self.nest.x, self.nest.y, E, self.world.size_x, self.world.size_y,
             #         grid=self.grid))
 
     def process_logic(self):
+        # update_positions includes the stamp_dead time of the ants expiring in it
+        profiler = self.profiler
+        start = time.perf_counter()
         self.update_ants()
+        after_ants = time.perf_counter()
         self.update_positions()
+        after_positions = time.perf_counter()
         self.update_grid()
+        end = time.perf_counter()
+        self.tick += 1
+        profiler.add('update_ants', after_ants - start)
+        profiler.add('update_positions', after_positions - after_ants)
+        profiler.add('grid_update', end - after_positions)
+        self.count_grid_events()
+        profiler.end_tick()
         # self.log_food_sources()
 
+    def count_grid_events(self):
+        grid = self.grid
+        self.profiler.count('get_best_cell', grid.best_cell_calls)
+        self.profiler.count('cells_scanned', grid.cells_scanned)
+        grid.best_cell_calls = 0
+        grid.cells_scanned = 0
+
+    def advance(self, n_ticks):
+        for _ in range(n_ticks):
+            self.process_logic()
+
+    def count_ants(self):
+        return len(self.ants)
+
+    def get_ant_arrays(self):
+        # x, y, mode and direction of every ant
+        return ([ant.x for ant in self.ants], [ant.y for ant in self.ants], [ant.mode for ant in self.ants],
+                [ant.direction for ant in self.ants])
+
+    def count_food(self):
+        return sum(food.amount for food in self.food_sources)
+
+    def export_ants(self):
+        x, y, mode, direction = self.get_ant_arrays()
+        return {'ant_x': np.array(x, dtype=np.int32), 'ant_y': np.array(y, dtype=np.int32),
+                'ant_direction': np.array(direction, dtype=np.int8), 'ant_mode': np.array(mode, dtype=np.int8),
+                'ant_no_food_nest_visit': np.array([ant.no_food_nest_visit for ant in self.ants], dtype=np.int32),
+                'ant_serial': np.array([ant.serial for ant in self.ants], dtype=np.int64),
+                'next_serial': np.array(self.next_serial)}
+
+    def import_ants(self, state):
+        self.ants = []
+        n = len(state['ant_x'])
+        # checkpoints saved before the Ant object engine kept serials have none
+        if 'ant_serial' in state:
+            serials = state['ant_serial'].tolist()
+            next_serial = int(state['next_serial'])
+        else:
+            serials = list(range(1, n + 1))
+            next_serial = n + 1
+        for x, y, direction, mode, no_food_nest_visit, serial in zip(
+                state['ant_x'].tolist(), state['ant_y'].tolist(), state['ant_direction'].tolist(),
+                state['ant_mode'].tolist(), state['ant_no_food_nest_visit'].tolist(), serials):
+            ant = Ant(x, y, direction, self.world.size_x, self.world.size_y, grid=self.grid, streams=self.random,
+                      config=self.config, view=self.view, serial=serial)
+            ant.mode = mode
+            ant.no_food_nest_visit = no_food_nest_visit
+            self.ants.append(ant)
+        self.next_serial = next_serial
+
+    def save_checkpoint(self, path):
+        # one uncompressed .npz with the grid layers, food, nest, ants and random state, the random draws are keyed
+        # by (seed, tick, serial) so the seed, the tick and the serials are all of their state
+        state = {
+            'size': np.array([self.world.size_x, self.world.size_y]),
+            'tick': np.array(self.tick),
+            'deaths': np.array(self.deaths),
+            'seed': np.array(self.random.seed),
+            'foods': np.array([(food.x, food.y, food.amount) for food in self.food_sources], dtype=np.int64),
+            'nest': np.array([self.nest.x, self.nest.y, self.nest.radius]),
+        }
+        state.update(self.grid.export_state(self.food_sources))
+        state.update(self.export_ants())
+        np.savez(path, **state)
+
+    def load_checkpoint(self, path):
+        # restores a checkpoint into this simulation, which must have the same world size, and may be of another
+        # engine than the one that saved it
+        with np.load(path) as state:
+            if tuple(state['size'].tolist()) != (self.world.size_x, self.world.size_y):
+                raise ValueError(f"checkpoint world is {tuple(state['size'].tolist())}, "
+                                 f"not {(self.world.size_x, self.world.size_y)}")
+            self.random = RandomStreams(int(state['seed']), self.config)
+            self.tick = int(state['tick'])
+            self.deaths = int(state['deaths'])
+            self.food_sources = [Food(x, y, amount) for x, y, amount in state['foods'].tolist()]
+            nest_x, nest_y, radius = state['nest'].tolist()
+            self.nest = Nest(nest_x, nest_y, radius)
+            self.grid.import_state(state, self.food_sources, self.nest)
+            self.import_ants(state)
+
     def render_scene(self):
-        self.screen.fill((10, 10, 10))
-        self.grid.draw(self.screen)
-        # self.nest.draw(self.screen)
-        # for food_source in self.food_sources:
-        #     food_source.draw(self.screen)
-        for ant in self.ants:
-            ant.draw(self.screen)
+        if self.renderer is None:
+            self.renderer = FrameRenderer(self.world.size_x, self.world.size_y, self.config, self.view)
+        self.renderer.draw_grid(self.grid)
+        self.renderer.draw_ants(*self.get_ant_arrays())
+        self.renderer.blit(self.screen)
         pygame.display.flip()
 
     def process_frame(self):
-        self.clock.tick(CLOCK_TICK)
+        view = self.view
+        self.clock.tick(self.config.target_fps)
+        input_start = time.perf_counter()
         self.process_input()
-        self.process_logic()
-        if RENDER:
+        self.profiler.add('process_input', time.perf_counter() - input_start)
+        ticks = self.governor.plan(None if view.max_speed else view.clock_tick)
+        start = time.perf_counter()
+        if ticks > 0:
+            self.advance(ticks)
+        logic_end = time.perf_counter()
+        if view.render:
             self.render_scene()
-
-    def run(self):
-        global RUNNING
-        while RUNNING:
-            self.process_frame()
+        render_seconds = time.perf_counter() - logic_end
+        if view.render:
+            self.profiler.add('render_scene', render_seconds)
+        if self.governor.record(ticks, logic_end - start, render_seconds, view.render):
+            target = 'max' if view.max_speed else view.clock_tick
+            pygame.display.set_caption(f'Ants Algorithm {self.governor.ticks_per_second:.0f} ticks/s '
+                                       f'(target {target}) {self.governor.frames_per_second:.0f} fps '
+                                       f'skip {self.governor.skip_ratio:.0%}')
+
+    def step(self, n_ticks=1):
+        return self.run(ticks=n_ticks)
+
+    def run(self, ticks=None, until=None):
+        # without arguments this is the interactive loop, otherwise the ticks run unthrottled and without
+        # rendering until `ticks` ticks are done or until(self) returns True, and a summary is returned
+        if ticks is None and until is None:
+            if self.headless:
+                raise ValueError('a headless run needs ticks or until')
+            while self.running:
+                self.process_frame()
+            return None
+
+        start_tick = self.tick
+        start_food = self.count_food()
+        start_deaths = self.deaths
+        start_time = time.perf_counter()
+        if until is None:
+            self.advance(ticks)
+        else:
+            while self.running and (ticks is None or self.tick - start_tick < ticks) and not until(self):
+                self.advance(1)
+        elapsed = time.perf_counter() - start_time
+
+        ticks_done = self.tick - start_tick
+        food_left = self.count_food()
+        return {
+            'tick': self.tick,
+            'ticks': ticks_done,
+            'seconds': elapsed,
+            'ticks_per_second': ticks_done / elapsed if elapsed > 0 else 0.0,
+            'ants': self.count_ants(),
+            'food_left': food_left,
+            'food_taken': start_food - food_left,
+            'deaths': self.deaths - start_deaths,
+        }
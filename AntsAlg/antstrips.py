@@ -0,0 +1,532 @@
+import math
+import weakref
+import functools
+import traceback
+import tracemalloc
+import multiprocessing
+from multiprocessing import shared_memory
+from queue import Empty
+import numpy as np
+
+from antsalg2 import AntsAlgorithm, jit, get_default_config, get_horizon_table, is_valid_coord, SIZE_X, SIZE_Y
+from antsalg2 import MODE_TO_NEST, CELL_TYPE_NEST, CELL_TYPE_FOOD
+from antkernel import advance_ant, inc_counter, decay_rows, clear_depleted_food, spawn_ant
+from antkernel import DEPOSIT_NO_FOOD, DEPOSIT_WITH_FOOD
+
+# python -c "from antstrips import StripAntsAlgorithm; sim = StripAntsAlgorithm(4096, 4096, workers=8, \
+#     headless=True); print(sim.run(ticks=1000)); sim.close()"
+
+WORKERS = 4
+# the layers of a strip block in shared memory, in this order
+LAYER_DTYPES = (('no_food', np.int16), ('with_food', np.int16), ('dead', np.int16), ('cell_type', np.uint8),
+                ('food_id', np.int16))
+ANT_DTYPES = (('x', np.int32), ('y', np.int32), ('direction', np.int8), ('mode', np.int8),
+              ('no_food_nest_visit', np.int32), ('serial', np.int64))
+# columns of the shared stats table, one row per worker, the food pickups of the tick follow the count
+STAT_COUNT = 0
+STAT_FOOD = 1
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def stamp_rows(no_food, with_food, dead, cell_type, row0, first_row, last_row, xs, ys, amounts, horizon_size):
+    # the dead pheromone windows of the dying ants, clipped to the world rows first_row..last_row of a block that
+    # starts at world row row0
+    size_x = cell_type.shape[1]
+    for i in range(len(xs)):
+        for y in range(max(ys[i] - horizon_size, first_row), min(ys[i] + horizon_size + 1, last_row)):
+            for x in range(max(xs[i] - horizon_size, 0), min(xs[i] + horizon_size + 1, size_x)):
+                inc_counter(dead, no_food, with_food, dead, cell_type, None, 0, x, y - row0, amounts[i])
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def advance_strip(no_food, with_food, dead, cell_type, food_id, row0, size_x, size_y, tick, requests,
+                  ant_x, ant_y, ant_direction, ant_mode, ant_no_food_nest_visit, ant_serial, count,
+                  no_food_nest_visit_thresh, randomize_range, randomize_threshold,
+                  horizon_dx, horizon_dy, horizon_dist, seed):
+    # the moves of run_ticks_parallel for the ants of one strip, every ant decides from the block as it is after the
+    # dead pheromones and the halo of the tick, then the deposits are written and the food pickups are counted per
+    # source in requests, returns the ants left and the ants that died
+    new_x = np.empty(count, dtype=np.int32)
+    new_y = np.empty(count, dtype=np.int32)
+    new_direction = np.empty(count, dtype=np.int8)
+    new_mode = np.empty(count, dtype=np.int8)
+    new_no_food_nest_visit = np.empty(count, dtype=np.int32)
+    deposit = np.empty(count, dtype=np.int8)
+    amount = np.empty(count, dtype=np.float64)
+    took_food = np.empty(count, dtype=np.bool_)
+    for i in range(count):
+        x, y, direction, mode, no_food_nest_visit, deposit_, amount_, took_food_ = advance_ant(
+            no_food, with_food, dead, cell_type, None, tick, size_x, size_y, row0,
+            horizon_dx, horizon_dy, horizon_dist, ant_x[i], ant_y[i], ant_direction[i], ant_mode[i],
+            ant_no_food_nest_visit[i] + 1, ant_serial[i], seed, no_food_nest_visit_thresh,
+            randomize_range, randomize_threshold)
+        new_x[i] = x
+        new_y[i] = y
+        new_direction[i] = direction
+        new_mode[i] = mode
+        new_no_food_nest_visit[i] = no_food_nest_visit
+        deposit[i] = deposit_
+        amount[i] = amount_
+        took_food[i] = took_food_
+
+    alive = 0
+    for i in range(count):
+        row = ant_y[i] - row0
+        if deposit[i] == DEPOSIT_WITH_FOOD:
+            inc_counter(with_food, no_food, with_food, dead, cell_type, None, tick, ant_x[i], row, amount[i])
+        elif deposit[i] == DEPOSIT_NO_FOOD:
+            inc_counter(no_food, no_food, with_food, dead, cell_type, None, tick, ant_x[i], row, amount[i])
+        if took_food[i]:
+            requests[food_id[row, ant_x[i]]] += 1
+        if ant_no_food_nest_visit[i] + 1 > no_food_nest_visit_thresh:
+            continue
+        ant_x[alive] = new_x[i]
+        ant_y[alive] = new_y[i]
+        ant_direction[alive] = new_direction[i]
+        ant_mode[alive] = new_mode[i]
+        ant_no_food_nest_visit[alive] = new_no_food_nest_visit[i]
+        ant_serial[alive] = ant_serial[i]
+        alive += 1
+    return alive, count - alive
+
+
+def split_rows(size_y, workers):
+    # (first row, last row + 1) of every strip
+    bounds = [size_y * index // workers for index in range(workers + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class StripBlock:
+    # the rows of one strip and up to halo rows on either side of it, as arrays over one shared memory block
+    def __init__(self, size_x, size_y, first_row, last_row, halo):
+        self.first_row = first_row
+        self.last_row = last_row
+        self.row0 = max(first_row - halo, 0)
+        self.row1 = min(last_row + halo, size_y)
+        shape = (self.row1 - self.row0, size_x)
+        cells = shape[0] * shape[1]
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=sum(cells * np.dtype(dtype).itemsize for _, dtype in LAYER_DTYPES))
+        self.layers = {}
+        offset = 0
+        for name, dtype in LAYER_DTYPES:
+            self.layers[name] = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            offset += cells * np.dtype(dtype).itemsize
+        self.layers['food_id'][:] = -1
+
+    def owned(self, name):
+        # the strip rows of a layer, without the halo
+        return self.layers[name][self.first_row - self.row0:self.last_row - self.row0]
+
+    def rows(self, name, first_row, last_row):
+        # world rows first_row..last_row of a layer, they must be inside the block
+        return self.layers[name][first_row - self.row0:last_row - self.row0]
+
+    def release(self):
+        self.layers = {}
+        self.memory.close()
+        self.memory.unlink()
+
+
+class StripGrid:
+    # the grid of a StripAntsAlgorithm as seen from the main process, the layers live in the blocks of the workers,
+    # this sets up the food and the nest and assembles the layers for drawing and checkpoints between ticks
+    def __init__(self, size_x, size_y, lazy_evaporation=False, workers=WORKERS, halo=None, config=None):
+        if lazy_evaporation:
+            raise ValueError('StripGrid only supports eager evaporation')
+        if config is None:
+            config = get_default_config()
+        self.config = config
+        self.horizon_table = get_horizon_table(config.horizon_size)
+        if halo is None:
+            halo = config.horizon_size
+        if size_y // workers < halo:
+            raise ValueError(f'{workers} strips of {size_y} rows are narrower than the {halo} row halo')
+        self.size_x = size_x
+        self.size_y = size_y
+        self.halo = halo
+        self.blocks = [StripBlock(size_x, size_y, first_row, last_row, halo)
+                       for first_row, last_row in split_rows(size_y, workers)]
+        self.foods = []
+        self.depleted_foods = set()
+        self.nest = None
+        self.tick = 0
+
+    def set_food(self, food):
+        food_id = len(self.foods)
+        self.foods.append(food)
+        x0 = max(food.x, 0)
+        size = self.config.food_source_size
+        x1 = min(food.x + size, self.size_x)
+        for block in self.blocks:
+            y0 = max(food.y, block.row0)
+            y1 = min(food.y + size, block.row1)
+            if y0 < y1:
+                block.rows('food_id', y0, y1)[:, x0:x1] = food_id
+                block.rows('cell_type', y0, y1)[:, x0:x1] = CELL_TYPE_FOOD
+
+    def set_nest(self, nest):
+        radius = nest.radius
+        cells = [(nest.x + x_, nest.y + y_) for x_ in range(-radius, radius) for y_ in range(-radius, radius)
+                 if math.sqrt(x_*x_ + y_*y_) <= radius and is_valid_coord(nest.x + x_, nest.y + y_, self.size_x,
+                                                                         self.size_y)]
+        xs, ys = np.array(cells, dtype=np.int64).reshape(-1, 2).T
+        for block in self.blocks:
+            inside = (ys >= block.row0) & (ys < block.row1)
+            block.layers['cell_type'][ys[inside] - block.row0, xs[inside]] = CELL_TYPE_NEST
+        self.nest = nest
+
+    def get_layer(self, name):
+        return np.concatenate([block.owned(name) for block in self.blocks])
+
+    def get_layers(self):
+        amounts = np.array([food.amount for food in self.foods] + [0], dtype=np.int32)
+        return (self.get_layer('cell_type'), self.get_layer('no_food'), self.get_layer('with_food'),
+                self.get_layer('dead'), amounts[self.get_layer('food_id')])
+
+    def export_state(self, foods):
+        # the full layers, in the format of ArrayGrid, so any engine loads them
+        state = {name: self.get_layer(name) for name, _ in LAYER_DTYPES}
+        state['depleted_foods'] = np.array(sorted(self.depleted_foods), dtype=np.int32)
+        return state
+
+    def import_state(self, state, foods, nest):
+        if len(foods) != len(self.foods):
+            raise ValueError(f'checkpoint has {len(foods)} food sources, the workers were started with '
+                             f'{len(self.foods)}')
+        for block in self.blocks:
+            for name, _ in LAYER_DTYPES:
+                np.copyto(block.layers[name], state[name][block.row0:block.row1])
+        self.foods = foods
+        self.nest = nest
+        if 'depleted_foods' in state:
+            self.depleted_foods = set(state['depleted_foods'].tolist())
+        else:
+            self.depleted_foods = {food_id for food_id, food in enumerate(foods) if food.amount == 0}
+        self.tick = int(state['tick'])
+
+    def release(self):
+        for block in self.blocks:
+            block.release()
+        self.blocks = []
+
+
+class StripWorker:
+    # the ants of one strip, runs the ticks in a worker process in lockstep with the other strips
+    def __init__(self, index, blocks, stats, barrier, from_above, from_below, to_above, to_below):
+        self.index = index
+        self.blocks = blocks
+        self.block = blocks[index]
+        self.neighbours = [block for block in (blocks[index - 1] if index > 0 else None,
+                                               blocks[index + 1] if index + 1 < len(blocks) else None) if block]
+        self.stats = np.frombuffer(stats, dtype=np.int64).reshape(len(blocks), -1)
+        self.barrier = barrier
+        self.from_above = from_above
+        self.from_below = from_below
+        self.to_above = to_above
+        self.to_below = to_below
+        self.size_x = self.block.layers['cell_type'].shape[1]
+        self.size_y = blocks[-1].last_row
+        self.ants = {name: np.zeros(0, dtype=dtype) for name, dtype in ANT_DTYPES}
+        self.count = 0
+
+    def load(self, ants, next_serial, food_amount, food_x, food_y, food_depleted, nest, tick, seed):
+        own = (ants['y'] >= self.block.first_row) & (ants['y'] < self.block.last_row)
+        self.count = 0
+        self.append({name: values[own] for name, values in ants.items()})
+        self.sort()
+        self.next_serial = next_serial
+        self.food_amount = food_amount.copy()
+        self.food_x = food_x
+        self.food_y = food_y
+        self.food_depleted = food_depleted.copy()
+        self.nest_x, self.nest_y = nest
+        self.owns_nest = self.block.first_row <= self.nest_y < self.block.last_row
+        self.tick = tick
+        self.seed = seed
+        self.stats[self.index, STAT_COUNT] = self.count
+
+    def sort(self):
+        # a dying ant leaves a negative deposit, which does not commute with the others at the 1000 cap, so the
+        # deposits must come in the order of ParallelAntsAlgorithm, and that keeps its ants in serial order
+        order = np.argsort(self.ants['serial'][:self.count], kind='stable')
+        for values in self.ants.values():
+            values[:self.count] = values[:self.count][order]
+
+    def get_ants(self):
+        return {name: values[:self.count].copy() for name, values in self.ants.items()}
+
+    def reserve(self, capacity):
+        if capacity <= len(self.ants['x']):
+            return
+        capacity = max(capacity, 2 * len(self.ants['x']), 1024)
+        for name, dtype in ANT_DTYPES:
+            new = np.zeros(capacity, dtype=dtype)
+            new[:self.count] = self.ants[name][:self.count]
+            self.ants[name] = new
+
+    def append(self, ants):
+        n = len(ants['x'])
+        self.reserve(self.count + n)
+        for name, values in ants.items():
+            self.ants[name][self.count:self.count + n] = values
+        self.count += n
+
+    def take(self, leaving):
+        # removes the ants marked in leaving and returns them
+        n = self.count
+        taken = {name: values[:n][leaving] for name, values in self.ants.items()}
+        staying = ~leaving
+        self.count = int(staying.sum())
+        for values in self.ants.values():
+            values[:self.count] = values[:n][staying]
+        return taken
+
+    def exchange(self, above, below):
+        # sends to both neighbours and then receives from both, a queue hands its items to a feeder thread so the
+        # sends never wait for the other side
+        if self.to_above is not None:
+            self.to_above.put(above)
+        if self.to_below is not None:
+            self.to_below.put(below)
+        return [queue.get() for queue in (self.from_above, self.from_below) if queue is not None]
+
+    def advance(self, n_ticks, params, table):
+        deaths = 0
+        food_taken = 0
+        for _ in range(n_ticks):
+            died, taken = self.run_tick(*params, table)
+            deaths += died
+            food_taken += taken
+        return {'count': self.count, 'deaths': deaths, 'food_taken': food_taken, 'food_amount': self.food_amount,
+                'food_depleted': self.food_depleted, 'next_serial': self.next_serial if self.owns_nest else None}
+
+    def run_tick(self, num_of_ants, no_food_nest_visit_thresh, randomize_range, randomize_threshold, food_size,
+                 table):
+        # run_ticks_parallel for one strip, the barriers keep the phases of all strips apart
+        block = self.block
+        layers = block.layers
+        first_row, last_row = block.first_row, block.last_row
+        halo = table.horizon_size
+        if self.owns_nest:
+            # the nest spawns while the whole colony is below num_of_ants
+            others = int(self.stats[:, STAT_COUNT].sum()) - self.count
+            self.reserve(self.count + 1)
+            self.count, self.next_serial = spawn_ant(
+                self.ants['x'], self.ants['y'], self.ants['direction'], self.ants['mode'],
+                self.ants['no_food_nest_visit'], self.ants['serial'], self.count, self.next_serial,
+                self.nest_x, self.nest_y, num_of_ants - others, self.tick, self.seed)
+
+        # the dead pheromones of the tick, ants dying near an edge mark the neighbour's rows as well
+        n = self.count
+        visits = self.ants['no_food_nest_visit'][:n] + 1
+        dying = visits > no_food_nest_visit_thresh
+        xs = self.ants['x'][:n][dying]
+        ys = self.ants['y'][:n][dying]
+        amounts = visits[dying] / 10
+        amounts = np.where(self.ants['mode'][:n][dying] == MODE_TO_NEST, amounts / 4, amounts)
+        above = ys < first_row + halo
+        below = ys >= last_row - halo
+        stamps = [(xs, ys, amounts)] + self.exchange((xs[above], ys[above], amounts[above]),
+                                                     (xs[below], ys[below], amounts[below]))
+        for xs_, ys_, amounts_ in stamps:
+            stamp_rows(layers['no_food'], layers['with_food'], layers['dead'], layers['cell_type'], block.row0,
+                       first_row, last_row, xs_.astype(np.int64), ys_.astype(np.int64), amounts_, halo)
+
+        # halo exchange, the edge rows of the neighbours as they are after their stamps
+        self.barrier.wait()
+        for other in self.neighbours:
+            first = max(block.row0, other.first_row)
+            last = min(block.row1, other.last_row)
+            for name, _ in LAYER_DTYPES:
+                np.copyto(block.rows(name, first, last), other.rows(name, first, last))
+        # no strip writes its rows before every halo is copied
+        self.barrier.wait()
+
+        requests = np.zeros(len(self.food_amount), dtype=np.int64)
+        self.count, died = advance_strip(
+            layers['no_food'], layers['with_food'], layers['dead'], layers['cell_type'], layers['food_id'],
+            block.row0, self.size_x, self.size_y, self.tick, requests,
+            self.ants['x'], self.ants['y'], self.ants['direction'], self.ants['mode'],
+            self.ants['no_food_nest_visit'], self.ants['serial'], self.count,
+            no_food_nest_visit_thresh, randomize_range, randomize_threshold, table.dx, table.dy, table.dist, self.seed)
+
+        # every strip sees the pickups of all strips and takes the food the same way, so the amounts agree everywhere
+        self.stats[self.index, STAT_FOOD:] = requests
+        self.barrier.wait()
+        taken = np.minimum(self.food_amount, self.stats[:, STAT_FOOD:].sum(axis=0)).astype(np.int32)
+        self.food_amount -= taken
+
+        self.tick += 1
+        decay_rows(layers['no_food'], layers['with_food'], layers['dead'], layers['cell_type'],
+                   first_row - block.row0, last_row - block.row0)
+        clear_depleted_food(layers['cell_type'], layers['food_id'], self.food_amount, self.food_x,
+                            self.food_y - block.row0, self.food_depleted, food_size)
+
+        # an ant moves one row at most, the ones that left the strip belong to a neighbour now
+        y = self.ants['y'][:self.count]
+        up = y < first_row
+        down = y >= last_row
+        leaving = self.take(up | down)
+        up = leaving['y'] < first_row
+        arrived = self.exchange({name: values[up] for name, values in leaving.items()},
+                                {name: values[~up] for name, values in leaving.items()})
+        if any(len(ants['x']) for ants in arrived):
+            for ants in arrived:
+                self.append(ants)
+            self.sort()
+        self.stats[self.index, STAT_COUNT] = self.count
+        self.barrier.wait()
+        return died, int(taken.sum())
+
+
+def run_worker(index, blocks, stats, barrier, from_above, from_below, to_above, to_below, commands, results):
+    # a forked worker keeps tracing allocations when the parent was measuring its own memory
+    tracemalloc.stop()
+    worker = StripWorker(index, blocks, stats, barrier, from_above, from_below, to_above, to_below)
+    while True:
+        command, args = commands.get()
+        if command == 'stop':
+            return
+        try:
+            results.put((index, getattr(worker, command)(*args), None))
+        except Exception:
+            # the other strips wait at the barrier or for this one's messages
+            barrier.abort()
+            results.put((index, None, traceback.format_exc()))
+            return
+
+
+def stop_workers(processes, commands, grid):
+    for process, queue in zip(processes, commands):
+        if process.is_alive():
+            queue.put(('stop', ()))
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    grid.release()
+
+
+class StripAntsAlgorithm(AntsAlgorithm):
+    # ParallelAntsAlgorithm with the world cut into horizontal strips, each strip and the ants on it are run by a
+    # worker process on a shared memory block that also holds horizon_size rows of each neighbour, those halo rows
+    # are copied from the neighbours every tick after the dead pheromones are stamped, so every ant scans the same
+    # cells as in one process, and ants that step over an edge move to the neighbour's worker, a seed gives the same
+    # run as ParallelAntsAlgorithm for any number of workers
+    def __init__(self, size_x=SIZE_X, size_y=SIZE_Y, seed=None, headless=False, workers=WORKERS, config=None):
+        super().__init__(size_x, size_y, grid_class=functools.partial(StripGrid, workers=workers),
+                         headless=headless, seed=seed, config=config)
+        self.ant_count = 0
+        self.next_serial = 1
+        n = len(self.grid.blocks)
+        # kept here as well, a started process drops its arguments and the workers must not lose the memory
+        self.stats = stats = multiprocessing.RawArray('q', n * (STAT_FOOD + len(self.food_sources)))
+        self.barrier = barrier = multiprocessing.Barrier(n)
+        from_above = [multiprocessing.Queue() if index > 0 else None for index in range(n)]
+        from_below = [multiprocessing.Queue() if index + 1 < n else None for index in range(n)]
+        self.commands = [multiprocessing.Queue() for _ in range(n)]
+        self.results = multiprocessing.Queue()
+        self.processes = []
+        for index in range(n):
+            process = multiprocessing.Process(
+                target=run_worker, daemon=True,
+                args=(index, self.grid.blocks, stats, barrier, from_above[index], from_below[index],
+                      from_below[index - 1] if index > 0 else None, from_above[index + 1] if index + 1 < n else None,
+                      self.commands[index], self.results))
+            process.start()
+            self.processes.append(process)
+        self.finalizer = weakref.finalize(self, stop_workers, self.processes, self.commands, self.grid)
+        self.import_ants({'ant_x': np.zeros(0, dtype=np.int32), 'ant_y': np.zeros(0, dtype=np.int32),
+                          'ant_direction': np.zeros(0, dtype=np.int8), 'ant_mode': np.zeros(0, dtype=np.int8),
+                          'ant_no_food_nest_visit': np.zeros(0, dtype=np.int32)})
+
+    @property
+    def seed(self):
+        return self.random.seed
+
+    def call(self, command, *args):
+        # runs a StripWorker method in every worker and returns the results in strip order
+        for queue in self.commands:
+            queue.put((command, args))
+        results = [None] * len(self.processes)
+        for _ in self.processes:
+            while True:
+                try:
+                    index, result, error = self.results.get(timeout=1)
+                    break
+                except Empty:
+                    if not all(process.is_alive() for process in self.processes):
+                        self.close()
+                        raise RuntimeError('a strip worker exited')
+            if error is not None:
+                self.close()
+                raise RuntimeError(f'strip worker {index} failed:\n{error}')
+            results[index] = result
+        return results
+
+    def close(self):
+        self.finalizer()
+
+    def process_logic(self):
+        self.advance(1)
+
+    def advance(self, n_ticks):
+        config = self.config
+        table = self.grid.horizon_table
+        if table.horizon_size > self.grid.halo:
+            raise ValueError(f'horizon_size {table.horizon_size} is wider than the {self.grid.halo} row halo')
+        params = (config.num_of_ants, config.no_food_nest_visit_thresh, config.randomize_pos_range,
+                  config.randomize_pos_threshold, config.food_source_size)
+        results = self.call('advance', n_ticks, params, table)
+        self.tick += n_ticks
+        self.grid.tick = self.tick
+        self.deaths += sum(result['deaths'] for result in results)
+        self.ant_count = sum(result['count'] for result in results)
+        self.next_serial = next(result['next_serial'] for result in results if result['next_serial'] is not None)
+        # all strips hold the same food amounts
+        for food, amount in zip(self.food_sources, results[0]['food_amount'].tolist()):
+            food.amount = amount
+        self.grid.depleted_foods.update(np.flatnonzero(results[0]['food_depleted']).tolist())
+
+    def count_ants(self):
+        return self.ant_count
+
+    def get_ants(self):
+        # the ants of all strips, ordered by serial
+        parts = self.call('get_ants')
+        ants = {name: np.concatenate([part[name] for part in parts]) for name, _ in ANT_DTYPES}
+        order = np.argsort(ants['serial'], kind='stable')
+        return {name: values[order] for name, values in ants.items()}
+
+    def get_ant_arrays(self):
+        ants = self.get_ants()
+        return ants['x'], ants['y'], ants['mode'], ants['direction']
+
+    def export_ants(self):
+        ants = self.get_ants()
+        return {'ant_x': ants['x'], 'ant_y': ants['y'], 'ant_direction': ants['direction'], 'ant_mode': ants['mode'],
+                'ant_no_food_nest_visit': ants['no_food_nest_visit'], 'ant_serial': ants['serial'],
+                'next_serial': np.array(self.next_serial)}
+
+    def import_ants(self, state):
+        n = len(state['ant_x'])
+        ants = {'x': state['ant_x'], 'y': state['ant_y'], 'direction': state['ant_direction'],
+                'mode': state['ant_mode'], 'no_food_nest_visit': state['ant_no_food_nest_visit']}
+        # checkpoints saved before the Ant object engine kept serials have none
+        if 'ant_serial' in state:
+            ants['serial'] = state['ant_serial']
+            self.next_serial = int(state['next_serial'])
+        else:
+            ants['serial'] = np.arange(1, n + 1)
+            self.next_serial = n + 1
+        ants = {name: np.asarray(ants[name], dtype=dtype) for name, dtype in ANT_DTYPES}
+        foods = self.food_sources
+        food_amount = np.array([food.amount for food in foods], dtype=np.int32)
+        food_x = np.array([food.x for food in foods], dtype=np.int32)
+        food_y = np.array([food.y for food in foods], dtype=np.int32)
+        food_depleted = np.array([food_id in self.grid.depleted_foods for food_id in range(len(foods))],
+                                 dtype=np.uint8)
+        self.call('load', ants, self.next_serial, food_amount, food_x, food_y, food_depleted,
+                  (self.nest.x, self.nest.y), self.tick, self.seed)
+        self.ant_count = n
@@ -0,0 +1,124 @@
+import time
+import threading
+import pygame
+import numpy as np
+
+from antsalg2 import FrameRenderer
+
+FRAME_RATE = 60
+
+
+class Snapshot:
+    # grid layers and ants of one completed tick, the arrays are reused from one capture to the next
+    def __init__(self):
+        self.tick = 0
+        self.layers = None
+        self.ants = None
+
+    def capture(self, sim):
+        layers = sim.grid.get_layers()
+        if self.layers is None:
+            self.layers = [np.array(layer) for layer in layers]
+        else:
+            for dst, src in zip(self.layers, layers):
+                np.copyto(dst, src)
+        self.ants = [np.array(values) for values in sim.get_ant_arrays()]
+        self.tick = sim.tick
+
+
+class SnapshotBuffer:
+    # the simulation fills the back snapshot while the renderer reads the front one, publishing swaps them,
+    # a tick is only captured when the renderer has taken the previous snapshot and is not reading the back one
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshots = [Snapshot(), Snapshot()]
+        self.front = None
+        self.reading = None
+        self.wanted = True
+
+    def begin_write(self):
+        with self.lock:
+            if not self.wanted:
+                return None
+            back = 0 if self.front is None else 1 - self.front
+            if self.reading == back:
+                return None
+            return back
+
+    def end_write(self, back):
+        with self.lock:
+            self.front = back
+            self.wanted = False
+
+    def acquire(self):
+        with self.lock:
+            if self.front is None:
+                return None
+            self.reading = self.front
+            self.wanted = True
+            return self.snapshots[self.front]
+
+    def release(self):
+        with self.lock:
+            self.reading = None
+
+
+class SimulationThread(threading.Thread):
+    # advances the simulation as fast as it computes and publishes snapshots into the buffer
+    def __init__(self, sim, buffer, batch_ticks=1):
+        super().__init__(daemon=True)
+        self.sim = sim
+        self.buffer = buffer
+        self.batch_ticks = batch_ticks
+        self.running = True
+        self.ticks_per_second = 0.0
+
+    def run(self):
+        window_start = time.perf_counter()
+        window_ticks = 0
+        while self.running and self.sim.running:
+            self.sim.advance(self.batch_ticks)
+            window_ticks += self.batch_ticks
+            back = self.buffer.begin_write()
+            if back is not None:
+                self.buffer.snapshots[back].capture(self.sim)
+                self.buffer.end_write(back)
+            elapsed = time.perf_counter() - window_start
+            if elapsed >= 1.0:
+                self.ticks_per_second = window_ticks / elapsed
+                window_start += elapsed
+                window_ticks = 0
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+
+def run_threaded(sim, frame_rate=FRAME_RATE, batch_ticks=1):
+    # the pygame loop of AntsAlgorithm.run with the simulation moved to a SimulationThread, the window shows the
+    # latest published tick at its own frame rate
+    buffer = SnapshotBuffer()
+    thread = SimulationThread(sim, buffer, batch_ticks)
+    renderer = FrameRenderer(sim.world.size_x, sim.world.size_y, sim.config, sim.view)
+    thread.start()
+    try:
+        while sim.running and thread.is_alive():
+            sim.clock.tick(frame_rate)
+            sim.process_input()
+            if not sim.view.render:
+                continue
+            snapshot = buffer.acquire()
+            if snapshot is None:
+                continue
+            try:
+                renderer.draw_layers(snapshot.layers)
+                renderer.draw_ants(*snapshot.ants)
+                tick = snapshot.tick
+            finally:
+                buffer.release()
+            renderer.blit(sim.screen)
+            pygame.display.set_caption(f'Ants Algorithm tick {tick} {thread.ticks_per_second:.0f} ticks/s '
+                                       f'{sim.clock.get_fps():.0f} fps')
+            pygame.display.flip()
+    finally:
+        thread.stop()
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import platform
+import tracemalloc
+import numpy as np
+from dataclasses import replace
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from antsalg2 import AntsAlgorithm, Grid, ArrayGrid, NUMBA_AVAILABLE, DIRECTIONS, get_default_config
+from antsalg2 import MODE_TO_NEST, MODE_TO_FOOD
+from antcolony import ColonyAntsAlgorithm
+from antkernel import KernelAntsAlgorithm, ParallelAntsAlgorithm
+from antchunks import ChunkedGrid
+from antstrips import StripAntsAlgorithm
+
+# python AntsAlg/benchmark.py --preset small --preset medium --out run.json --baseline baseline.json
+
+SEED = 1234
+REGRESSION_TOLERANCE = 0.15
+BEST_CELL_SAMPLES = 2000
+DEAD_STAMP_SAMPLES = 200
+RENDER_FRAMES = 5
+# worlds larger than this are not rendered, the frame alone would take gigabytes
+MAX_RENDER_SIZE = 4096
+
+# world size, ants, timed ticks, engines run when none is given
+PRESETS = {
+    'tiny': (250, 100, 200, ['grid', 'array', 'colony', 'kernel', 'parallel']),
+    'small': (250, 400, 200, ['grid', 'array', 'colony', 'kernel', 'parallel']),
+    'medium': (1024, 10000, 50, ['colony', 'kernel', 'parallel']),
+    'large': (2048, 50000, 20, ['colony', 'kernel', 'parallel']),
+    'huge': (4096, 100000, 10, ['kernel', 'parallel']),
+    'field': (16384, 2000, 20, ['chunked']),
+}
+
+ENGINES = {
+    'grid': lambda size, seed, config: AntsAlgorithm(size, size, grid_class=Grid, seed=seed, config=config),
+    'array': lambda size, seed, config: AntsAlgorithm(size, size, grid_class=ArrayGrid, seed=seed, config=config),
+    'lazy': lambda size, seed, config: AntsAlgorithm(size, size, grid_class=ArrayGrid, lazy_evaporation=True,
+                                                     seed=seed, config=config),
+    'colony': lambda size, seed, config: ColonyAntsAlgorithm(size, size, seed=seed, config=config),
+    'kernel': lambda size, seed, config: KernelAntsAlgorithm(size, size, seed=seed, config=config),
+    'parallel': lambda size, seed, config: ParallelAntsAlgorithm(size, size, seed=seed, config=config),
+    'chunked': lambda size, seed, config: ColonyAntsAlgorithm(size, size, grid_class=ChunkedGrid, seed=seed,
+                                                              config=config),
+    'strips': lambda size, seed, config: StripAntsAlgorithm(size, size, seed=seed, config=config),
+}
+
+
+def populate(sim, num_of_ants, rng):
+    # scatter a grown colony over the world instead of waiting for the nest to spawn it ant by ant,
+    # the visit counters are spread so ants keep dying and stamping during the run
+    size_x, size_y = sim.world.size_x, sim.world.size_y
+    xs = rng.integers(0, size_x, size=num_of_ants)
+    ys = rng.integers(0, size_y, size=num_of_ants)
+    directions = rng.integers(0, len(DIRECTIONS), size=num_of_ants)
+    modes = rng.choice([MODE_TO_FOOD, MODE_TO_NEST], size=num_of_ants)
+    visits = rng.integers(1, sim.config.no_food_nest_visit_thresh, size=num_of_ants)
+    if hasattr(sim, 'colony'):
+        colony = sim.colony
+        colony.spawn(num_of_ants)
+        colony.x[:num_of_ants] = xs
+        colony.y[:num_of_ants] = ys
+        colony.direction[:num_of_ants] = directions
+        colony.mode[:num_of_ants] = modes
+        colony.no_food_nest_visit[:num_of_ants] = visits
+        return
+    if isinstance(sim, StripAntsAlgorithm):
+        sim.import_ants({'ant_x': xs, 'ant_y': ys, 'ant_direction': directions, 'ant_mode': modes,
+                         'ant_no_food_nest_visit': visits})
+        return
+    for x, y, direction, mode, visit in zip(xs.tolist(), ys.tolist(), directions.tolist(), modes.tolist(),
+                                            visits.tolist()):
+        ant = sim.new_ant(x, y, direction)
+        ant.mode = mode
+        ant.no_food_nest_visit = visit
+        sim.ants.append(ant)
+
+
+def time_tick(sim, phases):
+    if isinstance(sim, (KernelAntsAlgorithm, StripAntsAlgorithm)):
+        start = time.perf_counter()
+        sim.advance(1)
+        phases['advance'] += time.perf_counter() - start
+        return
+    start = time.perf_counter()
+    sim.update_ants()
+    after_ants = time.perf_counter()
+    sim.update_positions()
+    after_positions = time.perf_counter()
+    sim.update_grid()
+    end = time.perf_counter()
+    sim.tick += 1
+    phases['update_ants'] += after_ants - start
+    phases['update_positions'] += after_positions - after_ants
+    phases['update_grid'] += end - after_positions
+
+
+def time_best_cell(sim, rng):
+    grid = sim.grid
+    directions = rng.integers(0, len(DIRECTIONS), size=BEST_CELL_SAMPLES).tolist()
+    xs = rng.integers(0, grid.size_x, size=BEST_CELL_SAMPLES).tolist()
+    ys = rng.integers(0, grid.size_y, size=BEST_CELL_SAMPLES).tolist()
+    modes = rng.choice([MODE_TO_FOOD, MODE_TO_NEST], size=BEST_CELL_SAMPLES).tolist()
+    start = time.perf_counter()
+    for direction, x, y, mode in zip(directions, xs, ys, modes):
+        grid.get_best_cell(direction, x, y, mode)
+    return (time.perf_counter() - start) / BEST_CELL_SAMPLES * 1e6
+
+
+def time_dead_stamp(sim):
+    if hasattr(sim, 'colony'):
+        colony = sim.colony
+        num = min(DEAD_STAMP_SAMPLES, len(colony))
+        if num == 0:
+            return None
+        dying = np.zeros(len(colony), dtype=bool)
+        dying[:num] = True
+        start = time.perf_counter()
+        colony.stamp_dead(dying)
+        return (time.perf_counter() - start) / num * 1e6
+    ants = sim.ants[:DEAD_STAMP_SAMPLES]
+    if not ants:
+        return None
+    start = time.perf_counter()
+    sim.stamp_dead_pheromones(ants)
+    return (time.perf_counter() - start) / len(ants) * 1e6
+
+
+def time_render(sim):
+    start = time.perf_counter()
+    for _ in range(RENDER_FRAMES):
+        sim.render_scene()
+    return (time.perf_counter() - start) / RENDER_FRAMES * 1e6
+
+
+def run_scenario(preset, engine, ticks=None, seed=SEED, render=True):
+    size, num_of_ants, preset_ticks, _ = PRESETS[preset]
+    ticks = ticks or preset_ticks
+    warmup_ticks = max(ticks // 5, 2)
+    config = replace(get_default_config(), num_of_ants=num_of_ants)
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    sim = ENGINES[engine](size, seed, config)
+    populate(sim, num_of_ants, rng)
+    setup_seconds = time.perf_counter() - start
+    setup_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the warmup also compiles the kernels, which is kept out of the memory peak
+    sim.advance(warmup_ticks)
+    tracemalloc.start()
+    sim.advance(1)
+    peak_memory = max(peak_memory, setup_memory + tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    phases = {'advance': 0.0} if isinstance(sim, (KernelAntsAlgorithm, StripAntsAlgorithm)) else \
+        {'update_ants': 0.0, 'update_positions': 0.0, 'update_grid': 0.0}
+    start = time.perf_counter()
+    for _ in range(ticks):
+        time_tick(sim, phases)
+    elapsed = time.perf_counter() - start
+
+    phases_us = {name: seconds / ticks * 1e6 for name, seconds in phases.items()}
+    # the strip workers hold the grid, there is no get_best_cell to call from here
+    phases_us['get_best_cell'] = time_best_cell(sim, rng) if hasattr(sim.grid, 'get_best_cell') else None
+    phases_us['dead_stamp'] = time_dead_stamp(sim)
+    if render and size <= MAX_RENDER_SIZE:
+        phases_us['render_scene'] = time_render(sim)
+    if isinstance(sim, StripAntsAlgorithm):
+        sim.close()
+    return {
+        'preset': preset,
+        'engine': engine,
+        'size': size,
+        'ants': num_of_ants,
+        'ants_end': sim.count_ants(),
+        'ticks': ticks,
+        'seed': seed,
+        'setup_seconds': setup_seconds,
+        'ticks_per_second': ticks / elapsed,
+        'phases_us': phases_us,
+        'peak_memory_mb': peak_memory / 2 ** 20,
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    # returns the regressions as (scenario, metric, baseline value, new value)
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['ticks_per_second'] < base['ticks_per_second'] * (1 - tolerance):
+            regressions.append((key, 'ticks_per_second', base['ticks_per_second'], result['ticks_per_second']))
+        for phase, value in result['phases_us'].items():
+            base_value = base['phases_us'].get(phase)
+            if value is None or base_value is None:
+                continue
+            if value > base_value * (1 + tolerance):
+                regressions.append((key, phase, base_value, value))
+    return regressions
+
+
+def print_result(result):
+    phases = ' '.join(f'{name} {value:.1f}us' for name, value in result['phases_us'].items() if value is not None)
+    print(f"{result['preset']}/{result['engine']}: {result['ticks_per_second']:.1f} ticks/s, "
+          f"peak {result['peak_memory_mb']:.1f} MB, {phases}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ants simulation hot paths')
+    parser.add_argument('--preset', action='append', choices=sorted(PRESETS),
+                        help='scenario preset, can be repeated (default: small)')
+    parser.add_argument('--engine', action='append', choices=sorted(ENGINES),
+                        help='engine to run, can be repeated (default: the preset engines)')
+    parser.add_argument('--ticks', type=int, help='timed ticks per scenario instead of the preset value')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--no-render', action='store_true', help='skip timing render_scene')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for preset in args.preset or ['small']:
+        for engine in args.engine or PRESETS[preset][3]:
+            if engine == 'parallel' and not NUMBA_AVAILABLE:
+                continue
+            # the engines print about nests and removed ants, keep that out of the report
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                result = run_scenario(preset, engine, ticks=args.ticks, seed=args.seed, render=not args.no_render)
+            results[f'{preset}/{engine}'] = result
+            print_result(result)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numba': NUMBA_AVAILABLE,
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for key, metric, base_value, value in regressions:
+            print(f'REGRESSION {key} {metric}: {base_value:.1f} -> {value:.1f}')
+        if regressions:
+            return 1
+        print('no regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
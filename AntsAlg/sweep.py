@@ -0,0 +1,209 @@
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import itertools
+import contextlib
+import multiprocessing
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from antsalg2 import AntsAlgorithm, ArrayGrid, SIZE_X, get_default_config, parse_config_assignment, parse_config_value
+from antcolony import ColonyAntsAlgorithm
+from antkernel import KernelAntsAlgorithm
+
+# python AntsAlg/sweep.py --grid NUM_OF_ANTS=200,400,800 --grid HORIZON_SIZE=6,10 --ticks 3000 --out sweep.csv
+# python AntsAlg/sweep.py --random RANDOMIZE_POS_THRESHOLD=800:990 --random NO_FOOD_NEST_VISIT_THRESH=500:1500 \
+#     --samples 32 --workers 8 --out sweep.parquet
+
+SWEEP_TICKS = 3000
+CHECKPOINT_TICKS = 500
+# food and depletion are checked every this many ticks
+RESOLUTION_TICKS = 10
+# a run is stopped at a checkpoint when its food collected is below this share of the best run there
+PRUNE_FRACTION = 0.5
+# runs that must have reached a checkpoint before anything is stopped at it
+MIN_PEERS = 4
+SEED = 1
+
+ENGINES = {
+    'grid': AntsAlgorithm,
+    'array': lambda size_x, size_y, **kwargs: AntsAlgorithm(size_x, size_y, grid_class=ArrayGrid, **kwargs),
+    'colony': ColonyAntsAlgorithm,
+    'kernel': KernelAntsAlgorithm,
+}
+
+COLUMNS = ['run', 'engine', 'seed', 'ticks', 'food_taken', 'food_total', 'deaths', 'ants', 'ticks_to_depletion',
+           'stopped_at', 'seconds']
+
+
+def grid_configs(grid):
+    # every combination of {name: [values]}
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_configs(ranges, samples, seed=SEED):
+    # {name: (low, high)} drawn uniformly, as integers when both bounds are integers
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(samples):
+        config = {}
+        for name, (low, high) in ranges.items():
+            if isinstance(low, int) and isinstance(high, int):
+                config[name] = rng.randint(low, high)
+            else:
+                config[name] = rng.uniform(low, high)
+        configs.append(config)
+    return configs
+
+
+def should_stop(board, lock, checkpoint, score, min_peers=MIN_PEERS, prune_fraction=PRUNE_FRACTION):
+    # records the score of a run at a checkpoint and tells whether it is clearly behind the leader there
+    with lock:
+        scores = board.get(checkpoint, []) + [score]
+        board[checkpoint] = scores
+    return len(scores) >= min_peers and score < prune_fraction * max(scores)
+
+
+def run_config(run, params, engine, seed, size, ticks, checkpoint, board, lock, min_peers, prune_fraction):
+    config = replace(get_default_config(), **{name.lower(): value for name, value in params.items()})
+    row = simulate(engine, seed, size, ticks, checkpoint, board, lock, min_peers, prune_fraction, config)
+    row['run'] = run
+    row.update(params)
+    return row
+
+
+def simulate(engine, seed, size, ticks, checkpoint, board, lock, min_peers, prune_fraction, config=None):
+    start = time.perf_counter()
+    # the engines print about nests and removed ants
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sim = ENGINES[engine](size, size, seed=seed, headless=True, config=config)
+        food_total = sim.count_food()
+        ticks_to_depletion = None
+        stopped_at = None
+        while sim.tick < ticks:
+            sim.advance(min(RESOLUTION_TICKS, ticks - sim.tick))
+            food_taken = food_total - sim.count_food()
+            if food_taken == food_total:
+                ticks_to_depletion = sim.tick
+                break
+            if board is not None and sim.tick % checkpoint == 0 and sim.tick < ticks:
+                if should_stop(board, lock, sim.tick, food_taken, min_peers, prune_fraction):
+                    stopped_at = sim.tick
+                    break
+    return {
+        'engine': engine,
+        'seed': seed,
+        'ticks': sim.tick,
+        'food_taken': food_total - sim.count_food(),
+        'food_total': food_total,
+        'deaths': sim.deaths,
+        'ants': sim.count_ants(),
+        'ticks_to_depletion': ticks_to_depletion,
+        'stopped_at': stopped_at,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run_sweep(configs, engine='kernel', seeds=1, size=SIZE_X, ticks=SWEEP_TICKS, checkpoint=CHECKPOINT_TICKS,
+              workers=None, early_stopping=True, min_peers=MIN_PEERS, prune_fraction=PRUNE_FRACTION, seed=SEED):
+    # runs every config once per seed, one simulation per worker process, and returns the result rows
+    jobs = [(params, seed + repeat) for params in configs for repeat in range(seeds)]
+    rows = []
+    with multiprocessing.Manager() as manager:
+        board = manager.dict() if early_stopping else None
+        lock = manager.Lock()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_config, run, params, engine, run_seed, size, ticks, checkpoint, board, lock,
+                                   min_peers, prune_fraction)
+                       for run, (params, run_seed) in enumerate(jobs)]
+            for future in as_completed(futures):
+                row = future.result()
+                rows.append(row)
+                status = f"stopped at {row['stopped_at']}" if row['stopped_at'] else f"{row['ticks']} ticks"
+                print(f"[{len(rows)}/{len(jobs)}] run {row['run']} food {row['food_taken']}/{row['food_total']} "
+                      f"deaths {row['deaths']} {status} {row['seconds']:.1f}s")
+    return sorted(rows, key=lambda row: row['run'])
+
+
+def import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError('writing parquet needs pandas and pyarrow, use a .csv path instead')
+    return pandas
+
+
+def write_table(rows, path):
+    params = [name for name in rows[0] if name not in COLUMNS] if rows else []
+    if path.endswith('.parquet'):
+        import_pandas().DataFrame(rows, columns=COLUMNS + params).to_parquet(path, index=False)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS + params)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep antsalg2 parameters over headless runs')
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help='values of a parameter, all combinations are run')
+    parser.add_argument('--random', action='append', default=[], metavar='NAME=LOW:HIGH',
+                        help='range of a parameter for random search')
+    parser.add_argument('--samples', type=int, default=16, help='random search configurations')
+    parser.add_argument('--seeds', type=int, default=1, help='runs per configuration')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='kernel')
+    parser.add_argument('--size', type=int, default=SIZE_X)
+    parser.add_argument('--ticks', type=int, default=SWEEP_TICKS)
+    parser.add_argument('--checkpoint', type=int, default=CHECKPOINT_TICKS,
+                        help='ticks between early stopping checks')
+    parser.add_argument('--no-early-stopping', action='store_true')
+    parser.add_argument('--min-peers', type=int, default=MIN_PEERS)
+    parser.add_argument('--prune-fraction', type=float, default=PRUNE_FRACTION)
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--out', default='sweep.csv', help='.csv or .parquet table of the runs')
+    args = parser.parse_args(argv)
+    if args.checkpoint % RESOLUTION_TICKS:
+        parser.error(f'--checkpoint must be a multiple of {RESOLUTION_TICKS}')
+    if args.out.endswith('.parquet'):
+        # fail before the sweep rather than after it
+        import_pandas()
+
+    grid = {}
+    for text in args.grid:
+        try:
+            name, values = parse_config_assignment(text)
+            grid[name] = [parse_config_value(name, value) for value in values.split(',')]
+        except ValueError as error:
+            parser.error(f'--grid {text}: {error}')
+    ranges = {}
+    for text in args.random:
+        try:
+            name, values = parse_config_assignment(text)
+            bounds = values.split(':')
+            if len(bounds) != 2:
+                raise ValueError(f'expected LOW:HIGH, not {values}')
+            ranges[name] = tuple(parse_config_value(name, bound) for bound in bounds)
+        except ValueError as error:
+            parser.error(f'--random {text}: {error}')
+    configs = grid_configs(grid)
+    if ranges:
+        # random search over the ranges for every grid combination
+        configs = [dict(config, **sample) for config in configs
+                   for sample in random_configs(ranges, args.samples, args.seed)]
+
+    rows = run_sweep(configs, engine=args.engine, seeds=args.seeds, size=args.size, ticks=args.ticks,
+                     checkpoint=args.checkpoint, workers=args.workers, early_stopping=not args.no_early_stopping,
+                     min_peers=args.min_peers, prune_fraction=args.prune_fraction, seed=args.seed)
+    write_table(rows, args.out)
+    print(f'{len(rows)} runs written to {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules of AntsAlg import each other by their flat names, as when run with python AntsAlg
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'AntsAlg'))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+# the sweep and the strip engine fork worker processes, which hangs once numba's TBB threading layer has started
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
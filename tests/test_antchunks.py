@@ -0,0 +1,123 @@
+import functools
+
+import numpy as np
+import pytest
+
+import antsalg2
+import antchunks
+from antsalg2 import AntsAlgorithm, ArrayGrid, CELL_TYPE_EMPTY, CELL_TYPE_FOOD
+from antcolony import ColonyAntsAlgorithm
+from antchunks import ChunkStore, ChunkedGrid, NO_FOOD_PLANE, PLANES, SEGMENT_CHUNKS
+
+SIZE = 120
+SEED = 11
+TICKS = 300
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch, tmp_path):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+    monkeypatch.setattr(antchunks, 'CHUNK_DIR', str(tmp_path))
+
+
+def chunked(chunk_size):
+    return functools.partial(ChunkedGrid, chunk_size=chunk_size, directory=antchunks.CHUNK_DIR)
+
+
+def summary(sim):
+    cell_type, *layers = sim.grid.get_layers()
+    # food_id is only meaningful under food cells
+    layers[-1] = np.where(cell_type == CELL_TYPE_FOOD, layers[-1], 0)
+    return sim.tick, sim.deaths, sim.count_food(), [np.asarray(layer, dtype=np.int64).tolist()
+                                                    for layer in [cell_type] + layers]
+
+
+@pytest.mark.parametrize('engine', [AntsAlgorithm, ColonyAntsAlgorithm])
+@pytest.mark.parametrize('chunk_size', [16, 32, 128])
+def test_chunked_matches_array(engine, chunk_size):
+    array = engine(SIZE, SIZE, grid_class=ArrayGrid, seed=SEED, headless=True)
+    sim = engine(SIZE, SIZE, grid_class=chunked(chunk_size), seed=SEED, headless=True)
+    for _ in range(TICKS // 50):
+        array.advance(50)
+        sim.advance(50)
+        assert summary(sim) == summary(array)
+    assert sim.deaths > 0
+    sim.grid.close()
+
+
+def test_chunked_needs_eager_evaporation():
+    with pytest.raises(ValueError):
+        ChunkedGrid(SIZE, SIZE, lazy_evaporation=True)
+
+
+def test_store_allocates_touched_chunks(tmp_path):
+    store = ChunkStore(1000, 700, chunk_size=64, directory=str(tmp_path))
+    assert store.slots.shape == (11, 16)
+    store.write(NO_FOOD_PLANE, 999, 699, 5)
+    store.scatter(NO_FOOD_PLANE, np.array([0, 1, 130]), np.array([0, 0, 0]), 7)
+    assert len(store) == 3
+    assert sorted(store.keys) == [(0, 0), (2, 0), (15, 10)]
+    assert store.read(NO_FOOD_PLANE, 999, 699) == 5
+    # cells of missing chunks read as empty
+    assert store.read(NO_FOOD_PLANE, 500, 500) == 0
+    xs, ys = np.array([1, 130, 500, 999]), np.array([0, 0, 500, 699])
+    assert store.gather(NO_FOOD_PLANE, xs, ys).tolist() == [7, 7, 0, 5]
+    layer = store.materialize(NO_FOOD_PLANE, 1000, 700)
+    assert layer.sum() == 3 * 7 + 5
+    store.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_store_offsets_past_int32(tmp_path):
+    store = ChunkStore(2048, 1024, chunk_size=1024, directory=str(tmp_path))
+    # the last slot of a segment, without writing the 1023 chunks before it
+    store.slots[0, 1] = SEGMENT_CHUNKS - 1
+    # int32 coordinates as the colony arrays hold them
+    xs, ys = np.array([1024, 2047], dtype=np.int32), np.array([0, 1023], dtype=np.int32)
+    segments, offsets = store.locate(PLANES - 1, xs, ys)
+    assert segments.tolist() == [0, 0]
+    last = ((SEGMENT_CHUNKS - 1) * PLANES + PLANES - 1) * 1024 * 1024
+    assert offsets.tolist() == [last, last + 1023 * 1024 + 1023]
+    assert offsets[1] > np.iinfo(np.int32).max
+    store.close()
+
+
+def test_store_needs_power_of_two():
+    with pytest.raises(ValueError):
+        ChunkStore(SIZE, SIZE, chunk_size=48)
+
+
+def test_large_world_allocates_explored_chunks():
+    sim = ColonyAntsAlgorithm(4096, 4096, grid_class=chunked(64), seed=SEED, headless=True)
+    sim.advance(50)
+    # a few chunks around the nest and the food sources out of 4096
+    assert 0 < len(sim.grid.store) < 200
+    assert sim.grid.cell_type[0, 0] == CELL_TYPE_EMPTY
+    sim.grid.close()
+
+
+@pytest.mark.parametrize('source', ['array', 'chunked'])
+def test_checkpoint_into_chunked(tmp_path, source):
+    grid_class = ArrayGrid if source == 'array' else chunked(32)
+    path = tmp_path / 'run.npz'
+    sim = AntsAlgorithm(SIZE, SIZE, grid_class=grid_class, seed=SEED, headless=True)
+    sim.advance(TICKS // 2)
+    sim.save_checkpoint(path)
+    saved = summary(sim)
+    sim.advance(TICKS // 2)
+
+    restored = AntsAlgorithm(SIZE, SIZE, grid_class=chunked(32), seed=SEED + 1, headless=True)
+    restored.load_checkpoint(path)
+    assert summary(restored) == saved
+    restored.advance(TICKS // 2)
+    assert summary(restored) == summary(sim)
+
+
+def test_checkpoint_needs_same_chunk_size(tmp_path):
+    path = tmp_path / 'run.npz'
+    sim = AntsAlgorithm(SIZE, SIZE, grid_class=chunked(32), seed=SEED, headless=True)
+    sim.advance(20)
+    sim.save_checkpoint(path)
+    with pytest.raises(ValueError):
+        AntsAlgorithm(SIZE, SIZE, grid_class=chunked(64), seed=SEED, headless=True).load_checkpoint(path)
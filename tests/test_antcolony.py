@@ -0,0 +1,117 @@
+import numpy as np
+import pygame
+import pytest
+
+import antsalg2
+from antsalg2 import ArrayGrid, Nest, Food, CELL_TYPE_NEST, CELL_TYPE_FOOD, CELL_TYPE_PHEROMONES, DIRECTIONS, \
+    MODE_TO_FOOD, MODE_TO_NEST, CELL_SIZE, YELLOW, DARKER_GREEN, get_horizon_table
+from antcolony import ColonyAntsAlgorithm
+
+SIZE = 120
+TICKS = 300
+SEED = 11
+NUM_OF_ANTS = 80
+NO_FOOD_NEST_VISIT_THRESH = 60
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', NUM_OF_ANTS)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', NO_FOOD_NEST_VISIT_THRESH)
+
+
+def make(**kwargs):
+    return ColonyAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True, **kwargs)
+
+
+def summary(sim):
+    grid = sim.grid
+    grid.reclaim()
+    layers = (grid.cell_type, grid.visited_no_food_counter, grid.visited_with_food_counter, grid.visited_dead_counter)
+    return [layer.tolist() for layer in layers], [array[:len(sim.colony)].tolist() for array in sim.colony.arrays()]
+
+
+def run(sim, ticks=TICKS):
+    for _ in range(ticks):
+        sim.process_logic()
+    return sim
+
+
+def test_colony_runs():
+    sim = run(make())
+    assert sim.deaths > 0 and len(sim.colony) > 0
+    assert np.any(sim.grid.visited_with_food_counter)
+    assert summary(run(make())) == summary(sim)
+
+
+def test_lazy_evaporation_matches_eager():
+    assert summary(run(make(lazy_evaporation=True))) == summary(run(make()))
+
+
+def test_add_counters_sums_then_clamps():
+    grid = ArrayGrid(40, 40)
+    grid.set_nest(Nest(30, 30))
+    grid.set_food(Food(20, 0, 50))
+    layer = grid.visited_no_food_counter
+    layer[5, 3] = 990
+    xs = np.array([3, 3, 3, 4, 30, 20])
+    ys = np.array([5, 5, 5, 5, 30, 0])
+    grid.add_counters(layer, xs, ys, np.array([4.5, 4.5, 4.5, -2.0, 7.0, 7.0]))
+    # 990 + 4 + 4 + 4 is clamped once, not after every deposit
+    assert layer[5, 3] == 1000
+    assert layer[5, 4] == 0
+    assert grid.cell_type[5, 3] == grid.cell_type[5, 4] == CELL_TYPE_PHEROMONES
+    # nest and food cells take no pheromones
+    assert layer[30, 30] == layer[0, 20] == 0
+    assert grid.cell_type[30, 30] == CELL_TYPE_NEST and grid.cell_type[0, 20] == CELL_TYPE_FOOD
+
+
+def allowed_cells(grid, direction, x, y, mode):
+    # what ArrayGrid.get_best_cell may return: the closest aim cell, else a later cell tied with the first best one,
+    # else the first best one
+    layer, aim_type = grid.visited_no_food_counter, CELL_TYPE_NEST
+    if mode == MODE_TO_FOOD:
+        layer, aim_type = grid.visited_with_food_counter, CELL_TYPE_FOOD
+    aims, levels = [], []
+    for x_, y_, dist in get_horizon_table().offsets[direction]:
+        cx, cy = x + x_, y + y_
+        if not (0 <= cx < grid.size_x and 0 <= cy < grid.size_y):
+            continue
+        if grid.cell_type[cy, cx] == aim_type:
+            aims.append((dist, cx, cy))
+        if grid.read_counter(grid.visited_dead_counter, cx, cy) == 0:
+            levels.append((grid.read_counter(layer, cx, cy), cx, cy))
+    if aims:
+        return {min(aims, key=lambda aim: aim[0])[1:]}
+    if not levels:
+        return set()
+    best = max(level for level, _, _ in levels)
+    tied = [(cx, cy) for level, cx, cy in levels if level == best]
+    return set(tied[1:]) or set(tied)
+
+
+@pytest.mark.parametrize('lazy_evaporation', [False, True])
+def test_get_best_cells_matches_scan(lazy_evaporation):
+    sim = run(make(lazy_evaporation=lazy_evaporation), ticks=150)
+    rng = np.random.default_rng(SEED)
+    num = 3000
+    xs = rng.integers(0, SIZE, num).astype(np.int32)
+    ys = rng.integers(0, SIZE, num).astype(np.int32)
+    directions = rng.choice(DIRECTIONS, num).astype(np.int8)
+    modes = rng.choice([MODE_TO_FOOD, MODE_TO_NEST], num).astype(np.int8)
+    found, best_x, best_y = sim.grid.get_best_cells(directions, xs, ys, modes, rng)
+    for i in range(num):
+        allowed = allowed_cells(sim.grid, int(directions[i]), int(xs[i]), int(ys[i]), int(modes[i]))
+        assert found[i] == bool(allowed)
+        if allowed:
+            assert (int(best_x[i]), int(best_y[i])) in allowed
+
+
+def test_render_scene_draws_ants():
+    sim = run(ColonyAntsAlgorithm(SIZE, SIZE, seed=SEED), ticks=50)
+    sim.render_scene()
+    frame = pygame.surfarray.array3d(sim.screen)
+    for x, y, mode in zip(sim.colony.x[:len(sim.colony)], sim.colony.y[:len(sim.colony)],
+                          sim.colony.mode[:len(sim.colony)]):
+        color = DARKER_GREEN if mode == MODE_TO_NEST else YELLOW
+        assert tuple(frame[x * CELL_SIZE, y * CELL_SIZE]) == color
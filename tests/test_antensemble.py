@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+import antsalg2
+from antsalg2 import NUMBA_AVAILABLE
+from antkernel import KernelAntsAlgorithm
+from antensemble import EnsembleAntsAlgorithm
+
+SIZE = 120
+SEED = 11
+TICKS = 300
+
+needs_numba = pytest.mark.skipif(not NUMBA_AVAILABLE, reason='numba is not installed')
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+
+
+def summary(sim):
+    layers = [np.asarray(layer, dtype=np.int64).tolist() for layer in sim.grid.get_layers()]
+    ants = sim.export_ants()
+    ants = [ants[name].tolist() for name in ('ant_x', 'ant_y', 'ant_direction', 'ant_mode', 'ant_no_food_nest_visit',
+                                             'ant_serial')]
+    return sim.tick, sim.deaths, sim.count_food(), layers, ants
+
+
+@needs_numba
+def test_ensemble_worlds_match_kernel():
+    ensemble = EnsembleAntsAlgorithm(3, SIZE, SIZE, seed=SEED)
+    singles = [KernelAntsAlgorithm(SIZE, SIZE, seed=SEED + index, headless=True) for index in range(3)]
+    for _ in range(TICKS // 100):
+        ensemble.advance(100)
+        for world, single in zip(ensemble.worlds, singles):
+            single.advance(100)
+            assert summary(world) == summary(single)
+    assert ensemble.metrics()['seed'].tolist() == [SEED, SEED + 1, SEED + 2]
+    assert (ensemble.metrics()['deaths'] > 0).all()
+
+
+@needs_numba
+def test_ensemble_restacks_loaded_world(tmp_path):
+    path = tmp_path / 'run.npz'
+    ensemble = EnsembleAntsAlgorithm(2, SIZE, SIZE, seeds=[SEED, SEED + 1])
+    single = KernelAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True)
+    ensemble.advance(TICKS // 2)
+    single.advance(TICKS // 2)
+    # the second world takes over the first's run
+    ensemble.worlds[0].save_checkpoint(path)
+    ensemble.worlds[1].load_checkpoint(path)
+    ensemble.stack()
+    ensemble.advance(TICKS // 2)
+    single.advance(TICKS // 2)
+    for world in ensemble.worlds:
+        assert summary(world) == summary(single)
+
+
+@needs_numba
+def test_ensemble_grows_with_colony(monkeypatch):
+    ensemble = EnsembleAntsAlgorithm(2, SIZE, SIZE, seed=SEED)
+    single = KernelAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True)
+    ensemble.advance(50)
+    single.advance(50)
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 160)
+    ensemble.advance(100)
+    single.advance(100)
+    assert ensemble.ants['x'].shape[1] >= 160
+    assert summary(ensemble.worlds[0]) == summary(single)
+
+
+def test_ensemble_run_summary():
+    ensemble = EnsembleAntsAlgorithm(2, SIZE, SIZE, seed=SEED)
+    result = ensemble.run(100)
+    metrics = ensemble.metrics()
+    assert result['tick'].tolist() == [100, 100]
+    assert result['ants'].tolist() == metrics['ants'].tolist()
+    assert result['food_left'].tolist() == metrics['food_left'].tolist()
+    assert (result['food_taken'] == metrics['food_taken']).all()
+    assert (result['food_taken'] > 0).all()
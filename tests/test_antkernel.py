@@ -0,0 +1,143 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+import pytest
+
+import antsalg2
+import antkernel
+from antsalg2 import AntsAlgorithm, Grid, NUMBA_AVAILABLE
+from antkernel import KernelAntsAlgorithm, ParallelAntsAlgorithm
+
+SIZE = 120
+TICKS = 300
+SEED = 11
+NUM_OF_ANTS = 80
+NO_FOOD_NEST_VISIT_THRESH = 60
+
+needs_numba = pytest.mark.skipif(not NUMBA_AVAILABLE, reason='numba is not installed')
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', NUM_OF_ANTS)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', NO_FOOD_NEST_VISIT_THRESH)
+
+
+def make(engine=KernelAntsAlgorithm, **kwargs):
+    return engine(SIZE, SIZE, seed=SEED, headless=True, **kwargs)
+
+
+def summary(sim):
+    grid = sim.grid
+    grid.reclaim()
+    layers = (grid.cell_type, grid.visited_no_food_counter, grid.visited_with_food_counter, grid.visited_dead_counter)
+    colony = sim.colony
+    ants = [array[:len(colony)].tolist() for array in colony.arrays()] + [colony.serial[:len(colony)].tolist()]
+    return grid.tick, [layer.tolist() for layer in layers], ants, [food.amount for food in grid.foods]
+
+
+@needs_numba
+def test_kernel_runs():
+    sim = make()
+    food_total = sum(food.amount for food in sim.grid.foods)
+    sim.advance(TICKS)
+    assert sim.grid.tick == sim.tick == TICKS
+    assert sim.deaths > 0 and len(sim.colony) > 0
+    assert sum(food.amount for food in sim.grid.foods) < food_total
+    assert np.any(sim.grid.visited_dead_counter)
+    again = make()
+    again.advance(TICKS)
+    assert summary(again) == summary(sim)
+
+
+@needs_numba
+def test_kernel_matches_object_engine():
+    # the Ant objects draw the kernel's numbers by serial, so both run the same world
+    grid = AntsAlgorithm(SIZE, SIZE, grid_class=Grid, seed=SEED, headless=True)
+    sim = make()
+    for _ in range(TICKS // 50):
+        grid.advance(50)
+        sim.advance(50)
+        for name, values in grid.export_ants().items():
+            assert sim.export_ants()[name].tolist() == values.tolist(), name
+        assert [layer.tolist() for layer in sim.grid.get_layers()] == \
+            [np.asarray(layer, dtype=np.int64).tolist() for layer in grid.grid.get_layers()]
+        assert sim.deaths == grid.deaths
+    assert sim.deaths > 0
+
+
+
+    eager = make()
+    eager.advance(TICKS)
+    lazy = make(lazy_evaporation=True)
+    lazy.advance(TICKS)
+    assert summary(lazy) == summary(eager)
+
+
+@needs_numba
+def test_batched_ticks_match_single_ticks():
+    batched = make()
+    batched.advance(TICKS)
+    single = make()
+    for _ in range(TICKS):
+        single.process_logic()
+    assert summary(single) == summary(batched)
+
+
+def run_parallel(**kwargs):
+    sim = make(ParallelAntsAlgorithm, **kwargs)
+    sim.advance(TICKS)
+    return summary(sim)
+
+
+@needs_numba
+def test_parallel_runs():
+    sim = make(ParallelAntsAlgorithm)
+    for _ in range(TICKS):
+        sim.advance(1)
+    assert sim.deaths > 0 and len(sim.colony) > 0
+    assert np.any(sim.grid.visited_with_food_counter)
+    assert run_parallel() == summary(sim)
+
+
+@needs_numba
+@pytest.mark.parametrize('kwargs', [{'lazy_evaporation': True}, {'threads': 1}, {'chunk': 7}])
+def test_parallel_variants_match(kwargs):
+    # neither lazy evaporation nor the thread count or the chunk size changes the run
+    assert run_parallel(**kwargs) == run_parallel()
+
+
+@needs_numba
+def test_parallel_restores_thread_count(monkeypatch):
+    # one core here, so the numba thread count is recorded rather than changed
+    calls = []
+    monkeypatch.setattr(antkernel, 'get_num_threads', lambda: 4)
+    monkeypatch.setattr(antkernel, 'set_num_threads', calls.append)
+    sim = make(ParallelAntsAlgorithm, threads=1)
+    sim.advance(3)
+    assert calls == [1, 4]
+
+    def fail(*args):
+        raise RuntimeError('kernel failed')
+
+    monkeypatch.setattr(sim, 'run_kernel', fail)
+    with pytest.raises(RuntimeError):
+        sim.advance(3)
+    assert calls == [1, 4, 1, 4]
+    # without threads= the count is left alone
+    make(ParallelAntsAlgorithm).advance(3)
+    assert calls == [1, 4, 1, 4]
+
+
+def test_random_uniform_without_numba():
+    # a fresh interpreter that cannot import numba, with the warnings of the scalar fallback as errors
+    code = ('import sys; sys.modules["numba"] = None; '
+            f'sys.path.insert(0, {os.path.dirname(antsalg2.__file__)!r}); '
+            'import antkernel, antsalg2; assert not antkernel.NUMBA_AVAILABLE; '
+            'hashed = antsalg2.hash_serials(123456789, 5, [7, 8]); '
+            'expected = antsalg2.random_uniforms(hashed, antsalg2.STREAM_TIE).tolist(); '
+            'assert [antkernel.random_uniform(123456789, 5, serial, antsalg2.STREAM_TIE) for serial in (7, 8)] '
+            '== expected, expected')
+    subprocess.run([sys.executable, '-W', 'error::RuntimeWarning', '-c', code], check=True)
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import runpy
+import subprocess
+import threading
+
+import pytest
+
+import antsalg2
+from antsalg2 import AntsAlgorithm, Grid, ArrayGrid, CELL_TYPE_PHEROMONES
+from antcolony import ColonyAntsAlgorithm
+from antchunks import ChunkedGrid
+from antprofile import PhaseProfiler, StackSampler, collapse_stack, PROFILE_WINDOW
+
+SIZE = 120
+SEED = 11
+TICKS = 250
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+
+
+def test_profiler_rolls_windows():
+    profiler = PhaseProfiler(window=10, windows=2)
+    gauge = iter(range(100))
+    profiler.watch('gauge', lambda: next(gauge))
+    for tick in range(35):
+        profiler.add('phase', 0.5)
+        profiler.count('events', tick % 3)
+        profiler.end_tick()
+    # windows of ticks 10-19 and 20-29 are kept, 30-34 is being filled
+    rolling = profiler.report()
+    assert rolling['ticks'] == 25
+    assert rolling['phases']['phase'] == {'calls': 25, 'total_ms': 12500.0, 'ms_per_call': 500.0,
+                                          'ms_per_tick': 500.0}
+    assert rolling['counters']['events']['total'] == sum(tick % 3 for tick in range(10, 35))
+    assert rolling['gauges'] == {'gauge': 2}
+    total = profiler.report(rolling=False)
+    assert total['ticks'] == 35
+    assert total['counters']['events']['total'] == sum(tick % 3 for tick in range(35))
+    text = profiler.format_report(rolling=False)
+    assert text.splitlines()[0] == 'all 35 ticks'
+    assert 'events' in text and 'gauge' in text
+
+
+def test_empty_report():
+    profiler = PhaseProfiler()
+    assert profiler.report() == {'ticks': 0, 'phases': {}, 'counters': {}, 'gauges': {}}
+    assert profiler.format_report() == 'last 0 ticks'
+
+
+@pytest.mark.parametrize('engine', ['grid', 'array', 'colony', 'chunked'])
+def test_simulation_reports_phases(engine):
+    if engine == 'colony':
+        sim = ColonyAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True)
+    elif engine == 'chunked':
+        sim = ColonyAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True, grid_class=ChunkedGrid)
+    else:
+        sim = AntsAlgorithm(SIZE, SIZE, grid_class=Grid if engine == 'grid' else ArrayGrid, seed=SEED, headless=True)
+    sim.reset_profiler(window=50, windows=2)
+    sim.run(ticks=TICKS)
+    total = sim.profiler.report(rolling=False)
+    assert total['ticks'] == TICKS
+    assert {'update_ants', 'update_positions', 'grid_update'} <= set(total['phases'])
+    counters = total['counters']
+    assert counters['ants_spawned']['total'] >= antsalg2.NUM_OF_ANTS
+    assert counters['ants_removed']['total'] == sim.deaths > 0
+    assert counters['get_best_cell']['total'] > 0
+    assert counters['cells_scanned']['total'] > counters['get_best_cell']['total']
+    assert total['gauges']['ants'] == sim.count_ants()
+    assert sim.profiler.report()['ticks'] == 100
+    # the grids hand their counts over every tick
+    assert sim.grid.best_cell_calls == sim.grid.cells_scanned == 0
+    assert total['gauges']['active_cells'] == int((sim.grid.get_layers()[0] == CELL_TYPE_PHEROMONES).sum())
+
+
+def test_profiled_runs_match():
+    # the profiler only reads timers, a profiled run is the run without one
+    runs = []
+    for window in (1, 1000):
+        sim = AntsAlgorithm(SIZE, SIZE, grid_class=ArrayGrid, seed=SEED, headless=True)
+        sim.reset_profiler(window=window)
+        sim.run(ticks=TICKS)
+        runs.append((sim.deaths, sim.count_food(), sim.count_ants(),
+                     [layer.tolist() for layer in sim.grid.get_layers()]))
+    assert runs[0] == runs[1]
+
+
+def outer():
+    return inner()
+
+
+def inner():
+    return sys._getframe()
+
+
+def test_collapse_stack():
+    assert collapse_stack(outer()).endswith('test_antprofile:test_collapse_stack;test_antprofile:outer;'
+                                            'test_antprofile:inner')
+
+
+def test_sampler_counts_stacks(tmp_path):
+    sampler = StackSampler()
+    for _ in range(3):
+        sampler.sample({threading.get_ident(): outer()})
+    path = tmp_path / 'ants.folded'
+    sampler.write(path)
+    lines = path.read_text().splitlines()
+    assert sampler.samples == 3
+    assert [line for line in lines if line.startswith('MainThread;') and line.endswith('test_antprofile:inner 3')]
+
+
+def load_main():
+    return runpy.run_path(os.path.join(os.path.dirname(antsalg2.__file__), '__main__.py'), run_name='ants_main')
+
+
+def test_main_writes_profile(tmp_path, capsys):
+    main = load_main()
+    out = tmp_path / 'profile.json'
+    assert main['main'](['--headless', '--ticks', '60', '--seed', str(SEED), '--profile', '--profile-window', '20',
+                         '--profile-out', str(out)]) == 0
+    report = json.loads(out.read_text())
+    assert report['total']['ticks'] == 60
+    assert 'update_positions' in report['rolling']['phases']
+    assert 'all 60 ticks' in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main['main'](['--headless'])
+
+
+def test_main_sets_config(tmp_path):
+    main = load_main()
+    out = tmp_path / 'profile.json'
+    assert main['main'](['--headless', '--ticks', '60', '--seed', str(SEED), '--set', 'NUM_OF_ANTS=30',
+                         '--set', 'horizon_size=6', '--set', 'RENDER=false', '--set', 'draw_horizons=1',
+                         '--profile-window', '20', '--profile-out', str(out)]) == 0
+    assert 0 < json.loads(out.read_text())['total']['gauges']['ants'] <= 30
+    for bad in ('BOGUS=1', 'NUM_OF_ANTS', 'NUM_OF_ANTS=2.5', 'RENDER=maybe'):
+        with pytest.raises(SystemExit):
+            main['main'](['--headless', '--ticks', '1', '--set', bad])
+
+
+def test_main_imports_only_the_object_engine():
+    # a fresh interpreter, the test session has imported every module already
+    path = os.path.join(os.path.dirname(antsalg2.__file__), '__main__.py')
+    code = (f'import sys, runpy; sys.path.insert(0, {os.path.dirname(path)!r}); '
+            f'runpy.run_path({path!r}, run_name="ants_main"); print(" ".join(sorted(sys.modules)))')
+    modules = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    assert 'antsalg2' in modules
+    assert not {'antcolony', 'antkernel', 'sweep'} & set(modules)
+
+
+def test_antsalg2_loads_profiler_lazily():
+    code = (f'import sys; sys.path.insert(0, {os.path.dirname(antsalg2.__file__)!r}); import antsalg2; '
+            'assert "antprofile" not in sys.modules; '
+            'sim = antsalg2.AntsAlgorithm(40, 40, grid_class=antsalg2.ArrayGrid, seed=1, headless=True); '
+            f'assert "antprofile" in sys.modules and sim.profiler.window == {PROFILE_WINDOW}')
+    subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.DEVNULL)
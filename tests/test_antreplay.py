@@ -0,0 +1,98 @@
+import random
+
+import numpy as np
+import pytest
+
+import antsalg2
+from antsalg2 import NUMBA_AVAILABLE
+from antreplay import ENGINES, Recorder, Replay, pack, unpack
+
+SIZE = 120
+SEED = 11
+TICKS = 240
+KEYFRAME_INTERVAL = 50
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+
+
+def live_state(sim):
+    layers = [np.asarray(layer, dtype=np.int64).copy() for layer in sim.grid.get_layers()]
+    ants = [np.asarray(values, dtype=np.int64).copy() for values in sim.get_ant_arrays()]
+    return layers, ants
+
+
+def record(path, engine, every, close=True):
+    # records the run and keeps the live state of every recorded tick
+    sim = ENGINES[engine](SIZE, SEED)
+    recorder = Recorder(path, sim, KEYFRAME_INTERVAL)
+    live = {sim.tick: live_state(sim)}
+    recorder.record(sim)
+    while sim.tick < TICKS:
+        sim.advance(every)
+        live[sim.tick] = live_state(sim)
+        recorder.record(sim)
+    if close:
+        recorder.close()
+    else:
+        recorder.file.flush()
+    return live
+
+
+def assert_decodes(replay, live, ticks):
+    for tick in ticks:
+        state = replay.seek(tick)
+        recorded = max(t for t in live if t <= tick)
+        assert state.tick == recorded
+        layers, ants = live[recorded]
+        for decoded, layer in zip(state.get_layers(), layers):
+            assert np.array_equal(decoded, layer)
+        for decoded, values in zip(state.get_ant_arrays(), ants):
+            assert np.array_equal(decoded, values)
+
+
+@pytest.mark.parametrize('engine, every', [('grid', 1), ('array', 1), ('colony', 3), ('kernel', 1), ('kernel', 3)])
+def test_replay_decodes_live_state_at_any_seek(tmp_path, engine, every):
+    if engine == 'kernel' and not NUMBA_AVAILABLE:
+        pytest.skip('numba is not installed')
+    path = tmp_path / 'run.antrec'
+    live = record(path, engine, every)
+    replay = Replay(path)
+    # a keyframe is written at the first recorded tick a whole interval after the last one
+    step = -(-KEYFRAME_INTERVAL // every) * every
+    assert replay.keyframe_ticks == list(range(0, TICKS + 1, step))
+    assert replay.last_tick == TICKS
+    ticks = list(range(TICKS + 1))
+    shuffled = ticks[:]
+    random.Random(SEED).shuffle(shuffled)
+    assert_decodes(replay, live, ticks)
+    assert_decodes(replay, live, reversed(ticks))
+    assert_decodes(replay, live, shuffled)
+    replay.close()
+
+
+def test_unclosed_recording_is_readable(tmp_path):
+    path = tmp_path / 'run.antrec'
+    live = record(path, 'array', 1, close=False)
+    replay = Replay(path)
+    assert replay.keyframe_ticks == list(range(0, TICKS + 1, KEYFRAME_INTERVAL))
+    assert replay.last_tick == TICKS
+    assert_decodes(replay, live, [TICKS, 17, 163])
+    replay.close()
+
+
+def test_recorder_refuses_going_back(tmp_path):
+    sim = ENGINES['array'](SIZE, SEED)
+    with Recorder(tmp_path / 'run.antrec', sim) as recorder:
+        recorder.record(sim)
+        with pytest.raises(ValueError):
+            recorder.record(sim)
+
+
+def test_pack_round_trip():
+    arrays = [np.array([1, -2, 300], dtype=np.int16), np.arange(10, dtype=np.uint32), np.zeros(0, dtype=np.uint8)]
+    for unpacked, array in zip(unpack(pack(arrays, 6), [np.int16, np.uint32, np.uint8]), arrays):
+        assert unpacked.dtype == array.dtype and np.array_equal(unpacked, array)
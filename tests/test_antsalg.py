@@ -0,0 +1,172 @@
+import math
+import random
+from itertools import chain
+
+import numpy as np
+import pygame
+import pytest
+
+import antsalg
+from antsalg import AntsAlgorithm, Ant, Food, FoodIndex, Grid, NeighbourMasks
+from antsalg import FOOD_SEARCH_RADIUS, HEADING_BINS, RADIUS
+
+SEED = 11
+TICKS = 60
+
+
+def scan(food_sources, x, y, radius):
+    # the linear scan Ant.update_direction does without an index
+    nearest = None
+    for food in food_sources:
+        dist = math.sqrt((food.x - x) ** 2 + (food.y - y) ** 2)
+        if dist < radius and not food.is_empty() and (nearest is None or dist < nearest[0]):
+            nearest = (dist, food, math.atan2(food.y - y, food.x - x))
+    return nearest
+
+
+@pytest.mark.parametrize('count', [1, 30, 300])
+def test_food_index_matches_scan(count):
+    rng = random.Random(SEED)
+    # integer positions on a small world, so many queries have ties
+    foods = [Food(rng.randint(0, 60), rng.randint(0, 60), rng.randint(0, 3)) for _ in range(count)]
+    index = FoodIndex(foods)
+    for _ in range(2000):
+        x, y = rng.choice([rng.uniform(-5, 65), float(rng.randint(0, 60))]), rng.uniform(-5, 65)
+        assert index.nearest(x, y, FOOD_SEARCH_RADIUS) == scan(foods, x, y, FOOD_SEARCH_RADIUS)
+        food = rng.choice(foods)
+        food.decrease_amount()
+    assert any(food.is_empty() for food in foods)
+
+
+def test_food_index_drops_empty_food():
+    foods = [Food(5, 5, 2), Food(6, 5, 1)]
+    index = FoodIndex(foods)
+    assert [food.food_id for food in foods] == [0, 1]
+    assert index.nearest(6, 5, FOOD_SEARCH_RADIUS)[1] is foods[1]
+    foods[1].decrease_amount()
+    assert index.nearest(6, 5, FOOD_SEARCH_RADIUS)[1] is foods[0]
+    foods[0].decrease_amount()
+    foods[0].decrease_amount()
+    assert index.nearest(6, 5, FOOD_SEARCH_RADIUS) is None
+    assert not index.buckets
+
+
+def state(sim):
+    return ([(ant.x, ant.y, ant.direction, ant.has_food) for ant in sim.ants],
+            [food.amount for food in sim.food_sources])
+
+
+@pytest.mark.parametrize('count', [1, 300])
+def test_index_run_matches_scan(monkeypatch, count):
+    monkeypatch.setattr(antsalg, 'WORLD_SIZE', 80)
+    monkeypatch.setattr(antsalg, 'NUM_OF_ANTS', 40)
+    monkeypatch.setattr(antsalg, 'NUM_OF_FOOD_SOURCES', count)
+    monkeypatch.setattr(antsalg, 'MAX_FOOD_AMOUNT', 20)
+    runs = []
+    for indexed in (True, False):
+        random.seed(SEED)
+        sim = AntsAlgorithm()
+        if not indexed:
+            for ant in sim.ants:
+                ant.food_index = None
+        states = [state(sim)]
+        for _ in range(TICKS):
+            sim.process_logic()
+            states.append(state(sim))
+        runs.append(states)
+    assert runs[0] == runs[1]
+    if count > 1:
+        # ants took food, so the runs went through the index with candidates in reach
+        assert sum(runs[0][-1][1]) < sum(runs[0][0][1])
+
+
+def brute_force_best(grid, ant, layer):
+    # the atan2 scan over the window that update_positions did for every ant, and the pick of update_direction
+    best = None
+    curr_x, curr_y = ant.get_int_pos()
+    for dist_x in chain(range(-RADIUS, -1), range(1, RADIUS)):
+        for dist_y in chain(range(-RADIUS, -1), range(1, RADIUS)):
+            x, y = curr_x + dist_x, curr_y + dist_y
+            if not (0 <= x < grid.size_x and 0 <= y < grid.size_y):
+                continue
+            if math.fabs(math.atan2(y - ant.y, x - ant.x) - ant.direction) >= math.pi / 2:
+                continue
+            if layer[y, x] > 0 and (best is None or layer[y, x] > layer[best[1], best[0]]):
+                best = (x, y)
+    return best
+
+
+def test_neighbour_masks_match_scan():
+    rng = np.random.default_rng(SEED)
+    size = 60
+    grid = Grid(size, size)
+    # few distinct counters, so most picks break ties in scan order
+    grid.visited_with_food_counter[:] = rng.integers(-1, 4, size=(size, size))
+    masks = NeighbourMasks()
+    xs = rng.uniform(0, size, 20000)
+    ys = rng.uniform(0, size, 20000)
+    # headings beyond the 3pi/2 an ant can see anything at, and exactly on bin edges
+    directions = rng.uniform(-5, 5, 20000)
+    directions[::4] = masks.min_direction + rng.integers(-2, HEADING_BINS + 2, 5000) * masks.bin_size
+    picked = 0
+    for x, y, direction in zip(xs.tolist(), ys.tolist(), directions.tolist()):
+        ant = Ant(x, y, direction, size, size)
+        cell = masks.get_best_cell(grid, ant, grid.visited_with_food_counter)
+        best = None if cell is None else (cell.x, cell.y)
+        assert best == brute_force_best(grid, ant, grid.visited_with_food_counter)
+        picked += best is not None
+    assert picked > 10000
+
+
+@pytest.fixture
+def world(monkeypatch):
+    monkeypatch.setattr(antsalg, 'WORLD_SIZE', 80)
+    monkeypatch.setattr(antsalg, 'NUM_OF_ANTS', 40)
+    monkeypatch.setattr(antsalg, 'NUM_OF_FOOD_SOURCES', 30)
+    random.seed(SEED)
+    sim = AntsAlgorithm()
+    for _ in range(TICKS):
+        sim.process_logic()
+    return sim
+
+
+def test_decay_matches_cells(world):
+    expected = [layer.copy() for layer in (world.grid.visited_no_food_counter, world.grid.visited_with_food_counter)]
+    for layer in expected:
+        for row in range(world.grid.size_y):
+            for col in range(world.grid.size_x):
+                if layer[row, col] > 0:
+                    layer[row, col] -= 1
+    world.decrease_pheromones()
+    assert world.grid.visited_no_food_counter.tolist() == expected[0].tolist()
+    assert world.grid.visited_with_food_counter.tolist() == expected[1].tolist()
+
+
+def draw_per_cell(sim, screen):
+    # render_scene as it drew one rect per pheromone cell
+    screen.fill((10, 10, 10))
+    for col in range(sim.grid.size_x):
+        for row in range(sim.grid.size_y):
+            cell = sim.grid.get_cell(col, row)
+            if cell.visited_no_food_counter > 0:
+                pygame.draw.rect(screen, pygame.Color(0, 0, min(100 + 6*cell.visited_no_food_counter, 255)),
+                                 (cell.x, cell.y, 1, 1))
+                continue
+            if cell.visited_with_food_counter > 0:
+                pygame.draw.rect(screen, pygame.Color(0, min(100 + 6*cell.visited_no_food_counter, 255), 0),
+                                 (cell.x, cell.y, 1, 1))
+    pygame.draw.circle(screen, pygame.Color(255, 255, 100), pygame.math.Vector2(sim.nest.x, sim.nest.y), 4)
+    for food in sim.food_sources:
+        pygame.draw.circle(screen, pygame.Color(0, 250, 0), pygame.math.Vector2(food.x, food.y),
+                           math.sqrt(food.amount))
+    for ant in sim.ants:
+        color = pygame.Color(0, 200, 100) if ant.has_food else pygame.Color(180, 180, 180)
+        pygame.draw.circle(screen, color, pygame.math.Vector2(ant.x, ant.y), 2)
+
+
+def test_render_matches_cells(world):
+    assert (world.grid.visited_with_food_counter > 0).any() and (world.grid.visited_no_food_counter > 0).any()
+    expected = pygame.Surface(world.screen.get_size())
+    draw_per_cell(world, expected)
+    world.render_scene()
+    assert (pygame.surfarray.array3d(world.screen) == pygame.surfarray.array3d(expected)).all()
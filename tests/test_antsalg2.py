@@ -0,0 +1,413 @@
+import functools
+import itertools
+import random
+from dataclasses import replace
+
+import numpy as np
+import pygame
+import pytest
+
+import antsalg2
+from antsalg2 import AntsAlgorithm, Grid, ArrayGrid, FrameRenderer, FrameGovernor, RandomStreams, get_horizon_table
+from antsalg2 import ViewSettings, get_default_config, parse_config_assignment, parse_config_value
+from antsalg2 import CELL_TYPE_FOOD, CELL_TYPE_PHEROMONES, DIRECTIONS, DIR_VECTORS, MODE_TO_FOOD, MODE_TO_NEST
+from antsalg2 import CELL_SIZE, TILE_SIZE, BACKGROUND, HORIZON_COLOR
+
+# a small world with short lived ants, so a few hundred ticks see food taken, deaths and dead pheromone stamps
+SIZE = 120
+TICKS = 300
+SEED = 11
+NUM_OF_ANTS = 80
+NO_FOOD_NEST_VISIT_THRESH = 60
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', NUM_OF_ANTS)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', NO_FOOD_NEST_VISIT_THRESH)
+
+
+def grid_layers(grid):
+    # (cell type, no food, with food, dead, food amount) arrays indexed [y, x]
+    if isinstance(grid, ArrayGrid):
+        # brings lazily evaporated counters up to the current tick
+        grid.reclaim()
+        amounts = np.array([food.amount for food in grid.foods] + [0])
+        return (grid.cell_type, grid.visited_no_food_counter, grid.visited_with_food_counter,
+                grid.visited_dead_counter, np.where(grid.cell_type == CELL_TYPE_FOOD, amounts[grid.food_id], 0))
+    layers = [np.zeros((grid.size_y, grid.size_x), dtype=np.int64) for _ in range(5)]
+    for row in grid.cells:
+        for cell in row:
+            layers[0][cell.y, cell.x] = cell.type
+            layers[1][cell.y, cell.x] = cell.visited_no_food_counter
+            layers[2][cell.y, cell.x] = cell.visited_with_food_counter
+            layers[3][cell.y, cell.x] = cell.visited_dead_counter
+            if cell.type == CELL_TYPE_FOOD:
+                layers[4][cell.y, cell.x] = cell.food.amount
+    return layers
+
+
+def summary(sim):
+    layers = [np.asarray(layer, dtype=np.int64) for layer in grid_layers(sim.grid)]
+    ants = [(ant.x, ant.y, ant.direction, ant.mode, ant.no_food_nest_visit) for ant in sim.ants]
+    return [layer.tolist() for layer in layers], ants
+
+
+def make(grid_class, seed=SEED, **kwargs):
+    return AntsAlgorithm(SIZE, SIZE, grid_class=grid_class, seed=seed, headless=True, **kwargs)
+
+
+def run_together(*sims, ticks=TICKS, every=25):
+    # advances the simulations side by side and yields their summaries every few ticks
+    for _ in range(ticks // every):
+        for sim in sims:
+            sim.advance(every)
+        yield [summary(sim) for sim in sims]
+
+
+def test_array_grid_matches_grid():
+    sims = make(Grid), make(ArrayGrid)
+    for (layers, ants), array in run_together(*sims):
+        assert array == (layers, ants)
+    assert sims[1].deaths == sims[0].deaths > 0
+    # ants carried food home
+    assert ants and np.any(layers[2])
+
+
+def test_lazy_evaporation_matches_grid():
+    for (layers, ants), lazy in run_together(make(Grid), make(ArrayGrid, lazy_evaporation=True)):
+        assert lazy == (layers, ants)
+
+
+def test_lazy_evaporation_needs_array_grid():
+    with pytest.raises(ValueError):
+        make(Grid, lazy_evaporation=True)
+
+
+@pytest.mark.parametrize('horizon_size', [2, 5, 10, 30])
+def test_horizon_table_cones(horizon_size):
+    table = get_horizon_table(horizon_size)
+    assert table is get_horizon_table(horizon_size)
+    assert table.dx.shape == (len(DIRECTIONS), horizon_size ** 2 - 1)
+    for direction in DIRECTIONS:
+        dir_x, dir_y = DIR_VECTORS[direction]
+        offsets = table.offsets[direction]
+        assert len(set((x_, y_) for x_, y_, _ in offsets)) == len(offsets)
+        for x_, y_, dist in offsets:
+            assert 0 < dist == max(abs(x_), abs(y_)) < horizon_size
+            # every cell of the cone lies ahead of the ant
+            assert x_ * dir_x + y_ * dir_y > 0
+
+
+@pytest.mark.parametrize('horizon_size', [3, 10, 30])
+def test_horizon_lookups_match(horizon_size):
+    config = replace(get_default_config(), horizon_size=horizon_size)
+    sims = [make(Grid, config=config), make(ArrayGrid, config=config)]
+    for _ in run_together(*sims, ticks=150):
+        pass
+    rng = random.Random(SEED)
+    for _ in range(500):
+        # corners and borders included, where the cone is clipped
+        x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+        direction = rng.choice(DIRECTIONS)
+        mode = rng.choice([MODE_TO_FOOD, MODE_TO_NEST])
+        tie = rng.random()
+        found = []
+        for sim in sims:
+            cell = sim.grid.get_best_cell(direction, x, y, mode, lambda seq: seq[int(tie * len(seq))])
+            horizon = [(c.x, c.y) for c in sim.grid.get_horizon_cells(direction, x, y)]
+            found.append((None if cell is None else (cell.x, cell.y), horizon))
+        assert found[0] == found[1]
+
+
+def test_headless_run_summary():
+    sim = make(ArrayGrid)
+    assert sim.screen is None and sim.clock is None
+    food_total = sim.count_food()
+    stats = sim.run(ticks=TICKS)
+    assert stats['tick'] == stats['ticks'] == TICKS
+    assert stats['ants'] == sim.count_ants() > 0
+    assert stats['deaths'] == sim.deaths > 0
+    assert stats['food_taken'] == food_total - stats['food_left'] > 0
+    assert stats['seconds'] > 0 and stats['ticks_per_second'] > 0
+
+    stats = sim.run(until=lambda sim: sim.tick % 7 == 0)
+    assert stats['tick'] == 301 and stats['ticks'] == 1
+    assert sim.step(5)['tick'] == 306
+    with pytest.raises(ValueError):
+        sim.run()
+
+
+def test_seed_replays_run():
+    first, again, other = make(ArrayGrid), make(ArrayGrid), make(ArrayGrid, seed=SEED + 1)
+    first.advance(100)
+    again.advance(100)
+    other.advance(100)
+    assert summary(again) == summary(first)
+    assert summary(other) != summary(first)
+
+
+def test_seed_from_random_module():
+    random.seed(SEED)
+    first = make(ArrayGrid, seed=None)
+    random.seed(SEED)
+    again = make(ArrayGrid, seed=None)
+    assert again.random.seed == first.random.seed
+    first.advance(50)
+    again.advance(50)
+    assert summary(again) == summary(first)
+
+
+def test_config_is_fixed_per_simulation(monkeypatch):
+    # a config built from the globals, and the globals changed after the simulation was made
+    config = replace(get_default_config(), num_of_ants=40, no_food_nest_visit_thresh=90)
+    from_globals = [make(ArrayGrid), make(ArrayGrid, config=config)]
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 40)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 90)
+    alone = [make(ArrayGrid, config=replace(config, num_of_ants=NUM_OF_ANTS,
+                                            no_food_nest_visit_thresh=NO_FOOD_NEST_VISIT_THRESH)), make(ArrayGrid)]
+    assert from_globals[0].config == alone[0].config and from_globals[1].config == alone[1].config
+    # two configs interleaved in one process run as each does alone
+    for _ in range(4):
+        for sim in from_globals + alone:
+            sim.advance(50)
+        assert summary(from_globals[0]) == summary(alone[0])
+        assert summary(from_globals[1]) == summary(alone[1])
+    assert len(from_globals[1].ants) <= 40 < len(from_globals[0].ants)
+
+
+def test_parse_config_values():
+    assert parse_config_assignment('num_of_ants=800') == ('num_of_ants', '800')
+    assert parse_config_value('NUM_OF_ANTS', '800') == 800
+    assert parse_config_value('randomize_pos_threshold', '990') == 990
+    for text, value in (('true', True), ('Yes', True), ('on', True), ('1', True), ('false', False), ('OFF', False),
+                        ('0', False)):
+        assert parse_config_value('RENDER', text) is value
+    with pytest.raises(ValueError):
+        parse_config_assignment('BOGUS=1')
+    for name, text in (('RENDER', 'maybe'), ('NUM_OF_ANTS', '2.5'), ('NUM_OF_ANTS', '')):
+        with pytest.raises(ValueError):
+            parse_config_value(name, text)
+
+
+def test_random_streams_redraw_any_tick():
+    serials = list(range(1, 21))
+    streams = RandomStreams(SEED)
+    streams.begin_tick(7, serials, 21)
+    blocks = streams.randomize, streams.turns, streams.ties, streams.spawn, streams.heading
+    # one entry more, for the ant the nest may spawn
+    assert len(streams.randomize) == len(streams.turns) == len(streams.ties) == 21
+    assert set(streams.turns) <= {-1, 0, 1}
+    assert all(0 <= value <= antsalg2.RANDOMIZE_POS_RANGE for value in streams.randomize)
+
+    fresh = RandomStreams(SEED)
+    fresh.begin_tick(3, serials, 21)
+    fresh.begin_tick(7, serials, 21)
+    assert (fresh.randomize, fresh.turns, fresh.ties, fresh.spawn, fresh.heading) == blocks
+    assert fresh.choice(4, 'abc') == 'abc'[int(fresh.ties[4] * 3)]
+
+
+def test_random_streams_follow_serials():
+    streams = RandomStreams(SEED)
+    streams.begin_tick(7, list(range(1, 21)), 21)
+    draws = list(zip(streams.randomize, streams.turns, streams.ties))
+    # ant 5 died and ant 21 was spawned, every other ant keeps its numbers in its new slot
+    serials = [serial for serial in range(1, 22) if serial != 5]
+    streams.begin_tick(7, serials, 22)
+    assert list(zip(streams.randomize, streams.turns, streams.ties))[:-1] == draws[:4] + draws[5:]
+
+
+@functools.lru_cache()
+def grown(grid_class):
+    sim = make(grid_class)
+    sim.advance(200)
+    return sim
+
+
+def draw_per_rect(sim, view):
+    # the drawing FrameRenderer replaces, a rect per cell and ant
+    surface = pygame.Surface((SIZE * CELL_SIZE, SIZE * CELL_SIZE))
+    surface.fill(BACKGROUND)
+    sim.grid.draw(surface, view)
+    for ant in sim.ants:
+        ant.draw(surface)
+    return pygame.surfarray.array3d(surface)
+
+
+def draw_frame(sim, view):
+    surface = pygame.Surface((SIZE * CELL_SIZE, SIZE * CELL_SIZE))
+    renderer = FrameRenderer(SIZE, SIZE, sim.config, view)
+    renderer.draw_grid(sim.grid)
+    renderer.draw_ants([ant.x for ant in sim.ants], [ant.y for ant in sim.ants], [ant.mode for ant in sim.ants],
+                       [ant.direction for ant in sim.ants])
+    renderer.blit(surface)
+    return pygame.surfarray.array3d(surface)
+
+
+@pytest.mark.parametrize('grid_class', [Grid, ArrayGrid])
+@pytest.mark.parametrize('food, nest, dead', list(itertools.product([False, True], repeat=3)))
+def test_frame_matches_per_rect_drawing(grid_class, food, nest, dead):
+    sim = grown(grid_class)
+    view = ViewSettings(replace(sim.config, draw_food_pheromones=food, draw_nest_pheromones=nest,
+                                draw_dead_pheromones=dead))
+    assert np.array_equal(draw_frame(sim, view), draw_per_rect(sim, view))
+
+
+def test_frame_draws_horizons():
+    sim = grown(ArrayGrid)
+    plain = draw_frame(sim, ViewSettings(replace(sim.config, draw_horizons=False)))
+    frame = draw_frame(sim, ViewSettings(replace(sim.config, draw_horizons=True)))
+    ant = sim.ants[0]
+    cells = {(ant.x + x_, ant.y + y_) for x_, y_, _ in get_horizon_table().offsets[ant.direction]}
+    cells -= {(other.x, other.y) for other in sim.ants}
+    for x, y in cells:
+        if 0 <= x < SIZE and 0 <= y < SIZE:
+            assert tuple(frame[x * CELL_SIZE, y * CELL_SIZE]) == HORIZON_COLOR
+    # ants are drawn over the horizons
+    for other in sim.ants:
+        assert np.array_equal(frame[other.x * CELL_SIZE, other.y * CELL_SIZE],
+                              plain[other.x * CELL_SIZE, other.y * CELL_SIZE])
+
+
+def test_grid_layers_match():
+    grid, array = grown(Grid).grid.get_layers(), grown(ArrayGrid).grid.get_layers()
+    for grid_layer, array_layer in zip(grid, array):
+        assert np.array_equal(grid_layer, array_layer)
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(antsalg2, 'time', fake)
+    return fake
+
+
+def test_governor_plans_ticks_within_frame_budget(clock):
+    governor = FrameGovernor(target_fps=50)
+    # before anything was measured a frame runs one tick at most
+    assert governor.plan(None) == 1
+    governor.tick_seconds = 0.001
+    governor.render_seconds = 0.01
+    # 20 ms frames, 10 ms go to rendering
+    assert governor.plan(None) == 10
+    clock.now += 0.0625
+    assert governor.plan(80) == 5
+    # a slow frame leaves ticks owed, they are caught up over the next frames
+    clock.now += 0.25
+    assert governor.plan(80) == 10
+    assert governor.plan(80) == 10
+    assert governor.plan(80) == 0
+    # at most MAX_CATCH_UP_SECONDS worth is caught up
+    clock.now += 10
+    assert sum(governor.plan(80) for _ in range(10)) == int(80 * antsalg2.MAX_CATCH_UP_SECONDS) + 1
+    # rendering alone fills the frame
+    governor.render_seconds = 0.05
+    assert governor.plan(None) == 1
+
+
+def test_governor_measures_rates(clock):
+    governor = FrameGovernor()
+    for frame in range(8):
+        clock.now += 0.125
+        refreshed = governor.record(8, 0.008, 0.004, rendered=frame % 2 == 0)
+        # the rates are refreshed once a second
+        assert refreshed == (frame == 7)
+    assert governor.tick_seconds == pytest.approx(0.001 * (1 - (1 - antsalg2.GOVERNOR_SMOOTHING) ** 8))
+    assert governor.render_seconds == pytest.approx(0.004 * (1 - (1 - antsalg2.GOVERNOR_SMOOTHING) ** 4))
+    assert governor.ticks_per_second == pytest.approx(64)
+    assert governor.frames_per_second == pytest.approx(4)
+    assert governor.skip_ratio == pytest.approx(1 - 4 / 64)
+
+
+def test_process_frame_runs_planned_ticks():
+    config = replace(get_default_config(), max_speed=True)
+    sim = AntsAlgorithm(SIZE, SIZE, grid_class=ArrayGrid, seed=SEED, config=config)
+    for _ in range(5):
+        sim.process_frame()
+    # at max speed every frame runs at least one tick, more once a tick is measured to fit the budget
+    assert sim.tick >= 5
+    assert sim.governor.tick_seconds > 0 and sim.governor.render_seconds > 0
+
+
+def test_window_fits_world():
+    config = replace(get_default_config(), cell_size=3)
+    sim = AntsAlgorithm(100, 70, grid_class=ArrayGrid, seed=SEED, config=config)
+    assert sim.screen.get_size() == (300, 210)
+
+
+@pytest.mark.parametrize('grid_class, lazy_evaporation', [(Grid, False), (ArrayGrid, False), (ArrayGrid, True)])
+def test_batched_dead_stamp_matches_sequential(grid_class, lazy_evaporation):
+    rng = np.random.default_rng(SEED)
+    # clumped ants so windows overlap, some of them clipped at the borders, on top of the nest and a food source
+    xs = np.concatenate([rng.integers(0, 30, 40), [0, SIZE - 1, 5, 60]])
+    ys = np.concatenate([rng.integers(0, 30, 40), [0, SIZE - 1, SIZE - 3, 60]])
+    amounts = rng.uniform(0, 20, len(xs))
+    grids = []
+    for _ in range(2):
+        grid = grid_class(SIZE, SIZE, lazy_evaporation=lazy_evaporation)
+        grid.set_nest(antsalg2.Nest(60, 60))
+        grid.set_food(antsalg2.Food(10, 10, 100))
+        grid.update()
+        grids.append(grid)
+    batched, sequential = grids
+    batched.stamp_dead(xs, ys, amounts)
+    horizon_size = antsalg2.HORIZON_SIZE
+    for x, y, amount in zip(xs.tolist(), ys.tolist(), amounts.tolist()):
+        for dx in range(-horizon_size, horizon_size + 1):
+            for dy in range(-horizon_size, horizon_size + 1):
+                if 0 <= x + dx < SIZE and 0 <= y + dy < SIZE:
+                    sequential.inc_dead_counter(x + dx, y + dy, amount)
+    for batched_layer, sequential_layer in zip(batched.get_layers(), sequential.get_layers()):
+        assert np.array_equal(batched_layer, sequential_layer)
+    assert np.any(batched.get_layers()[3])
+
+
+def tiles_with(mask):
+    # the TILE_SIZE tiles holding a cell of the mask
+    tiles = np.zeros(((mask.shape[0] + TILE_SIZE - 1) // TILE_SIZE, (mask.shape[1] + TILE_SIZE - 1) // TILE_SIZE),
+                     dtype=bool)
+    ys, xs = np.nonzero(mask)
+    tiles[ys // TILE_SIZE, xs // TILE_SIZE] = True
+    return tiles
+
+
+@pytest.mark.parametrize('size_x, size_y', [(SIZE, SIZE), (100, 70)])
+def test_tiles_track_pheromone_cells(size_x, size_y):
+    sims = [AntsAlgorithm(size_x, size_y, grid_class=Grid, seed=SEED, headless=True),
+            AntsAlgorithm(size_x, size_y, grid_class=ArrayGrid, seed=SEED, headless=True),
+            AntsAlgorithm(size_x, size_y, grid_class=ArrayGrid, lazy_evaporation=True, seed=SEED, headless=True)]
+    for _ in range(8):
+        for sim in sims:
+            sim.advance(25)
+        grid, array, lazy = (sim.grid for sim in sims)
+        layers = grid.get_layers()
+        for other in (array, lazy):
+            for layer, other_layer in zip(layers, other.get_layers()):
+                assert np.array_equal(layer, other_layer)
+            # get_layers reclaimed the lazy grid, every tile with pheromones is active
+            pheromones = other.cell_type == CELL_TYPE_PHEROMONES
+            assert np.all(other.active_tiles[tiles_with(pheromones)])
+        assert {(cell.x, cell.y) for cell in grid.iter_non_empty_cells()} == \
+            set(zip(*np.nonzero(layers[0].T)))
+        for tile_y, row in enumerate(grid.tile_cells):
+            for tile_x, tile in enumerate(row):
+                assert all((cell.y // TILE_SIZE, cell.x // TILE_SIZE) == (tile_y, tile_x) for cell in tile)
+
+    # without ants every trail evaporates and no tile stays active
+    for sim in sims:
+        sim.config = replace(sim.config, num_of_ants=0)
+        sim.ants = []
+        sim.advance(1001)
+    grid, array, lazy = (sim.grid for sim in sims)
+    for other in (array, lazy):
+        other.get_layers()
+        assert not other.active_tiles.any()
+    assert all(cell.type != CELL_TYPE_PHEROMONES for cell in grid.iter_non_empty_cells())
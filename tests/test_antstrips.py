@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import antsalg2
+from antsalg2 import NUMBA_AVAILABLE
+from antkernel import ParallelAntsAlgorithm
+from antstrips import StripAntsAlgorithm
+
+SIZE = 120
+SEED = 11
+TICKS = 300
+
+pytestmark = pytest.mark.skipif(not NUMBA_AVAILABLE, reason='numba is not installed')
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+
+
+def summary(sim):
+    layers = [np.asarray(layer, dtype=np.int64).tolist() for layer in sim.grid.get_layers()]
+    ants = sim.export_ants()
+    order = np.argsort(ants['ant_serial'], kind='stable')
+    ants = [ants[name][order].tolist() for name in ('ant_x', 'ant_y', 'ant_direction', 'ant_mode',
+                                                      'ant_no_food_nest_visit')]
+    return sim.tick, sim.deaths, sim.count_food(), layers, ants
+
+
+@pytest.fixture(scope='module')
+def reference():
+    # the summaries of ParallelAntsAlgorithm every 50 ticks, in batches and then single ticks
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+        patch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+        sim = ParallelAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True)
+        summaries = []
+        for _ in range(TICKS // 50):
+            sim.advance(50)
+            summaries.append(summary(sim))
+        return summaries
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3])
+def test_strips_match_parallel(reference, workers):
+    sim = StripAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True, workers=workers)
+    try:
+        for expected in reference:
+            sim.advance(50)
+            assert summary(sim) == expected
+        assert sim.deaths > 0
+    finally:
+        sim.close()
+
+
+def test_strips_single_ticks_match_batches(reference):
+    sim = StripAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True, workers=2)
+    try:
+        for _ in range(50):
+            sim.advance(1)
+        assert summary(sim) == reference[0]
+    finally:
+        sim.close()
+
+
+def test_strip_checkpoint_changes_workers(tmp_path, reference):
+    path = tmp_path / 'run.npz'
+    sim = StripAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True, workers=2)
+    try:
+        sim.advance(100)
+        sim.save_checkpoint(path)
+    finally:
+        sim.close()
+    restored = StripAntsAlgorithm(SIZE, SIZE, seed=SEED + 1, headless=True, workers=3)
+    try:
+        restored.load_checkpoint(path)
+        assert summary(restored) == reference[1]
+        restored.advance(TICKS - 100)
+        assert summary(restored) == reference[-1]
+    finally:
+        restored.close()
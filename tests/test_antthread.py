@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+import pytest
+
+import antsalg2
+from antcolony import ColonyAntsAlgorithm
+from antthread import Snapshot, SnapshotBuffer, SimulationThread
+
+SIZE = 120
+SEED = 11
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+
+
+def make():
+    return ColonyAntsAlgorithm(SIZE, SIZE, seed=SEED, headless=True)
+
+
+def test_buffer_never_writes_the_snapshot_being_read():
+    buffer = SnapshotBuffer()
+    assert buffer.acquire() is None
+    assert buffer.begin_write() == 0
+    buffer.end_write(0)
+    # nothing is captured until the renderer has taken the published snapshot
+    assert buffer.begin_write() is None
+    assert buffer.acquire() is buffer.snapshots[0]
+    assert buffer.begin_write() == 1
+    buffer.end_write(1)
+    buffer.release()
+    assert buffer.acquire() is buffer.snapshots[1]
+    # the renderer still reads snapshot 1, the back one is 0 again
+    assert buffer.begin_write() == 0
+    buffer.end_write(0)
+    assert buffer.acquire() is buffer.snapshots[0]
+    assert buffer.begin_write() == 1
+
+
+def test_snapshot_copies_and_reuses_arrays():
+    sim = make()
+    sim.advance(20)
+    snapshot = Snapshot()
+    snapshot.capture(sim)
+    layers = snapshot.layers
+    assert snapshot.tick == 20
+    for copy, layer in zip(layers, sim.grid.get_layers()):
+        assert np.array_equal(copy, layer) and copy is not layer
+    sim.advance(20)
+    snapshot.capture(sim)
+    assert snapshot.tick == 40
+    assert all(new is old for new, old in zip(snapshot.layers, layers))
+    for copy, layer in zip(snapshot.layers, sim.grid.get_layers()):
+        assert np.array_equal(copy, layer)
+    for copy, values in zip(snapshot.ants, sim.get_ant_arrays()):
+        assert np.array_equal(copy, values)
+
+
+def test_thread_publishes_consistent_ticks():
+    buffer = SnapshotBuffer()
+    thread = SimulationThread(make(), buffer, batch_ticks=3)
+    thread.start()
+    snapshots = []
+    try:
+        deadline = time.time() + 30
+        while len(snapshots) < 3 and time.time() < deadline:
+            snapshot = buffer.acquire()
+            if snapshot is None or (snapshots and snapshot.tick == snapshots[-1][0]):
+                buffer.release()
+                time.sleep(0.01)
+                continue
+            snapshots.append((snapshot.tick, [np.array(layer) for layer in snapshot.layers],
+                              [np.array(values) for values in snapshot.ants]))
+            buffer.release()
+    finally:
+        thread.stop()
+    assert len(snapshots) == 3
+
+    # every published snapshot is the state of a whole tick, as a lockstep run of the same seed reaches it
+    lockstep = make()
+    for tick, layers, ants in snapshots:
+        assert tick % 3 == 0
+        lockstep.advance(tick - lockstep.tick)
+        for copy, layer in zip(layers, lockstep.grid.get_layers()):
+            assert np.array_equal(copy, layer)
+        for copy, values in zip(ants, lockstep.get_ant_arrays()):
+            assert np.array_equal(copy, values)
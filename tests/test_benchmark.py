@@ -0,0 +1,52 @@
+import json
+
+import antsalg2
+import benchmark
+from benchmark import compare
+
+
+def result(ticks_per_second, **phases_us):
+    return {'ticks_per_second': ticks_per_second, 'phases_us': phases_us}
+
+
+def test_compare_reports_slowdowns_beyond_tolerance():
+    baseline = {
+        'small/array': result(100.0, update_positions=50.0, dead_stamp=10.0),
+        'small/colony': result(200.0, update_positions=20.0, dead_stamp=None),
+    }
+    results = {
+        'small/array': result(80.0, update_positions=54.0, dead_stamp=12.0),
+        'small/colony': result(190.0, update_positions=30.0, dead_stamp=5.0),
+        'small/kernel': result(1.0, advance=1000.0),
+    }
+    assert compare(results, baseline, tolerance=0.15) == [
+        ('small/array', 'ticks_per_second', 100.0, 80.0),
+        ('small/array', 'dead_stamp', 10.0, 12.0),
+        ('small/colony', 'update_positions', 20.0, 30.0),
+    ]
+    assert compare(results, baseline, tolerance=0.5) == []
+    assert compare(results, {}) == []
+
+
+def test_main_writes_report_and_compares_with_it(monkeypatch, tmp_path, capsys):
+    # run_scenario sets the number of ants of the preset
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', antsalg2.NUM_OF_ANTS)
+    out = tmp_path / 'run.json'
+    args = ['--preset', 'tiny', '--engine', 'array', '--engine', 'colony', '--ticks', '3', '--no-render']
+    assert benchmark.main(args + ['--out', str(out)]) == 0
+    results = json.loads(out.read_text())['results']
+    assert sorted(results) == ['tiny/array', 'tiny/colony']
+    for key, scenario in results.items():
+        assert scenario['ticks'] == 3 and scenario['ants'] == 100
+        assert scenario['ticks_per_second'] > 0
+        assert scenario['phases_us']['get_best_cell'] > 0
+        assert 'render_scene' not in scenario['phases_us']
+
+    assert benchmark.main(args + ['--baseline', str(out), '--tolerance', '1000']) == 0
+    assert 'no regressions' in capsys.readouterr().out
+    # a baseline ten thousand times faster
+    for scenario in results.values():
+        scenario['ticks_per_second'] *= 1e4
+    out.write_text(json.dumps({'results': results}))
+    assert benchmark.main(args + ['--baseline', str(out)]) == 1
+    assert 'REGRESSION tiny/array ticks_per_second' in capsys.readouterr().out
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import antsalg2
+from antsalg2 import AntsAlgorithm, Grid, ArrayGrid, NUMBA_AVAILABLE
+from antcolony import ColonyAntsAlgorithm
+from antkernel import KernelAntsAlgorithm, ParallelAntsAlgorithm
+
+SIZE = 120
+SEED = 11
+TICKS = 150
+
+ENGINES = {
+    'grid': lambda seed: AntsAlgorithm(SIZE, SIZE, grid_class=Grid, seed=seed, headless=True),
+    'array': lambda seed: AntsAlgorithm(SIZE, SIZE, grid_class=ArrayGrid, seed=seed, headless=True),
+    'lazy': lambda seed: AntsAlgorithm(SIZE, SIZE, grid_class=ArrayGrid, lazy_evaporation=True, seed=seed,
+                                       headless=True),
+    'colony': lambda seed: ColonyAntsAlgorithm(SIZE, SIZE, seed=seed, headless=True),
+    'colony_lazy': lambda seed: ColonyAntsAlgorithm(SIZE, SIZE, lazy_evaporation=True, seed=seed, headless=True),
+    'kernel': lambda seed: KernelAntsAlgorithm(SIZE, SIZE, seed=seed, headless=True),
+    'parallel': lambda seed: ParallelAntsAlgorithm(SIZE, SIZE, seed=seed, headless=True),
+}
+# the ant arrays every engine exports, the colony engines add their serials and generator state
+ANT_FIELDS = ('ant_x', 'ant_y', 'ant_direction', 'ant_mode', 'ant_no_food_nest_visit')
+
+
+@pytest.fixture(autouse=True)
+def small_colony(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 80)
+    monkeypatch.setattr(antsalg2, 'NO_FOOD_NEST_VISIT_THRESH', 60)
+
+
+def summary(sim):
+    layers = [np.asarray(layer, dtype=np.int64).tolist() for layer in sim.grid.get_layers()]
+    ants = sim.export_ants()
+    ants = [ants[name].tolist() for name in ANT_FIELDS]
+    return sim.tick, sim.deaths, sim.count_food(), layers, ants
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_checkpoint_continues_the_run(tmp_path, engine):
+    if engine in ('kernel', 'parallel') and not NUMBA_AVAILABLE:
+        pytest.skip('numba is not installed')
+    path = tmp_path / 'run.npz'
+    sim = ENGINES[engine](SEED)
+    sim.advance(TICKS)
+    sim.save_checkpoint(path)
+    saved = summary(sim)
+    sim.advance(TICKS)
+
+    # a world of another seed takes over the seed with the checkpoint
+    restored = ENGINES[engine](SEED + 1)
+    restored.load_checkpoint(path)
+    assert summary(restored) == saved
+    restored.advance(TICKS)
+    assert summary(restored) == summary(sim)
+    assert sim.deaths > 0
+
+
+@pytest.mark.parametrize('engine', ['array', 'lazy', 'colony', 'kernel'])
+def test_grid_checkpoint_loads_into_other_engines(tmp_path, engine):
+    path = tmp_path / 'grid.npz'
+    grid = ENGINES['grid'](SEED)
+    grid.advance(TICKS)
+    grid.save_checkpoint(path)
+    sim = ENGINES[engine](SEED + 1)
+    sim.load_checkpoint(path)
+    assert summary(sim) == summary(grid)
+    # the object engines and the kernel run the same model
+    if engine in ('array', 'lazy', 'kernel'):
+        grid.advance(TICKS)
+        sim.advance(TICKS)
+        assert summary(sim) == summary(grid)
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason='numba is not installed')
+def test_kernel_checkpoint_continues_in_grid(tmp_path):
+    path = tmp_path / 'kernel.npz'
+    kernel = ENGINES['kernel'](SEED)
+    kernel.advance(TICKS)
+    kernel.save_checkpoint(path)
+    grid = ENGINES['grid'](SEED + 1)
+    grid.load_checkpoint(path)
+    kernel.advance(TICKS)
+    grid.advance(TICKS)
+    assert summary(grid) == summary(kernel)
+
+
+def test_checkpoint_needs_same_world_size(tmp_path):
+    path = tmp_path / 'run.npz'
+    ENGINES['array'](SEED).save_checkpoint(path)
+    with pytest.raises(ValueError):
+        AntsAlgorithm(SIZE + 1, SIZE, grid_class=ArrayGrid, seed=SEED, headless=True).load_checkpoint(path)
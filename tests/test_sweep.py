@@ -0,0 +1,79 @@
+import csv
+import threading
+
+import pytest
+
+import antsalg2
+import sweep
+from sweep import grid_configs, random_configs, should_stop, run_config
+
+
+def test_grid_configs():
+    assert grid_configs({}) == [{}]
+    assert grid_configs({'NUM_OF_ANTS': [10, 20], 'HORIZON_SIZE': [6, 10, 14]}) == [
+        {'NUM_OF_ANTS': ants, 'HORIZON_SIZE': horizon} for ants in (10, 20) for horizon in (6, 10, 14)]
+
+
+def test_random_configs():
+    configs = random_configs({'NUM_OF_ANTS': (10, 20), 'RANDOMIZE_POS_THRESHOLD': (800.0, 990)}, 50, seed=3)
+    assert configs == random_configs({'NUM_OF_ANTS': (10, 20), 'RANDOMIZE_POS_THRESHOLD': (800.0, 990)}, 50, seed=3)
+    assert len(configs) == 50
+    for config in configs:
+        assert isinstance(config['NUM_OF_ANTS'], int) and 10 <= config['NUM_OF_ANTS'] <= 20
+        assert isinstance(config['RANDOMIZE_POS_THRESHOLD'], float)
+        assert 800 <= config['RANDOMIZE_POS_THRESHOLD'] <= 990
+
+
+def test_should_stop_needs_peers_and_a_clear_gap():
+    board, lock = {}, threading.Lock()
+    # alone at the checkpoint nothing is stopped, however bad
+    assert not should_stop(board, lock, 500, 0, min_peers=3, prune_fraction=0.5)
+    assert not should_stop(board, lock, 500, 100, min_peers=3, prune_fraction=0.5)
+    assert should_stop(board, lock, 500, 49, min_peers=3, prune_fraction=0.5)
+    assert not should_stop(board, lock, 500, 50, min_peers=3, prune_fraction=0.5)
+    assert board[500] == [0, 100, 49, 50]
+    # checkpoints keep their own scores
+    assert not should_stop(board, lock, 1000, 1, min_peers=3, prune_fraction=0.5)
+
+
+def test_run_config_leaves_globals(monkeypatch):
+    monkeypatch.setattr(antsalg2, 'NUM_OF_ANTS', 400)
+    thresh = antsalg2.NO_FOOD_NEST_VISIT_THRESH
+    # the names are RunConfig fields in either case
+    row = run_config(7, {'NUM_OF_ANTS': 30, 'no_food_nest_visit_thresh': 40}, 'array', 5, 80, 100, 50, None, None,
+                     4, 0.5)
+    assert antsalg2.NUM_OF_ANTS == 400
+    assert antsalg2.NO_FOOD_NEST_VISIT_THRESH == thresh
+    assert row['run'] == 7 and row['NUM_OF_ANTS'] == 30 and row['seed'] == 5
+    assert row['ticks'] == 100 and row['stopped_at'] is None
+    assert 0 < row['ants'] <= 30 and row['deaths'] > 0
+
+
+def test_run_config_stops_behind_peers():
+    board, lock = {50: [10 ** 6] * 4}, threading.Lock()
+    row = run_config(0, {}, 'array', 5, 80, 100, 50, board, lock, 4, 0.5)
+    assert row['stopped_at'] == row['ticks'] == 50
+    assert len(board[50]) == 5
+
+
+def test_main_writes_csv(tmp_path):
+    out = tmp_path / 'sweep.csv'
+    assert sweep.main(['--grid', 'NUM_OF_ANTS=10,20', '--engine', 'array', '--size', '60', '--ticks', '40',
+                       '--checkpoint', '20', '--workers', '1', '--out', str(out)]) == 0
+    with open(out) as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['run'], row['NUM_OF_ANTS'], row['ticks']) for row in rows] == [('0', '10', '40'), ('1', '20', '40')]
+
+
+def test_main_checks_checkpoint():
+    with pytest.raises(SystemExit):
+        sweep.main(['--checkpoint', '15'])
+
+
+@pytest.mark.parametrize('args', [['--grid', 'BOGUS=1'], ['--grid', 'NUM_OF_ANTS=10,x'], ['--random', 'NUM_OF_ANTS=5'],
+                                  ['--random', 'NUM_OF_ANTS=1:2:3'], ['--random', 'RENDER=yes:maybe']])
+def test_main_rejects_bad_parameters(capsys, args):
+    with pytest.raises(SystemExit) as raised:
+        sweep.main(args)
+    assert raised.value.code == 2
+    assert args[0] in capsys.readouterr().err